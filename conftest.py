@@ -1,17 +1,46 @@
+from contextlib import contextmanager
 from random import uniform
 
 import pytest
 from django.contrib.gis.geos import LineString, Point
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from faker import Faker
+
+from walks.models import Walk, get_sentinel_user
 
 
 pytest_plugins = ["helpers_namespace"]
 
+fake = Faker()
+
 
 @pytest.fixture(autouse=True)
 def enable_db_access_for_all_tests(db):
     pass
 
 
+@pytest.fixture(autouse=True, scope="session")
+def local_caches():
+    # the caches shared through Redis outside of DEBUG are kept in the test process's memory
+    with override_settings(
+        CACHES={
+            alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+            for alias in settings.CACHES
+        }
+    ):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # the local memory caches outlive each test's database transaction
+    for cache in caches.all():
+        cache.clear()
+
+
 @pytest.helpers.register
 def make_random_walk(num_points):
     return LineString(
@@ -21,3 +50,24 @@ def make_random_walk(num_points):
         ],
         srid=4326,
     )
+
+
+@pytest.helpers.register
+def make_walk(x, y, east=0.001, north=0):
+    # a straight route from x, y going the given degrees east and north
+    return Walk.objects.create(
+        name=fake.unique.sentence(),
+        description=fake.paragraph(),
+        submitter=get_sentinel_user(),
+        route=LineString((x, y), (x + east, y + north), srid=4326),
+    )
+
+
+@pytest.helpers.register
+@contextmanager
+def run_on_commit():
+    # TestCase never commits its transactions, so run the on_commit callbacks registered in the block at its end
+    start = len(connection.run_on_commit)
+    yield
+    for _, callback in connection.run_on_commit[start:]:
+        callback()
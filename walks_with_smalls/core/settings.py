@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -169,3 +170,128 @@ MESSAGE_TAGS = {messages.ERROR: "danger"}
 OPENCAGE_API_KEY = os.environ.get(
     "OPENCAGE_API_KEY"
 )  # set for reverse geo-code lookups
+
+# Reverse geocoding backends, consulted in order. Options are
+# walks.geocoding.BoundaryBackend (offline, needs boundaries loading with the load_boundaries command)
+# walks.geocoding.OpenCageBackend (needs OPENCAGE_API_KEY)
+REVERSE_GEOCODE_BACKENDS = os.environ.get(
+    "REVERSE_GEOCODE_BACKENDS", "walks.geocoding.OpenCageBackend"
+).split(",")
+
+# Reverse geocode job queue
+GEOCODE_JOB_BATCH_SIZE = int(os.environ.get("GEOCODE_JOB_BATCH_SIZE", 10))
+GEOCODE_JOB_MAX_ATTEMPTS = int(os.environ.get("GEOCODE_JOB_MAX_ATTEMPTS", 5))
+GEOCODE_JOB_RETRY_DELAY = int(
+    os.environ.get("GEOCODE_JOB_RETRY_DELAY", 60)
+)  # seconds, doubled after each failed attempt
+GEOCODE_JOB_CLAIM_TIMEOUT = int(
+    os.environ.get("GEOCODE_JOB_CLAIM_TIMEOUT", 300)
+)  # seconds before jobs claimed by a worker that stopped are picked up again
+
+# Reverse geocode lookups are shared by walks starting in the same geohash cell
+# precision 7 gives cells of roughly 150m x 150m
+REVERSE_GEOCODE_CACHE_PRECISION = int(
+    os.environ.get("REVERSE_GEOCODE_CACHE_PRECISION", 7)
+)
+REVERSE_GEOCODE_CACHE_TTL = timedelta(
+    days=int(os.environ.get("REVERSE_GEOCODE_CACHE_TTL_DAYS", 180))
+)
+# Look up the what3words and formatted addresses of walks whose area details were cached,
+# using a geocoder call for every walk rather than one per cell
+REVERSE_GEOCODE_POINT_DETAILS = bool(os.environ.get("REVERSE_GEOCODE_POINT_DETAILS"))
+
+# Postcode lookups
+POSTCODES_IO_URL = os.environ.get("POSTCODES_IO_URL", "https://api.postcodes.io")
+POSTCODES_IO_TIMEOUT = (2, 5)  # connect and read timeouts in seconds
+POSTCODES_IO_POOL_SIZE = 10
+POSTCODE_CACHE_SIZE = 10000  # postcodes cached per process
+POSTCODE_CACHE_TTL = 60 * 60 * 24  # seconds
+POSTCODE_NEGATIVE_CACHE_TTL = 60 * 10  # seconds to remember postcodes that don't exist
+POSTCODE_AUTOCOMPLETE_MIN_LENGTH = 2
+POSTCODE_AUTOCOMPLETE_LIMIT = 10
+POSTCODE_AUTOCOMPLETE_CACHE_SIZE = 2000  # prefixes cached per process
+POSTCODE_AUTOCOMPLETE_CACHE_TTL = 60 * 60  # seconds, also sent to browsers as max-age
+
+# Search
+RESULTS_PAGE_SIZE = 24
+SEARCH_CACHE_ALIAS = "search"
+SEARCH_CACHE_GRID = (
+    0.005  # degrees, searches from within roughly 500m share cached results
+)
+SEARCH_CACHE_VERSION_CELL = (
+    1.0  # degrees, a walk changing invalidates the searches overlapping its cell
+)
+# searches covering more cells than this are invalidated by any walk changing, rather than checking every cell
+SEARCH_CACHE_MAX_CELLS = 100
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", 60 * 10))  # seconds
+SEARCH_CACHE_MAX_RESULTS = 2000  # searches finding more walks than this aren't cached
+SEARCH_TEXT_CONFIG = "english"  # the PostgreSQL text search configuration for walk names and descriptions
+# the walk lengths in miles that results are counted between
+SEARCH_LENGTH_BUCKETS = (1, 3, 5, 10)
+# the most points in each of the pieces routes are split in to for searching along them
+ROUTE_SEGMENT_VERTICES = 32
+# the most points a polygon searched by the results and API can have
+AREA_SEARCH_MAX_POINTS = 100
+# how long browsers and proxies can reuse results pages for anonymous users
+SEARCH_RESULTS_MAX_AGE = int(os.environ.get("SEARCH_RESULTS_MAX_AGE", 60))  # seconds
+
+# GeoJSON API
+API_PAGE_SIZE = 100  # walks per page unless a limit is asked for
+API_MAX_PAGE_SIZE = 5000
+
+# Simplified routes
+# tolerances in degrees, roughly 20m and 2m, and the deepest zoom level each copy is drawn at
+ROUTE_OVERVIEW_TOLERANCE = 0.0002
+ROUTE_OVERVIEW_MAX_ZOOM = 12
+ROUTE_DETAIL_TOLERANCE = 0.00002
+ROUTE_DETAIL_MAX_ZOOM = 16
+
+# Elevations
+# routes are sampled at least this often in metres, about the resolution of OS Terrain 50
+ELEVATION_SAMPLE_SPACING = 25
+# gradients are measured over this many metres, so single cells of the elevation model don't make steep gradients
+ELEVATION_GRADIENT_DISTANCE = 100
+# heights kept in each walk's elevation profile
+ELEVATION_PROFILE_POINTS = 101
+# the width and height in pixels of the tiles load_dem cuts elevation models in to
+ELEVATION_TILE_SIZE = 100
+
+# Map tiles
+TILE_MAX_ZOOM = 18
+TILE_ROUTES_MIN_ZOOM = 10  # only walk starts are drawn below this zoom level
+TILE_MAX_AGE = 60  # seconds browsers can reuse a tile for, cached tiles are invalidated server side
+TILE_CACHE_ALIAS = "tiles"
+TILE_CACHE_MAX_ZOOM = 14  # deeper tiles aren't cached
+TILE_CACHE_TTL = int(os.environ.get("TILE_CACHE_TTL", 60 * 60 * 24))  # seconds
+CLUSTER_PIXELS = 64  # width of the map cells walks are clustered in
+CLUSTER_MAX_CELLS = (
+    32  # cells across a clustered area at most, so there are at most 33 * 33 clusters
+)
+
+# The search and tile caches are invalidated by every web worker and by the management commands,
+# so they have to be shared. Outside of DEBUG they're kept in Redis at REDIS_URL (the redis service),
+# each process's own memory is only good enough for a single runserver.
+# Override them with e.g. SEARCH_CACHE_BACKEND and SEARCH_CACHE_LOCATION
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379")
+SHARED_CACHE_BACKEND = (
+    "django.core.cache.backends.locmem.LocMemCache"
+    if DEBUG
+    else "django_redis.cache.RedisCache"
+)
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    SEARCH_CACHE_ALIAS: {
+        "BACKEND": os.environ.get("SEARCH_CACHE_BACKEND", SHARED_CACHE_BACKEND),
+        "LOCATION": os.environ.get(
+            "SEARCH_CACHE_LOCATION", "search" if DEBUG else f"{REDIS_URL}/1"
+        ),
+    },
+    # e.g. TILE_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache TILE_CACHE_LOCATION=/var/tmp/tiles
+    # to keep tiles on a disk every process can see
+    TILE_CACHE_ALIAS: {
+        "BACKEND": os.environ.get("TILE_CACHE_BACKEND", SHARED_CACHE_BACKEND),
+        "LOCATION": os.environ.get(
+            "TILE_CACHE_LOCATION", "tiles" if DEBUG else f"{REDIS_URL}/2"
+        ),
+    },
+}
@@ -1,15 +1,24 @@
 from django.contrib import admin
 from django.contrib.gis.admin import OSMGeoAdmin
 
-from .models import Walk, Attribute, PostCode
+from .models import (
+    Walk,
+    Attribute,
+    PostCode,
+    GeocodeJob,
+    ReverseGeocodeCache,
+    Boundary,
+)
 
 
 @admin.register(Walk)
 class WalkAdmin(OSMGeoAdmin):
     list_display = ("name", "start", "route_length")
-    exclude = ["start"]
+    exclude = ["start", "start_geography", "attribute_ids"]
     readonly_fields = [
         "route_length",
+        "ascent",
+        "max_gradient",
         "what3words",
         "geohash",
         "country",
@@ -32,3 +41,22 @@ class AttributeAdmin(admin.ModelAdmin):
 @admin.register(PostCode)
 class PostCodeAdmin(admin.ModelAdmin):
     list_display = ("postcode", "latitude", "longitude")
+
+
+@admin.register(GeocodeJob)
+class GeocodeJobAdmin(admin.ModelAdmin):
+    list_display = ("walk", "status", "attempts", "run_after", "last_error")
+    list_filter = ("status",)
+
+
+@admin.register(ReverseGeocodeCache)
+class ReverseGeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ("cell", "postcode", "cached_at", "hits", "misses")
+    search_fields = ("cell", "postcode")
+
+
+@admin.register(Boundary)
+class BoundaryAdmin(OSMGeoAdmin):
+    list_display = ("name", "level")
+    list_filter = ("level",)
+    search_fields = ("name",)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class WalksConfig(AppConfig):
     name = "walks"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+PROCESS_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register()
+def shared_caches_check(app_configs, **kwargs):
+    """
+    The search cache's version tokens, which the ETags of results are made from, are created by
+    whichever process needs them first and changed by any that changes walks,
+    and cached tiles are deleted by whichever process changes the walks drawn on them.
+    Outside of DEBUG there are several web workers and management commands, so both have to be shared by them all
+    """
+    if settings.DEBUG:
+        return []
+
+    errors = []
+
+    for name, alias, setting, id in (
+        ("search", settings.SEARCH_CACHE_ALIAS, "SEARCH_CACHE_BACKEND", "walks.E001"),
+        ("tile", settings.TILE_CACHE_ALIAS, "TILE_CACHE_BACKEND", "walks.E002"),
+    ):
+        if settings.CACHES[alias]["BACKEND"] in PROCESS_CACHE_BACKENDS:
+            errors.append(
+                Error(
+                    f"The {name} cache is kept in each process's memory",
+                    hint=f"Use a shared backend such as Redis, see {setting} and REDIS_URL",
+                    id=id,
+                )
+            )
+
+    return errors
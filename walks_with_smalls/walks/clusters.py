@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.db import connection
+
+from .geojson import walk_url_parts
+from .models import Walk
+from .tiles import MAX_LATITUDE, tile_xy, WEB_MERCATOR_WIDTH
+
+# the size of a web mercator tile in pixels
+TILE_PIXELS = 256
+
+
+def cluster_size(bbox, zoom):
+    """
+    The width of the grid cells in metres that walks are clustered in.
+    Cells are CLUSTER_PIXELS across at the zoom level, but large enough that there are
+    no more than CLUSTER_MAX_CELLS across the box, however big it is
+    """
+    zoom_size = WEB_MERCATOR_WIDTH / 2 ** zoom / TILE_PIXELS * settings.CLUSTER_PIXELS
+    # the corners of the box as fractions of the width of the web mercator projection
+    x1, y1 = tile_xy(bbox[0], bbox[3], 0)
+    x2, y2 = tile_xy(bbox[2], bbox[1], 0)
+    box_size = max(x2 - x1, y2 - y1) * WEB_MERCATOR_WIDTH
+    return max(zoom_size, box_size / settings.CLUSTER_MAX_CELLS)
+
+
+def cluster_walks(bbox, zoom):
+    """
+    Group the walks starting within bbox (xmin, ymin, xmax, ymax in degrees) by snapping their starts to a grid
+    with ST_SnapToGrid, so the number of clusters is bounded whatever the number of walks.
+    Each cluster has the number of walks, their centroid and bounding box,
+    and the URL of the walk if there is only one
+    """
+    xmin, ymin, xmax, ymax = bbox
+    ymin, ymax = max(ymin, -MAX_LATITUDE), min(ymax, MAX_LATITUDE)
+    walk_table = Walk._meta.db_table
+    user_table = Walk._meta.get_field("submitter").related_model._meta.db_table
+    before, middle, after = walk_url_parts()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT walks, ST_X(centroid), ST_Y(centroid), "
+            f"ST_XMin(extent), ST_YMin(extent), ST_XMax(extent), ST_YMax(extent), url "
+            f"FROM ("
+            f"  SELECT count(*) AS walks, ST_Centroid(ST_Collect(walk.start)) AS centroid, "
+            f"  ST_Extent(walk.start) AS extent, "
+            f"  CASE WHEN count(*) = 1 THEN "
+            f"    min(%(before)s || submitter.username || %(middle)s || walk.slug || %(after)s) "
+            f"  END AS url "
+            f"  FROM {walk_table} AS walk "
+            f"  JOIN {user_table} AS submitter ON submitter.id = walk.submitter_id "
+            f"  WHERE walk.start && ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 4326) "
+            f"  GROUP BY ST_SnapToGrid(ST_Transform(walk.start, 3857), %(size)s)"
+            f") AS clusters",
+            {
+                "xmin": xmin,
+                "ymin": ymin,
+                "xmax": xmax,
+                "ymax": ymax,
+                "size": cluster_size(bbox, zoom),
+                "before": before,
+                "middle": middle,
+                "after": after,
+            },
+        )
+
+        return [
+            {
+                "count": count,
+                "centroid": (x, y),
+                "bbox": (extent_xmin, extent_ymin, extent_xmax, extent_ymax),
+                "url": url,
+            }
+            for count, x, y, extent_xmin, extent_ymin, extent_xmax, extent_ymax, url in cursor.fetchall()
+        ]
+
+
+def cluster_features(clusters):
+    """
+    The clusters as a GeoJSON FeatureCollection of their centroids
+    """
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": cluster["centroid"]},
+                "bbox": cluster["bbox"],
+                "properties": {"count": cluster["count"], "url": cluster["url"]},
+            }
+            for cluster in clusters
+        ],
+    }
@@ -0,0 +1,42 @@
+# the size of the elevation profile charts on walk pages, in SVG user units
+PROFILE_WIDTH = 600
+PROFILE_HEIGHT = 150
+
+
+def profile_chart(walk, width=PROFILE_WIDTH, height=PROFILE_HEIGHT):
+    """
+    The lines of an SVG chart of a walk's elevation_profile,
+    from the lowest height at the bottom to the highest at the top,
+    as strings of polyline points. Gaps in the elevation data split the line.
+    Returns None if the walk doesn't have a profile
+    """
+    profile = walk.elevation_profile or []
+    heights = [height for height in profile if height is not None]
+
+    if not heights:
+        return None
+
+    lowest, highest = min(heights), max(heights)
+    step = width / max(1, len(profile) - 1)
+    lines = [[]]
+
+    for index, elevation in enumerate(profile):
+        if elevation is None:
+            lines.append([])
+            continue
+
+        # flat walks are drawn across the middle
+        y = (
+            height / 2
+            if highest == lowest
+            else height - (elevation - lowest) / (highest - lowest) * height
+        )
+        lines[-1].append(f"{index * step:.1f},{y:.1f}")
+
+    return {
+        "lines": [" ".join(line) for line in lines if line],
+        "lowest": lowest,
+        "highest": highest,
+        "width": width,
+        "height": height,
+    }
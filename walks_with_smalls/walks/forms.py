@@ -2,6 +2,15 @@ from django.contrib.gis import forms
 from django.utils.text import slugify
 
 from walks.models import Walk, Attribute
+from walks.postcodes import normalise_postcode
+from walks.search import (
+    MAX_MAXIMUM_ASCENT,
+    MAX_MAXIMUM_LENGTH,
+    MAX_SEARCH_RADIUS,
+    MAX_TEXT_LENGTH,
+    SORT_BEST,
+    SORT_CHOICES,
+)
 
 
 class ResponsiveMapWidget(forms.OpenLayersWidget):
@@ -36,23 +45,119 @@ class SearchForm(forms.Form):
         max_length=50, required=False, help_text="Enter a Post code to search from"
     )
     use_current_location = forms.BooleanField(initial=False, required=False)
+    # filled in by the browser when using the current location
+    lat = forms.FloatField(
+        label="Latitude",
+        required=False,
+        min_value=-90,
+        max_value=90,
+        widget=forms.HiddenInput,
+    )
+    long = forms.FloatField(
+        label="Longitude",
+        required=False,
+        min_value=-180,
+        max_value=180,
+        widget=forms.HiddenInput,
+    )
     search_radius = forms.IntegerField(
-        min_value=0, max_value=200, help_text="Search distance (Miles)"
+        min_value=0, max_value=MAX_SEARCH_RADIUS, help_text="Search distance (Miles)"
     )
     maximum_length = forms.IntegerField(
         required=False,
         min_value=0,
-        max_value=250,
+        max_value=MAX_MAXIMUM_LENGTH,
         help_text="Maximum walk length (Miles)",
     )
+    maximum_ascent = forms.IntegerField(
+        required=False,
+        min_value=0,
+        max_value=MAX_MAXIMUM_ASCENT,
+        help_text="Maximum total climb (Metres)",
+    )
+    along_route = forms.BooleanField(
+        initial=False,
+        required=False,
+        help_text="Include walks that pass nearby, not just those that start nearby",
+    )
+    q = forms.CharField(
+        label="Keywords",
+        max_length=MAX_TEXT_LENGTH,
+        required=False,
+        help_text="Words to look for, e.g. waterfall or castle",
+    )
+    sort = forms.ChoiceField(choices=SORT_CHOICES, initial=SORT_BEST, required=False)
+    all_attributes = forms.BooleanField(
+        initial=False,
+        required=False,
+        help_text="Only show walks with all of the selected attributes",
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for attribute in Attribute.objects.all():
+        self.attributes = list(Attribute.objects.all())
+        # the number of walks found with each attribute, see WalkSearch.facets
+        self.attribute_counts = None
+        for attribute in self.attributes:
             self.fields[attribute.attribute] = forms.BooleanField(
                 initial=False, required=False
             )
 
+    @classmethod
+    def for_search(cls, search, facets=None):
+        """
+        An unbound form showing the given search, or an empty form if there isn't one
+        """
+        form = cls()
+
+        if facets is not None:
+            form.attribute_counts = facets["attributes"]
+
+        if search is not None:
+            form.initial = {
+                "postcode": search.postcode,
+                "use_current_location": search.postcode is None,
+                "lat": search.location.y,
+                "long": search.location.x,
+                "search_radius": round(search.radius),
+                "maximum_length": round(search.maximum_length),
+                "maximum_ascent": None
+                if search.maximum_ascent is None
+                else round(search.maximum_ascent),
+                "sort": search.sort,
+                "all_attributes": search.all_attributes,
+                "q": search.text,
+                "along_route": search.along_route,
+            }
+            for attribute in form.attributes:
+                form.initial[attribute.attribute] = attribute.pk in search.attributes
+
+        return form
+
+    def attribute_fields(self):
+        """
+        The attribute checkboxes, each with the number of walks found with the attribute if it's known
+        """
+        return [
+            (
+                self[attribute.attribute],
+                None
+                if self.attribute_counts is None
+                else self.attribute_counts.get(attribute.pk, 0),
+            )
+            for attribute in self.attributes
+        ]
+
+    def selected_attributes(self):
+        return [
+            attribute.pk
+            for attribute in self.attributes
+            if self.cleaned_data.get(attribute.attribute)
+        ]
+
+    def clean_postcode(self):
+        return normalise_postcode(self.cleaned_data["postcode"])
+
     def clean(self):
         if (
             not self.cleaned_data["postcode"]
@@ -62,6 +167,12 @@ class SearchForm(forms.Form):
                 "You must enter a postcode or location or use your current location"
             )
 
+        if self.cleaned_data["use_current_location"] and (
+            self.cleaned_data.get("lat") is None
+            or self.cleaned_data.get("long") is None
+        ):
+            raise forms.ValidationError("Could not get your current location")
+
 
 class WalkForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
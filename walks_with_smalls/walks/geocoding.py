@@ -0,0 +1,395 @@
+import logging
+import threading
+import time
+from datetime import timedelta, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+from django.utils.timezone import now, make_aware
+
+from opencage.geocoder import OpenCageGeocode, RateLimitExceededError
+
+from .models import (
+    Boundary,
+    GeocodeJob,
+    LOCATION_FIELDS,
+    ReverseGeocodeCache,
+    Walk,
+)
+from .search import search_cache
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaOpenCageGeocode(OpenCageGeocode):
+    """
+    OpenCageGeocode that keeps the rate limit details (limit, remaining and reset)
+    OpenCage returns with each response so callers can pace their requests
+    """
+
+    rate = None
+
+    def _opencage_request(self, params):
+        response = super()._opencage_request(params)
+        self.rate = response.get("rate")
+        return response
+
+
+class OpenCageBackend:
+    """
+    Reverse geocoding using the OpenCage API
+    """
+
+    def __init__(self, geocoder=None):
+        if geocoder is None and settings.OPENCAGE_API_KEY:
+            geocoder = QuotaOpenCageGeocode(settings.OPENCAGE_API_KEY)
+
+        self.geocoder = geocoder
+
+    @property
+    def available(self):
+        return self.geocoder is not None
+
+    @property
+    def rate(self):
+        return getattr(self.geocoder, "rate", None)
+
+    @staticmethod
+    def parse_result(result):
+        """
+        Convert a single OpenCage result into a dict of Walk field values
+        """
+        annotations = result.get("annotations", {})
+        components = result.get("components", {})
+
+        return {
+            "what3words": annotations.get("what3words", {}).get("words"),
+            "continent": components.get("continent"),
+            "country": components.get("country"),
+            "state": components.get("state"),
+            "county": components.get("county"),
+            "city": components.get("city"),
+            "suburb": components.get("suburb"),
+            "road": components.get("road"),
+            "postcode": components.get("postcode"),
+            "formatted": result.get("formatted"),
+        }
+
+    def reverse_geocode(self, point):
+        results = self.geocoder.reverse_geocode(
+            round(point[1], 6), round(point[0], 6), language="en", limit=1,
+        )
+
+        if not results:
+            return None
+
+        return self.parse_result(results[0])
+
+
+class BoundaryBackend:
+    """
+    Reverse geocoding from the administrative boundaries loaded by the load_boundaries management command.
+    Doesn't make any network calls but can't provide the what3words, road or formatted details
+    """
+
+    available = True
+    rate = None
+
+    def reverse_geocode(self, point):
+        location = {}
+
+        for level, name in (
+            Boundary.objects.filter(geom__contains=point)
+            .order_by("level", "pk")
+            .values_list("level", "name")
+        ):
+            location.setdefault(level, name)
+
+        return location or None
+
+
+class ChainedBackend:
+    """
+    Ask each backend in turn, keeping the first value found for each field.
+    Later backends aren't asked once every field has a value
+    """
+
+    def __init__(self, backends):
+        self.backends = backends
+
+    @property
+    def rate(self):
+        return next((backend.rate for backend in self.backends if backend.rate), None)
+
+    def reverse_geocode(self, point):
+        location = {}
+
+        for backend in self.backends:
+            for field, value in (backend.reverse_geocode(point) or {}).items():
+                if value and not location.get(field):
+                    location[field] = value
+
+            if all(location.get(field) for field in LOCATION_FIELDS):
+                break
+
+        return location or None
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket for pacing requests to an external API.
+    The rate can be lowered to match the quota reported by the API
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.resume_at = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available
+        """
+        while True:
+            with self.lock:
+                wait = self.resume_at - time.time()
+
+                if wait <= 0:
+                    current = time.monotonic()
+                    self.tokens = min(
+                        self.capacity,
+                        self.tokens + (current - self.updated) * self.rate,
+                    )
+                    self.updated = current
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def update_from_quota(self, rate):
+        """
+        Spread the remaining requests in an OpenCage quota over the time until it resets
+        """
+        if not rate or "remaining" not in rate or "reset" not in rate:
+            return
+
+        seconds_to_reset = max(rate["reset"] - time.time(), 1)
+
+        with self.lock:
+            if rate["remaining"] > 0:
+                self.rate = min(self.max_rate, rate["remaining"] / seconds_to_reset)
+            else:
+                # nothing left until the quota resets
+                self.rate = self.max_rate
+                self.resume_at = rate["reset"]
+
+
+def get_geocoder():
+    """
+    Return the backend used for reverse geocode lookups, as configured in settings.REVERSE_GEOCODE_BACKENDS,
+    or None if none of them are available
+    """
+    backends = [
+        import_string(backend)() for backend in settings.REVERSE_GEOCODE_BACKENDS
+    ]
+    backends = [backend for backend in backends if backend.available]
+
+    if not backends:
+        return None
+
+    if len(backends) == 1:
+        return backends[0]
+
+    return ChainedBackend(backends)
+
+
+def update_walks_from_boundaries(queryset=None):
+    """
+    Set the location details of every walk in the queryset from the loaded boundaries in a single UPDATE.
+    Fields without a containing boundary are left as they are, and walks outside every boundary
+    keep their reverse_geocode_cache_time so they're still looked up when it expires.
+    Returns the number of walks updated
+    """
+    walk_table = Walk._meta.db_table
+    assignments = []
+    params = []
+
+    for level, _ in Boundary.LEVEL_CHOICES:
+        assignments.append(
+            f"{level} = COALESCE(("
+            f"SELECT b.name FROM {Boundary._meta.db_table} b "
+            f"WHERE b.level = %s AND ST_Contains(b.geom, {walk_table}.start) "
+            f"ORDER BY b.id LIMIT 1"
+            f"), {level})"
+        )
+        params.append(level)
+
+    # only walks that matched a boundary have been located
+    matched = (
+        f"CASE WHEN EXISTS ("
+        f"SELECT 1 FROM {Boundary._meta.db_table} b WHERE ST_Contains(b.geom, {walk_table}.start)"
+        f") THEN %s ELSE reverse_geocode_cache_time END"
+    )
+
+    everything = queryset is None
+    queryset = queryset if queryset is not None else Walk.objects.all()
+    pks_sql, pks_params = queryset.values("pk").query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {walk_table} SET {', '.join(assignments)}, reverse_geocode_cache_time = {matched} "
+            f"WHERE id IN ({pks_sql})",
+            params + [now()] + list(pks_params),
+        )
+        updated = cursor.rowcount
+
+    Walk.refresh_search(queryset)
+
+    # the location details are shown on the results
+    if everything:
+        search_cache.invalidate_all()
+    else:
+        search_cache.invalidate(queryset.values_list("start", flat=True))
+
+    return updated
+
+
+def cached_reverse_geocode(geocoder, point):
+    """
+    Look up the location details for a point, caching the area details for nearby points.
+    The geocoder is only asked on a cache miss, unless REVERSE_GEOCODE_POINT_DETAILS is set
+    to look up the what3words and formatted addresses that are only right for the point itself
+    """
+    if not settings.REVERSE_GEOCODE_POINT_DETAILS:
+        location = ReverseGeocodeCache.lookup(point)
+
+        if location:
+            return location
+
+    location = geocoder.reverse_geocode(point)
+
+    if location:
+        ReverseGeocodeCache.store(point, location)
+
+    return location
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff between attempts at a failing job
+    """
+    return timedelta(seconds=settings.GEOCODE_JOB_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def claim_geocode_jobs(batch_size):
+    """
+    Claim a batch of due jobs in a short transaction, moving their run_after on by GEOCODE_JOB_CLAIM_TIMEOUT
+    so other workers skip them, and pick them up again if this one dies before finishing them
+    """
+    claimed_at = now()
+
+    with transaction.atomic():
+        # only the jobs are locked, not the walks joined for their starts
+        jobs = list(
+            GeocodeJob.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("walk")
+            .filter(status=GeocodeJob.PENDING, run_after__lte=claimed_at)
+            .order_by("run_after")[:batch_size]
+        )
+        GeocodeJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            run_after=claimed_at
+            + timedelta(seconds=settings.GEOCODE_JOB_CLAIM_TIMEOUT),
+            updated=claimed_at,
+        )
+
+    for job in jobs:
+        # a job the walk's saves have queued again since is left to its new lookup
+        job.updated = claimed_at
+
+    return jobs
+
+
+def complete_geocode_job(job, location):
+    """
+    Save the location found for a claimed job's walk and remove the job, in a short transaction.
+    Returns whether the walk was updated
+    """
+    with transaction.atomic():
+        # the walk then its job, in the order Walk.save() locks them
+        list(Walk.objects.select_for_update().filter(pk=job.walk.pk))
+
+        deleted, _ = GeocodeJob.objects.filter(pk=job.pk, updated=job.updated).delete()
+
+        if not deleted or not location:
+            return False
+
+        job.walk.set_location(location)
+        # update directly so the walk isn't queued up again by Walk.save()
+        Walk.objects.filter(pk=job.walk.pk).update(
+            **{field: getattr(job.walk, field) for field in Walk.GEOCODE_FIELDS}
+        )
+        Walk.refresh_search(Walk.objects.filter(pk=job.walk.pk))
+
+    return True
+
+
+def process_geocode_jobs(geocoder, batch_size=None):
+    """
+    Claim a batch of due jobs and look up the location of each walk.
+    Returns the number of jobs that were claimed.
+
+    The lookups are made outside of any transaction so saving a walk never waits on the geocoder.
+    If the geocoder rate limit is exceeded the remaining jobs in the batch are
+    deferred until the limit resets and the RateLimitExceededError is raised so
+    the caller can back off
+    """
+    jobs = claim_geocode_jobs(batch_size or settings.GEOCODE_JOB_BATCH_SIZE)
+    rate_limit_error = None
+    located = []
+
+    for index, job in enumerate(jobs):
+        try:
+            location = cached_reverse_geocode(geocoder, job.walk.start)
+        except RateLimitExceededError as e:
+            reset_time = make_aware(e.reset_time, timezone.utc)
+
+            for deferred in jobs[index:]:
+                GeocodeJob.objects.filter(
+                    pk=deferred.pk, updated=deferred.updated
+                ).update(run_after=reset_time, last_error=str(e))
+
+            rate_limit_error = e
+            break
+        except Exception as e:  # noqa
+            logger.exception("Reverse geocode of walk %s failed", job.walk.pk)
+            job.attempts += 1
+            failed = job.attempts >= settings.GEOCODE_JOB_MAX_ATTEMPTS
+
+            GeocodeJob.objects.filter(pk=job.pk, updated=job.updated).update(
+                attempts=job.attempts,
+                last_error=str(e),
+                status=GeocodeJob.FAILED if failed else GeocodeJob.PENDING,
+                run_after=now() + retry_delay(job.attempts),
+                updated=now(),
+            )
+            continue
+
+        if complete_geocode_job(job, location):
+            located.append(job.walk.start)
+
+    # the location details are shown on the results
+    search_cache.invalidate(located)
+
+    if rate_limit_error:
+        raise rate_limit_error
+
+    return len(jobs)
@@ -0,0 +1,39 @@
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(latitude, longitude, precision=12):
+    """
+    Encode a latitude/longitude as a geohash string of the given length.
+    Nearby points share a common prefix so a truncated geohash works as a grid cell
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            value, value_range = longitude, lng_range
+        else:
+            value, value_range = latitude, lat_range
+
+        mid = (value_range[0] + value_range[1]) / 2
+
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits = bits << 1
+            value_range[1] = mid
+
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
@@ -0,0 +1,121 @@
+import json
+
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.db.models import (
+    ExpressionWrapper,
+    F,
+    FloatField,
+    Func,
+    JSONField,
+    TextField,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.urls import reverse
+
+GEOJSON_CONTENT_TYPE = "application/geo+json"
+# decimal places of the coordinates, about 10cm
+COORDINATE_PRECISION = 6
+
+# the properties each walk feature has, name: walk field
+FEATURE_PROPERTIES = {
+    "name": "name",
+    "description": "description",
+    "length": "route_length",
+    "ascent": "ascent",
+    "attributes": "attribute_ids",
+    "what3words": "what3words",
+    "road": "road",
+    "county": "county",
+    "postcode": "postcode",
+    "created": "created",
+}
+
+
+class JSONBuildObject(Func):
+    """
+    json_build_object from pairs of keys and values
+    """
+
+    function = "json_build_object"
+
+    def __init__(self, **pairs):
+        expressions = []
+
+        for key, value in pairs.items():
+            expressions += [Value(key), value]
+
+        super().__init__(*expressions, output_field=TextField())
+
+
+def walk_url_parts():
+    """
+    The text of a walk's URL before its submitter's username, between that and its slug, and after the slug
+    """
+    url = reverse("walk-detail", kwargs={"username": "-username-", "slug": "-slug-"})
+    before, rest = url.split("-username-")
+    middle, after = rest.split("-slug-")
+    return before, middle, after
+
+
+def walk_url():
+    """
+    The URL of each walk's page, built in the database from its submitter and slug
+    """
+    before, middle, after = walk_url_parts()
+
+    return Concat(
+        Value(before),
+        F("submitter__username"),
+        Value(middle),
+        F("slug"),
+        Value(after),
+        output_field=TextField(),
+    )
+
+
+def walk_feature(search=None, route="route"):
+    """
+    Each walk as the text of a GeoJSON Feature, built by PostgreSQL so rows can be written straight out.
+    Walks found by a search also have their distance from it.
+    route is the field of the geometry, the full route or one of its simplified copies
+    """
+    properties = {key: F(field) for key, field in FEATURE_PROPERTIES.items()}
+    properties["url"] = walk_url()
+
+    if search is not None:
+        properties["distance"] = ExpressionWrapper(
+            Cast("distance", FloatField()) / 1609.344, output_field=FloatField()
+        )
+
+    # walks saved before the simplified copies were added may not have them yet
+    geometry = F("route") if route == "route" else Coalesce(route, "route")
+    feature = JSONBuildObject(
+        type=Value("Feature"),
+        id=F("pk"),
+        geometry=Cast(
+            AsGeoJSON(geometry, precision=COORDINATE_PRECISION),
+            output_field=JSONField(),
+        ),
+        properties=JSONBuildObject(**properties),
+    )
+    return Cast(feature, TextField())
+
+
+def feature_collection(features, **members):
+    """
+    Yield a GeoJSON FeatureCollection a feature at a time, for a StreamingHttpResponse.
+    features are the text of each feature, members are added to the collection after them
+    so they can depend on what was streamed, e.g. a link to the next page
+    """
+    yield '{"type": "FeatureCollection", "features": ['
+
+    for count, feature in enumerate(features):
+        yield f",{feature}" if count else feature
+
+    yield "]"
+
+    for name, value in members.items():
+        yield f", {json.dumps(name)}: {json.dumps(value() if callable(value) else value)}"
+
+    yield "}"
@@ -0,0 +1,276 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from walks.models import (
+    Attribute,
+    RouteSegment,
+    Walk,
+    WalkSearchEntry,
+    get_sentinel_user,
+)
+from walks.pagination import KeysetPaginator
+from walks.search import SORT_BEST, SORT_NEAREST, WalkSearch
+
+# synthetic walks start somewhere in this box, roughly Great Britain
+BOUNDS = (-5.5, 50.0, 1.5, 58.5)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time searches against increasing numbers of synthetic walks. "
+        "The walks are generated in a transaction that is rolled back at the end, so nothing is kept"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10000,100000,1000000",
+            help="Comma separated numbers of walks to time the searches with",
+        )
+        parser.add_argument(
+            "--searches", type=int, default=20, help="Searches to time at each size"
+        )
+        parser.add_argument(
+            "--radius", type=float, default=5, help="Search radius in miles"
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Show the query plans at the largest size",
+        )
+
+    def generate(self, first, last, submitter, attributes):
+        """
+        Insert synthetic walks numbered first to last, inclusive
+        """
+        walk_table = Walk._meta.db_table
+        attribute_table = Walk.attributes.through._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {walk_table}")
+            last_id = cursor.fetchone()[0]
+
+            cursor.execute(
+                f"INSERT INTO {walk_table} "
+                f"(name, slug, description, start, start_geography, route, route_envelope, submitter_id, route_length, "
+                f"attribute_ids, created, updated) "
+                f"SELECT 'Benchmark walk ' || i, 'benchmark-walk-' || i, '', "
+                f"ST_StartPoint(route), ST_StartPoint(route)::geography, route, ST_Envelope(route), %s, "
+                f"ST_Length(route::geography) / 1609.344, '{{}}', now(), now() "
+                f"FROM ("
+                f"  SELECT i, ST_SetSRID(ST_MakeLine(ST_MakePoint(x, y), ST_MakePoint(x + 0.02, y + 0.01)), 4326) "
+                f"  AS route FROM ("
+                f"    SELECT i, %s + random() * %s AS x, %s + random() * %s AS y "
+                f"    FROM generate_series(%s, %s) AS i"
+                f"  ) AS points"
+                f") AS routes",
+                [
+                    submitter.pk,
+                    BOUNDS[0],
+                    BOUNDS[2] - BOUNDS[0],
+                    BOUNDS[1],
+                    BOUNDS[3] - BOUNDS[1],
+                    first,
+                    last,
+                ],
+            )
+
+            # give around a third of the new walks each attribute
+            cursor.execute(
+                f"INSERT INTO {attribute_table} (walk_id, attribute_id) "
+                f"SELECT walk.id, attribute_id FROM {walk_table} AS walk "
+                f"CROSS JOIN unnest(%s) AS attribute_id "
+                f"WHERE walk.id > %s AND random() < 0.3",
+                [[attribute.pk for attribute in attributes], last_id],
+            )
+            cursor.execute(
+                f"UPDATE {walk_table} SET attribute_ids = attributes.ids FROM ("
+                f"  SELECT walk_id, array_agg(attribute_id ORDER BY attribute_id) AS ids "
+                f"  FROM {attribute_table} WHERE walk_id > %s GROUP BY walk_id"
+                f") AS attributes WHERE {walk_table}.id = attributes.walk_id",
+                [last_id],
+            )
+            WalkSearchEntry.refresh(Walk.objects.filter(pk__gt=last_id))
+            RouteSegment.refresh(Walk.objects.filter(pk__gt=last_id))
+            cursor.execute(
+                f"ANALYZE {walk_table}, {attribute_table}, "
+                f"{WalkSearchEntry._meta.db_table}, {RouteSegment._meta.db_table}"
+            )
+
+    @staticmethod
+    def geometry_queryset(search):
+        """
+        The search as it was before start_geography, for comparison
+        """
+        return (
+            Walk.objects.annotate(distance=Distance("start", search.location))
+            .annotate(
+                attribute_match_count=Count(
+                    "attributes", filter=Q(attributes__in=search.attributes)
+                )
+            )
+            .filter(start__distance_lte=(search.location, D(mi=search.radius)))
+            .filter(route_length__lte=search.maximum_length)
+            .order_by("-attribute_match_count", "route_length", "distance")[
+                : settings.RESULTS_PAGE_SIZE
+            ]
+        )
+
+    def geometry_search(self, search):
+        return list(self.geometry_queryset(search))
+
+    @staticmethod
+    def attribute_join_queryset(search):
+        """
+        The geography search ranked by joining the attributes rather than using attribute_ids, for comparison
+        """
+        return (
+            Walk.objects.filter(
+                start_geography__dwithin=(search.location, D(mi=search.radius)),
+                route_length__lte=search.maximum_length,
+            )
+            .annotate(distance=Distance("start_geography", search.location))
+            .annotate(
+                attribute_match_count=Count(
+                    "attributes", filter=Q(attributes__in=search.attributes)
+                )
+            )
+            .order_by("-attribute_match_count", "route_length", "distance")[
+                : settings.RESULTS_PAGE_SIZE
+            ]
+        )
+
+    def attribute_join_search(self, search):
+        return list(self.attribute_join_queryset(search))
+
+    @staticmethod
+    def page(search):
+        # searched as the results pages do
+        return KeysetPaginator(
+            search.filter(WalkSearchEntry.objects.all()),
+            search.ordering,
+            settings.RESULTS_PAGE_SIZE,
+        )
+
+    def geography_search(self, search):
+        return self.page(search).page().object_list
+
+    def time_searches(self, label, run, searches):
+        timings = []
+
+        for search in searches:
+            started = time.perf_counter()
+            run(search)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        self.stdout.write(
+            f"  {label:<40} median {statistics.median(timings):8.1f}ms  "
+            f"p95 {timings[max(int(len(timings) * 0.95) - 1, 0)]:8.1f}ms"
+        )
+
+    def explain(self, searches):
+        best, nearest = searches[0]
+
+        self.stdout.write(self.style.MIGRATE_HEADING("geometry ST_DistanceSphere"))
+        self.stdout.write(self.geometry_queryset(best).explain(analyze=True))
+
+        self.stdout.write(
+            self.style.MIGRATE_HEADING("geography ST_DWithin, attributes join")
+        )
+        self.stdout.write(self.attribute_join_queryset(best).explain(analyze=True))
+
+        for label, search in (
+            ("geography ST_DWithin, best match", best),
+            ("geography <-> KNN, nearest first", nearest),
+        ):
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(
+                self.page(search)
+                .queryset[: settings.RESULTS_PAGE_SIZE]
+                .explain(analyze=True)
+            )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+
+        with transaction.atomic():
+            submitter = get_sentinel_user()
+            attributes = list(Attribute.objects.all()) or [
+                Attribute.objects.create(
+                    attribute=f"Benchmark attribute {i}", description=""
+                )
+                for i in range(5)
+            ]
+            existing = Walk.objects.count()
+            searches = []
+
+            for _ in range(options["searches"]):
+                location = Point(
+                    random.uniform(BOUNDS[0], BOUNDS[2]),
+                    random.uniform(BOUNDS[1], BOUNDS[3]),
+                    srid=4326,
+                )
+                searched_attributes = random.sample(
+                    [attribute.pk for attribute in attributes], min(2, len(attributes))
+                )
+                searches.append(
+                    tuple(
+                        WalkSearch(
+                            location,
+                            radius=options["radius"],
+                            attributes=searched_attributes,
+                            sort=sort,
+                        )
+                        for sort in (SORT_BEST, SORT_NEAREST)
+                    )
+                )
+
+            generated = 0
+
+            for size in sizes:
+                started = time.monotonic()
+                self.generate(generated + 1, size, submitter, attributes)
+                generated = size
+
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{existing + generated} walks "
+                        f"(generated in {time.monotonic() - started:.0f}s)"
+                    )
+                )
+
+                self.time_searches(
+                    "geometry ST_DistanceSphere",
+                    self.geometry_search,
+                    [best for best, _ in searches],
+                )
+                self.time_searches(
+                    "geography ST_DWithin, attributes join",
+                    self.attribute_join_search,
+                    [best for best, _ in searches],
+                )
+                self.time_searches(
+                    "geography ST_DWithin, best match",
+                    self.geography_search,
+                    [best for best, _ in searches],
+                )
+                self.time_searches(
+                    "geography <-> KNN, nearest first",
+                    self.geography_search,
+                    [nearest for _, nearest in searches],
+                )
+
+            if options["explain"]:
+                self.explain(searches)
+
+            transaction.set_rollback(True)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from walks.models import OutcodeCentroid, SectorCentroid
+from walks.postcodes import build_postcode_centroids
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the outcode and sector centroids used to search from partial postcodes. "
+        "import_postcodes does this automatically after an import"
+    )
+
+    def handle(self, *args, **options):
+        build_postcode_centroids()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built {OutcodeCentroid.objects.count()} outcode "
+                f"and {SectorCentroid.objects.count()} sector centroids"
+            )
+        )
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from walks.models import ReverseGeocodeCache
+from walks.search import search_cache
+
+
+class Command(BaseCommand):
+    help = "Report how often lookups are served from the caches"
+
+    def handle(self, *args, **options):
+        stats = ReverseGeocodeCache.stats()
+        hits = stats["hits"] or 0
+        misses = stats["misses"] or 0
+        lookups = hits + misses
+        hit_rate = hits / lookups if lookups else 0
+
+        self.stdout.write(
+            f"Reverse geocode cache: {hits} hits, {misses} misses ({hit_rate:.1%} hit rate)"
+        )
+
+        if not settings.REVERSE_GEOCODE_POINT_DETAILS:
+            # otherwise walks are still looked up for their what3words and formatted addresses
+            self.stdout.write(f"{hits} geocoder lookups saved")
+
+        stats = search_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups if lookups else 0
+
+        self.stdout.write(
+            f"Search cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.1%} hit rate)"
+        )
@@ -0,0 +1,53 @@
+import time
+from datetime import timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now, make_aware
+
+from opencage.geocoder import RateLimitExceededError
+
+from walks.geocoding import get_geocoder, process_geocode_jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued reverse geocode lookups for walk start locations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, help="Number of jobs to claim at a time"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=int,
+            default=5,
+            help="Seconds to wait when there are no jobs to process",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        geocoder = get_geocoder()
+
+        if geocoder is None:
+            raise CommandError("No reverse geocoding backends are available")
+
+        while True:
+            try:
+                processed = process_geocode_jobs(geocoder, options["batch_size"])
+            except RateLimitExceededError as e:
+                self.stderr.write(str(e))
+                wait = (make_aware(e.reset_time, timezone.utc) - now()).total_seconds()
+                time.sleep(max(wait, options["poll_interval"]))
+                continue
+
+            if processed:
+                self.stdout.write(f"Processed {processed} jobs")
+                continue
+
+            if options["once"]:
+                return
+
+            time.sleep(options["poll_interval"])
@@ -0,0 +1,109 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from walks.models import PostCode
+from walks.postcodes import build_postcode_centroids, normalise_postcode
+
+# ONSPD uses these coordinates for postcodes without a grid reference
+NO_LOCATION = (99.999999, 0.0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import postcode locations from an ONS Postcode Directory (ONSPD) CSV file. "
+        "Rows are upserted in batches, each in its own transaction, so the import can be re-run "
+        "to refresh the table without locking it for the duration. "
+        "The outcode and sector centroids are rebuilt afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="ONSPD CSV file to import, or - for stdin")
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows to write at a time"
+        )
+        parser.add_argument(
+            "--keep-terminated",
+            action="store_true",
+            help="Import postcodes that are no longer in use instead of removing them",
+        )
+
+    def write_batch(self, upserts, deletes):
+        table = PostCode._meta.db_table
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if upserts:
+                execute_values(
+                    cursor.cursor,
+                    f"INSERT INTO {table} (postcode, latitude, longitude) VALUES %s "
+                    f"ON CONFLICT (postcode) DO UPDATE "
+                    f"SET latitude = EXCLUDED.latitude, longitude = EXCLUDED.longitude "
+                    f"WHERE ({table}.latitude, {table}.longitude) "
+                    f"IS DISTINCT FROM (EXCLUDED.latitude, EXCLUDED.longitude)",
+                    upserts,
+                    page_size=len(upserts),
+                )
+                self.written += cursor.rowcount
+
+            if deletes:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE postcode = ANY(%s)", [deletes]
+                )
+                self.deleted += cursor.rowcount
+
+    def handle(self, *args, **options):
+        self.written = 0
+        self.deleted = 0
+        rows = 0
+        started = time.monotonic()
+        upserts = {}
+        deletes = []
+
+        source = sys.stdin if options["path"] == "-" else open(options["path"])
+
+        with source:
+            reader = csv.DictReader(source)
+
+            if not {"pcds", "lat", "long", "doterm"} <= set(reader.fieldnames or []):
+                raise CommandError(
+                    "Expected an ONSPD CSV with pcds, lat, long and doterm columns"
+                )
+
+            for row in reader:
+                rows += 1
+                postcode = normalise_postcode(row["pcds"])
+
+                try:
+                    location = (float(row["lat"]), float(row["long"]))
+                except ValueError:
+                    location = NO_LOCATION
+
+                if location == NO_LOCATION or (
+                    row["doterm"] and not options["keep_terminated"]
+                ):
+                    deletes.append(postcode)
+                else:
+                    # the same postcode can't appear twice in one INSERT ... ON CONFLICT
+                    upserts[postcode] = (postcode,) + location
+
+                if len(upserts) + len(deletes) >= options["batch_size"]:
+                    self.write_batch(list(upserts.values()), deletes)
+                    upserts, deletes = {}, []
+                    self.stdout.write(
+                        f"{rows} rows read, {self.written} postcodes written, {self.deleted} removed"
+                    )
+
+            self.write_batch(list(upserts.values()), deletes)
+
+        build_postcode_centroids()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {rows} rows in {time.monotonic() - started:.0f}s. "
+                f"{self.written} postcodes written, {self.deleted} removed"
+            )
+        )
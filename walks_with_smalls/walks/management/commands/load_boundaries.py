@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import sys
+
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from walks.geocoding import update_walks_from_boundaries
+from walks.models import Boundary
+
+
+class IteratorFile(io.TextIOBase):
+    """
+    A read only file wrapping an iterator of strings so rows can be streamed into COPY
+    """
+
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.iterator)
+            except StopIteration:
+                break
+
+        if size < 0:
+            size = len(self.buffer)
+
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream administrative boundaries from a GeoJSONSeq file (one feature per line) into the Boundary table. "
+        "Convert other formats with ogr2ogr, e.g. "
+        "ogr2ogr -f GeoJSONSeq -t_srs EPSG:4326 /vsistdout/ counties.shp | manage.py load_boundaries - --level county"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="GeoJSONSeq file to load, or - for stdin")
+        parser.add_argument(
+            "--level",
+            required=True,
+            choices=[level for level, _ in Boundary.LEVEL_CHOICES],
+            help="The Walk location field these boundaries provide",
+        )
+        parser.add_argument(
+            "--name-property",
+            default="name",
+            help="The feature property holding the name of the area",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Remove the existing boundaries for this level first",
+        )
+        parser.add_argument(
+            "--update-walks",
+            action="store_true",
+            help="Update the location details of every walk from the boundaries once loaded",
+        )
+
+    def rows(self, features, name_property):
+        """
+        Generate a CSV line per feature
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        for line_number, line in enumerate(features, start=1):
+            line = line.strip().lstrip("\x1e")  # GeoJSONSeq may use RS separators
+
+            if not line:
+                continue
+
+            try:
+                feature = json.loads(line)
+                geom = GEOSGeometry(json.dumps(feature["geometry"]), srid=4326)
+                name = feature["properties"][name_property]
+            except (ValueError, KeyError, TypeError) as e:
+                raise CommandError(f"Invalid feature on line {line_number}: {e}")
+
+            if geom.geom_type == "Polygon":
+                geom = MultiPolygon(geom, srid=4326)
+
+            if geom.geom_type != "MultiPolygon":
+                self.stderr.write(f"Skipping {geom.geom_type} on line {line_number}")
+                continue
+
+            self.count += 1
+            writer.writerow([self.level, name[:100], geom.hexewkb.decode()])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def handle(self, *args, **options):
+        self.level = options["level"]
+        self.count = 0
+        columns = ", ".join(
+            Boundary._meta.get_field(field).column
+            for field in ("level", "name", "geom")
+        )
+
+        features = sys.stdin if options["path"] == "-" else open(options["path"])
+
+        with features, transaction.atomic():
+            if options["replace"]:
+                Boundary.objects.filter(level=self.level).delete()
+
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY {Boundary._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)",
+                    IteratorFile(self.rows(features, options["name_property"])),
+                )
+
+        self.stdout.write(f"Loaded {self.count} {self.level} boundaries")
+
+        if options["update_walks"]:
+            updated = update_walks_from_boundaries()
+            self.stdout.write(f"Updated the location of {updated} walks")
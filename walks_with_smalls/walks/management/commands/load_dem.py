@@ -0,0 +1,156 @@
+import os
+
+from django.conf import settings
+from django.contrib.gis.gdal import GDALException, GDALRaster
+from django.contrib.gis.geos import Polygon
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from walks.models import ElevationTile, Walk
+from walks.search import search_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Load digital elevation model files (e.g. the OS Terrain 50 GeoTIFF or ASCII grid tiles) into ElevationTiles, "
+        "reprojected to WGS84 and cut into tiles of ELEVATION_TILE_SIZE pixels, "
+        "then measure the elevations of the walks they cover. "
+        "Directories are searched for .tif and .asc files"
+    )
+
+    EXTENSIONS = (".tif", ".tiff", ".asc")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Files or directories to load")
+        parser.add_argument(
+            "--srid",
+            type=int,
+            default=27700,
+            help="The SRID of files that don't say, OS Terrain 50 ASCII grids are in British National Grid",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Walks to measure at a time"
+        )
+
+    def files(self, paths):
+        for path in paths:
+            if not os.path.isdir(path):
+                yield path
+                continue
+
+            for directory, _, names in sorted(os.walk(path)):
+                for name in sorted(names):
+                    if name.lower().endswith(self.EXTENSIONS):
+                        yield os.path.join(directory, name)
+
+    @staticmethod
+    def window(raster, srid, x, y, width, height):
+        """
+        A copy in memory of width x height pixels of the first band of a raster from pixel x, y
+        """
+        band = raster.bands[0]
+        return GDALRaster(
+            {
+                "srid": srid,
+                "width": width,
+                "height": height,
+                "origin": (
+                    raster.origin.x + x * raster.scale.x + y * raster.skew.x,
+                    raster.origin.y + x * raster.skew.y + y * raster.scale.y,
+                ),
+                "scale": (raster.scale.x, raster.scale.y),
+                "skew": (raster.skew.x, raster.skew.y),
+                "datatype": band.datatype(),
+                "bands": [
+                    {
+                        "data": band.data(offset=(x, y), size=(width, height)),
+                        "nodata_value": band.nodata_value,
+                    }
+                ],
+            }
+        )
+
+    def tiles(self, raster, size):
+        """
+        Cut a raster in to rasters of at most size x size pixels
+        """
+        for y in range(0, raster.height, size):
+            for x in range(0, raster.width, size):
+                yield self.window(
+                    raster,
+                    raster.srid,
+                    x,
+                    y,
+                    min(size, raster.width - x),
+                    min(size, raster.height - y),
+                )
+
+    def load(self, path, srid):
+        """
+        Replace the tiles of a file, returning the extent it covers in degrees
+        """
+        try:
+            raster = GDALRaster(path)
+        except GDALException as e:
+            raise CommandError(f"Could not read {path}: {e}")
+
+        if raster.srs is None:
+            # e.g. ASCII grids without a .prj file, copied rather than writing one next to the file
+            raster = self.window(raster, srid, 0, 0, raster.width, raster.height)
+
+        if raster.srid != 4326:
+            # kept in memory rather than written next to the file
+            raster = raster.transform(4326, driver="MEM", resampling="Bilinear")
+
+        source = os.path.basename(path)
+
+        with transaction.atomic():
+            ElevationTile.objects.filter(source=source).delete()
+            tiles = ElevationTile.objects.bulk_create(
+                ElevationTile(rast=tile, source=source)
+                for tile in self.tiles(raster, settings.ELEVATION_TILE_SIZE)
+            )
+
+        self.stdout.write(f"Loaded {len(tiles)} tiles from {path}")
+        return raster.extent
+
+    def handle(self, *args, **options):
+        extents = [
+            Polygon.from_bbox(self.load(path, options["srid"]))
+            for path in self.files(options["paths"])
+        ]
+
+        if not extents:
+            raise CommandError("No elevation files found")
+
+        # the walks in the loaded areas, wherever they start
+        walks = Walk.objects.none()
+
+        for extent in extents:
+            extent.srid = 4326
+            walks |= Walk.objects.filter(route_envelope__bboverlaps=extent)
+
+        pks = list(walks.order_by("pk").values_list("pk", flat=True))
+
+        for start in range(0, len(pks), options["batch_size"]):
+            batch = Walk.objects.filter(
+                pk__in=pks[start : start + options["batch_size"]]
+            )
+
+            with transaction.atomic():
+                Walk.measure_elevations(batch)
+                # the search entries have copies of the ascents
+                Walk.refresh_search(batch)
+
+            self.stdout.write(
+                f"Measured {min(start + options['batch_size'], len(pks))} of {len(pks)} walks"
+            )
+
+        # searches limiting the climb find different walks
+        search_cache.invalidate(extents)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Loaded {len(extents)} files, measured the elevations of {len(pks)} walks"
+            )
+        )
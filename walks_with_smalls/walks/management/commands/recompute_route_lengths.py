@@ -0,0 +1,101 @@
+from django.contrib.gis.measure import D
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from walks.models import GeocodeJob, POINT_LOCATION_FIELDS, Walk
+from walks.search import search_cache
+from walks.tiles import tile_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the route_length, start and route_envelope of every walk from its route in the database, "
+        "a batch of walks per UPDATE. Walks whose start moves have had their routes changed, "
+        "so what else is derived from them is rebuilt as when they are saved, "
+        "and they are queued to be reverse geocoded again. "
+        "Walks are processed in id order so an interrupted run can be resumed with --start-after"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Walks to update at a time"
+        )
+        parser.add_argument(
+            "--start-after",
+            type=int,
+            default=0,
+            help="Only process walks after this id",
+        )
+
+    @staticmethod
+    def recompute(pks):
+        """
+        Update the walks in one statement, returning the ids of the walks whose start moved
+        """
+        walk_table = Walk._meta.db_table
+
+        with connection.cursor() as cursor:
+            # the previous row is read as it was before the update
+            cursor.execute(
+                f"UPDATE {walk_table} AS walk SET "
+                f"route_length = ST_Length(walk.route::geography) / %s, "
+                f"start = ST_StartPoint(walk.route), "
+                f"start_geography = ST_StartPoint(walk.route)::geography, "
+                # a polygon even for straight north-south or east-west routes, unlike ST_Envelope
+                f"route_envelope = ST_MakeEnvelope("
+                f"  ST_XMin(walk.route), ST_YMin(walk.route), ST_XMax(walk.route), ST_YMax(walk.route), "
+                f"  ST_SRID(walk.route)"
+                f") "
+                f"FROM {walk_table} AS previous "
+                f"WHERE previous.id = walk.id AND walk.id = ANY(%s) "
+                f"RETURNING walk.id, previous.start IS NULL OR NOT ST_Equals(previous.start, walk.start)",
+                [D(mi=1).m, pks],
+            )
+            return [pk for pk, moved in cursor.fetchall() if moved]
+
+    def handle(self, *args, **options):
+        last_pk = options["start_after"]
+        processed = 0
+        moved = 0
+
+        while True:
+            pks = list(
+                Walk.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[: options["batch_size"]]
+            )
+
+            if not pks:
+                break
+
+            with transaction.atomic():
+                moved_pks = self.recompute(pks)
+                moved_walks = Walk.objects.filter(pk__in=moved_pks)
+
+                if moved_pks:
+                    # looked up again for the new starts, as Walk.save does
+                    moved_walks.update(
+                        **{field: None for field in POINT_LOCATION_FIELDS}
+                    )
+                    Walk.refresh_routes(moved_walks)
+
+                # the search entries have copies of the lengths, starts and location details
+                Walk.refresh_search(Walk.objects.filter(pk__in=pks))
+
+                for walk in moved_walks.only("pk"):
+                    GeocodeJob.enqueue(walk)
+
+            processed += len(pks)
+            moved += len(moved_pks)
+            last_pk = pks[-1]
+            self.stdout.write(
+                f"{processed} walks recomputed ({moved} starts moved). Last id {last_pk}"
+            )
+
+        # lengths are shown in the tiles and change how searches rank walks
+        search_cache.invalidate_all()
+        tile_cache.clear()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Recomputed {processed} walks, {moved} starts moved")
+        )
@@ -0,0 +1,156 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils.timezone import now
+
+from opencage.geocoder import RateLimitExceededError
+
+from walks.geocoding import get_geocoder, TokenBucket
+from walks.models import GeocodeJob, ReverseGeocodeCache, Walk
+from walks.search import search_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the location details of walks that have never been reverse geocoded or whose details have expired. "
+        "Walks are processed in id order so an interrupted run can be resumed with --start-after"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Number of concurrent lookups"
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=1,
+            help="Maximum lookups per second. Lowered automatically to fit the remaining OpenCage quota",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Walks to update at a time"
+        )
+        parser.add_argument(
+            "--start-after",
+            type=int,
+            default=0,
+            help="Only process walks after this id",
+        )
+        parser.add_argument("--limit", type=int, help="Stop after this many walks")
+
+    def lookup(self, point):
+        """
+        Run in a worker thread
+        """
+        try:
+            self.bucket.acquire()
+            location = self.geocoder.reverse_geocode(point)
+            self.bucket.update_from_quota(self.geocoder.rate)
+            return location
+        finally:
+            # backends may use the database from this thread
+            connection.close()
+
+    def geocode_batch(self, walks, executor):
+        """
+        Look up the location of each walk, caching the area details for new walks nearby.
+        The geocoder is only asked for walks starting in cells that aren't cached,
+        unless REVERSE_GEOCODE_POINT_DETAILS is set for their what3words and formatted addresses.
+        Returns the walks that were updated
+        """
+        located = []
+        futures = []
+
+        for walk in walks:
+            location = (
+                None
+                if settings.REVERSE_GEOCODE_POINT_DETAILS
+                else ReverseGeocodeCache.lookup(walk.start)
+            )
+
+            if location:
+                walk.set_location(location)
+                located.append(walk)
+            else:
+                futures.append((walk, executor.submit(self.lookup, walk.start)))
+
+        for walk, future in futures:
+            location = future.result()
+
+            if not location:
+                continue
+
+            ReverseGeocodeCache.store(walk.start, location)
+            walk.set_location(location)
+            located.append(walk)
+
+        return located
+
+    def handle(self, *args, **options):
+        self.geocoder = get_geocoder()
+
+        if self.geocoder is None:
+            raise CommandError("No reverse geocoding backends are available")
+
+        self.bucket = TokenBucket(options["rate"], capacity=options["workers"])
+
+        queryset = Walk.objects.filter(
+            Q(reverse_geocode_cache_time__isnull=True)
+            | Q(
+                reverse_geocode_cache_time__lt=now()
+                - settings.REVERSE_GEOCODE_CACHE_TTL
+            )
+        ).order_by("pk")
+        total = queryset.filter(pk__gt=options["start_after"]).count()
+
+        if options["limit"]:
+            total = min(total, options["limit"])
+
+        self.stdout.write(f"{total} walks to re-geocode")
+
+        last_pk = options["start_after"]
+        processed = 0
+        updated = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while processed < total:
+                batch_size = min(options["batch_size"], total - processed)
+                walks = list(
+                    queryset.filter(pk__gt=last_pk).only(
+                        "pk", "start", *Walk.GEOCODE_FIELDS
+                    )[:batch_size]
+                )
+
+                if not walks:
+                    break
+
+                try:
+                    located = self.geocode_batch(walks, executor)
+                except RateLimitExceededError as e:
+                    raise CommandError(
+                        f"{e}. Resume with --start-after {last_pk}"
+                    ) from e
+
+                Walk.objects.bulk_update(located, Walk.GEOCODE_FIELDS)
+                Walk.refresh_search(
+                    Walk.objects.filter(pk__in=[walk.pk for walk in located])
+                )
+                GeocodeJob.objects.filter(walk__in=located).delete()
+                # the location details are shown on the results
+                search_cache.invalidate([walk.start for walk in located])
+
+                processed += len(walks)
+                updated += len(located)
+                last_pk = walks[-1].pk
+                elapsed = max(time.monotonic() - started, 0.001)
+
+                self.stdout.write(
+                    f"{processed}/{total} walks processed ({updated} updated) "
+                    f"at {processed / elapsed:.1f} walks/s. Last id {last_pk}"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} of {processed} walks"))
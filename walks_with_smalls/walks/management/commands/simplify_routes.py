@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from walks.models import Walk
+from walks.tiles import tile_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the simplified copies of walk routes drawn on maps. "
+        "Walks build them when saved, this fills them in for walks that don't have them, "
+        "or rebuilds them all with --all after the tolerances are changed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild the copies of every walk, not just those without them",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Walks to update at a time"
+        )
+
+    def handle(self, *args, **options):
+        walks = Walk.objects.order_by("pk")
+
+        if not options["all"]:
+            walks = walks.filter(route_detail__isnull=True)
+
+        pks = list(walks.values_list("pk", flat=True))
+
+        for start in range(0, len(pks), options["batch_size"]):
+            Walk.simplify_routes(
+                Walk.objects.filter(pk__in=pks[start : start + options["batch_size"]])
+            )
+            self.stdout.write(
+                f"Simplified {min(start + options['batch_size'], len(pks))} of {len(pks)} routes"
+            )
+
+        # the tiles are drawn from the simplified copies
+        tile_cache.clear()
+
+        self.stdout.write(self.style.SUCCESS(f"Simplified {len(pks)} routes"))
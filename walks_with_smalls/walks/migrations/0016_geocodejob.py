@@ -0,0 +1,61 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("walks", "0015_auto_20201120_1100"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="walk", unique_together={("name", "submitter")},
+        ),
+        migrations.CreateModel(
+            name="GeocodeJob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "Pending"), ("failed", "Failed")],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("run_after", models.DateTimeField(default=django.utils.timezone.now)),
+                ("last_error", models.TextField(blank=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "walk",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="geocode_job",
+                        to="walks.walk",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="geocodejob",
+            index=models.Index(
+                fields=["status", "run_after"], name="walks_geoco_status_d146b7_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0016_geocodejob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReverseGeocodeCache",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cell", models.CharField(max_length=12, unique=True)),
+                ("cached_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("hits", models.PositiveIntegerField(default=0)),
+                ("misses", models.PositiveIntegerField(default=0)),
+                ("what3words", models.CharField(blank=True, max_length=100, null=True)),
+                ("continent", models.CharField(blank=True, max_length=100, null=True)),
+                ("country", models.CharField(blank=True, max_length=100, null=True)),
+                ("state", models.CharField(blank=True, max_length=100, null=True)),
+                ("county", models.CharField(blank=True, max_length=100, null=True)),
+                ("city", models.CharField(blank=True, max_length=100, null=True)),
+                ("suburb", models.CharField(blank=True, max_length=100, null=True)),
+                ("road", models.CharField(blank=True, max_length=100, null=True)),
+                ("postcode", models.CharField(blank=True, max_length=100, null=True)),
+                ("formatted", models.CharField(blank=True, max_length=500, null=True)),
+            ],
+            options={"verbose_name_plural": "reverse geocode cache",},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:08
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0017_reversegeocodecache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Boundary",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "level",
+                    models.CharField(
+                        choices=[
+                            ("continent", "Continent"),
+                            ("country", "Country"),
+                            ("state", "State"),
+                            ("county", "County"),
+                            ("city", "City"),
+                            ("suburb", "Suburb"),
+                            ("postcode", "Postcode"),
+                        ],
+                        db_index=True,
+                        max_length=20,
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "geom",
+                    django.contrib.gis.db.models.fields.MultiPolygonField(srid=4326),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def normalise_postcode(postcode):
+    postcode = " ".join(postcode.upper().split())
+
+    if " " not in postcode and 5 <= len(postcode) <= 7:
+        postcode = f"{postcode[:-3]} {postcode[-3:]}"
+
+    return postcode
+
+
+def normalise_postcodes(apps, schema_editor):
+    """
+    Normalise the stored postcodes, removing any that become duplicates
+    """
+    PostCode = apps.get_model("walks", "PostCode")
+    seen = set()
+
+    for postcode in PostCode.objects.order_by("pk"):
+        normalised = normalise_postcode(postcode.postcode)
+
+        if normalised in seen:
+            postcode.delete()
+            continue
+
+        seen.add(normalised)
+
+        if normalised != postcode.postcode:
+            postcode.postcode = normalised
+            postcode.save(update_fields=["postcode"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0018_boundary"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalise_postcodes, migrations.RunPython.noop),
+    ]
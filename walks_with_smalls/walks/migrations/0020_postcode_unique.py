@@ -0,0 +1,18 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0019_normalise_postcodes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="postcode",
+            name="postcode",
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0020_postcode_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutcodeCentroid",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("outcode", models.CharField(max_length=4, unique=True)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+                ("postcodes", models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SectorCentroid",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sector", models.CharField(max_length=6, unique=True)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+                ("postcodes", models.PositiveIntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0021_postcode_centroids"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="walk",
+            index=models.Index(
+                fields=["created", "id"], name="walks_walk_created_f3b7ea_idx"
+            ),
+        ),
+    ]
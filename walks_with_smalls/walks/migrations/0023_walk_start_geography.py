@@ -0,0 +1,25 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:18
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0022_walk_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="walk",
+            name="start_geography",
+            field=django.contrib.gis.db.models.fields.PointField(
+                blank=True, geography=True, null=True, srid=4326
+            ),
+        ),
+        migrations.RunSQL(
+            "UPDATE walks_walk SET start_geography = start::geography WHERE start IS NOT NULL",
+            migrations.RunSQL.noop,
+        ),
+    ]
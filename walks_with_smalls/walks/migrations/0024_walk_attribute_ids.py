@@ -0,0 +1,35 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:20
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0023_walk_start_geography"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="walk",
+            name="attribute_ids",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.IntegerField(), blank=True, default=list, size=None
+            ),
+        ),
+        migrations.RunSQL(
+            "UPDATE walks_walk SET attribute_ids = attributes.ids FROM ("
+            "  SELECT walk_id, array_agg(attribute_id ORDER BY attribute_id) AS ids "
+            "  FROM walks_walk_attributes GROUP BY walk_id"
+            ") AS attributes WHERE walks_walk.id = attributes.walk_id",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="walk",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["attribute_ids"], name="walks_walk_attribu_f565c9_gin"
+            ),
+        ),
+    ]
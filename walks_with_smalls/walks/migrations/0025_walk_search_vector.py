@@ -0,0 +1,35 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:34
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0024_walk_attribute_ids"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="walk",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(
+            "UPDATE walks_walk SET search_vector = "
+            "setweight(to_tsvector('english', COALESCE(name, '')), 'A') || "
+            "setweight(to_tsvector('english', COALESCE(description, '')), 'B') || "
+            "setweight(to_tsvector('english', concat_ws(' ', suburb, city, road, county, postcode)), 'C')",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="walk",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="walks_walk_search__5f8199_gin"
+            ),
+        ),
+    ]
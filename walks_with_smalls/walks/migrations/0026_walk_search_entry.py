@@ -0,0 +1,108 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:36
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0025_walk_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WalkSearchEntry",
+            fields=[
+                (
+                    "walk",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="walks.walk",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("slug", models.SlugField(db_index=False, max_length=255)),
+                ("submitter_username", models.CharField(max_length=150)),
+                ("description", models.CharField(max_length=300)),
+                ("place", models.CharField(blank=True, max_length=300)),
+                ("start", django.contrib.gis.db.models.fields.PointField(srid=4326)),
+                (
+                    "start_geography",
+                    django.contrib.gis.db.models.fields.PointField(
+                        geography=True, srid=4326
+                    ),
+                ),
+                ("route_length", models.FloatField()),
+                (
+                    "attribute_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                (
+                    "attribute_names",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=255),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                (
+                    "search_vector",
+                    django.contrib.postgres.search.SearchVectorField(
+                        blank=True, null=True
+                    ),
+                ),
+                (
+                    "what3words",
+                    models.CharField(blank=True, max_length=100, null=True),
+                ),
+                ("created", models.DateTimeField()),
+            ],
+        ),
+        migrations.RunSQL(
+            "INSERT INTO walks_walksearchentry (walk_id, name, slug, submitter_username, description, place, "
+            "start, start_geography, route_length, attribute_ids, attribute_names, search_vector, what3words, created) "
+            "SELECT walk.id, walk.name, walk.slug, submitter.username, left(walk.description, 300), "
+            "concat_ws(', ', NULLIF(walk.road, ''), NULLIF(walk.county, ''), NULLIF(walk.postcode, '')), "
+            "walk.start, walk.start_geography, walk.route_length, walk.attribute_ids, "
+            "COALESCE(("
+            "  SELECT array_agg(attribute.attribute ORDER BY attribute.id) FROM walks_attribute AS attribute "
+            "  WHERE attribute.id = ANY(walk.attribute_ids)"
+            "), '{}'), "
+            "walk.search_vector, walk.what3words, walk.created "
+            "FROM walks_walk AS walk "
+            "JOIN users_user AS submitter ON submitter.id = walk.submitter_id",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="walksearchentry",
+            index=models.Index(
+                fields=["created", "walk"], name="walks_walks_created_bfdeec_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="walksearchentry",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["attribute_ids"], name="walks_walks_attribu_7ab066_gin"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="walksearchentry",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="walks_walks_search__89e259_gin"
+            ),
+        ),
+    ]
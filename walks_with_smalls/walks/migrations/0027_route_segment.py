@@ -0,0 +1,48 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:41
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0026_walk_search_entry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RouteSegment",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "segment",
+                    django.contrib.gis.db.models.fields.LineStringField(
+                        geography=True, srid=4326
+                    ),
+                ),
+                (
+                    "walk",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="route_segments",
+                        to="walks.walk",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunSQL(
+            "INSERT INTO walks_routesegment (walk_id, segment) "
+            "SELECT id, ST_Subdivide(route, 32)::geography FROM walks_walk",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:44
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0027_route_segment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="walk",
+            name="route_envelope",
+            field=django.contrib.gis.db.models.fields.PolygonField(
+                blank=True, editable=False, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="walksearchentry",
+            name="route_envelope",
+            field=django.contrib.gis.db.models.fields.PolygonField(
+                null=True, srid=4326
+            ),
+        ),
+        migrations.RunSQL(
+            "UPDATE walks_walk SET route_envelope = "
+            "ST_MakeEnvelope(ST_XMin(route), ST_YMin(route), ST_XMax(route), ST_YMax(route), 4326)",
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            "UPDATE walks_walksearchentry AS entry SET route_envelope = walk.route_envelope "
+            "FROM walks_walk AS walk WHERE walk.id = entry.walk_id",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name="walksearchentry",
+            name="route_envelope",
+            field=django.contrib.gis.db.models.fields.PolygonField(srid=4326),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:47
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0028_route_envelope"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="walk",
+            name="route_detail",
+            field=django.contrib.gis.db.models.fields.LineStringField(
+                blank=True, editable=False, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="walk",
+            name="route_overview",
+            field=django.contrib.gis.db.models.fields.LineStringField(
+                blank=True, editable=False, null=True, srid=4326
+            ),
+        ),
+    ]
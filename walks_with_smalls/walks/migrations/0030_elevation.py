@@ -0,0 +1,71 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:52
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0029_simplified_routes"),
+    ]
+
+    operations = [
+        # rasters are in their own extension from PostGIS 3
+        migrations.RunSQL(
+            "CREATE EXTENSION IF NOT EXISTS postgis_raster", migrations.RunSQL.noop
+        ),
+        migrations.CreateModel(
+            name="ElevationTile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rast", django.contrib.gis.db.models.fields.RasterField(srid=4326)),
+                ("source", models.CharField(db_index=True, max_length=255)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="walk",
+            name="ascent",
+            field=models.FloatField(
+                blank=True,
+                editable=False,
+                help_text="The total climb of the walk in metres",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="walk",
+            name="elevation_profile",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.SmallIntegerField(null=True),
+                blank=True,
+                editable=False,
+                null=True,
+                size=None,
+            ),
+        ),
+        migrations.AddField(
+            model_name="walk",
+            name="max_gradient",
+            field=models.FloatField(
+                blank=True,
+                editable=False,
+                help_text="The steepest gradient along the walk in percent",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="walksearchentry",
+            name="ascent",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
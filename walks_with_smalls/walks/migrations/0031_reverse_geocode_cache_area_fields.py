@@ -0,0 +1,15 @@
+# Generated by Django 3.1.3 on 2026-10-18 10:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0030_elevation"),
+    ]
+
+    operations = [
+        migrations.RemoveField(model_name="reversegeocodecache", name="formatted",),
+        migrations.RemoveField(model_name="reversegeocodecache", name="what3words",),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.3 on 2026-10-18 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("walks", "0031_reverse_geocode_cache_area_fields"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="reversegeocodecache",
+            name="cached_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
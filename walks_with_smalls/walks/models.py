@@ -1,17 +1,42 @@
-from datetime import timedelta, datetime
-
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.gis.db import models
-from django.contrib.gis.geos import Point
+from django.contrib.gis.geos import Point, Polygon
 from django.contrib.gis.measure import D
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.dispatch import Signal
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.timezone import now
 
 from users.models import User
 
-from opencage.geocoder import OpenCageGeocode, RateLimitExceededError
+from . import geohash
+
+# reverse geocoded location details of areas, that can be shared between nearby walks
+AREA_LOCATION_FIELDS = (
+    "continent",
+    "country",
+    "state",
+    "county",
+    "city",
+    "suburb",
+    "road",
+    "postcode",
+)
+# reverse geocoded location details only right for the walk's start itself,
+# a what3words address names a 3m square and the formatted address is a street address
+POINT_LOCATION_FIELDS = ("what3words", "formatted")
+LOCATION_FIELDS = AREA_LOCATION_FIELDS + POINT_LOCATION_FIELDS
+# sent once a saved walk and the rows derived from it are committed,
+# with its starts and routes before and after so the searches and tiles cached from them can be invalidated
+walk_changed = Signal()
+# the location details searched by text searches
+SEARCH_LOCATION_FIELDS = ("suburb", "city", "road", "county", "postcode")
 
 
 def get_sentinel_user():
@@ -43,11 +68,36 @@ class Walk(models.Model):
     slug = models.SlugField(max_length=255)
     description = models.TextField()
     start = models.PointField(blank=True, null=True)
+    # a copy of start for searching, distances on geography are in metres and can use the spatial index
+    start_geography = models.PointField(geography=True, blank=True, null=True)
     route = models.LineStringField()
+    # the bounding box of the route, for searching areas with the && operator on its spatial index
+    route_envelope = models.PolygonField(blank=True, null=True, editable=False)
+    # simplified copies of the route for drawing on maps, see simplify_routes and route_for_zoom
+    route_overview = models.LineStringField(blank=True, null=True, editable=False)
+    route_detail = models.LineStringField(blank=True, null=True, editable=False)
     submitter = models.ForeignKey(User, on_delete=models.SET(get_sentinel_user))
     route_length = models.FloatField(
         help_text="The length of the walk in miles", default=0
     )
+    # sampled from the ElevationTiles when the walk is saved, see measure_elevations.
+    # null where there is no elevation data for the route
+    ascent = models.FloatField(
+        help_text="The total climb of the walk in metres",
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    max_gradient = models.FloatField(
+        help_text="The steepest gradient along the walk in percent",
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    # heights in metres at ELEVATION_PROFILE_POINTS evenly spaced points along the route
+    elevation_profile = ArrayField(
+        models.SmallIntegerField(null=True), blank=True, null=True, editable=False
+    )
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -68,9 +118,21 @@ class Walk(models.Model):
     formatted = models.CharField(max_length=500, blank=True, null=True)
 
     attributes = models.ManyToManyField(Attribute, blank=True)
+    # the ids of the attributes, kept in sync by walks.signals so searches don't need to join
+    attribute_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+    # the name, description and location details for text searches, see refresh_search
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+
+    GEOCODE_FIELDS = LOCATION_FIELDS + ("geohash", "reverse_geocode_cache_time")
 
     class Meta:
         unique_together = ("name", "submitter")
+        indexes = [
+            # pages through unsearched results newest first
+            models.Index(fields=["created", "id"]),
+            GinIndex(fields=["attribute_ids"]),
+            GinIndex(fields=["search_vector"]),
+        ]
 
     def get_absolute_url(self):
         return reverse(
@@ -91,62 +153,574 @@ class Walk(models.Model):
             self.start = self.calculate_walk_start()
             start_location_changed = True
 
-        if self.start != self.calculate_walk_start():
+        previous_start = None
+
+        if not self.start.equals_exact(self.calculate_walk_start(), tolerance=1e-6):
+            # kept so searches that found the walk where it was can be invalidated
+            previous_start = self.start
+            self.start = self.calculate_walk_start()
             start_location_changed = True
 
+        self.start_geography = self.start
+
         # check if the cache_has expired
         if self.reverse_geocode_cache_time is None:
             cache_expired = True
         else:
             cache_expired = self.reverse_geocode_cache_time < (
-                now() - timedelta(days=180)
+                now() - settings.REVERSE_GEOCODE_CACHE_TTL
             )
 
-        # update the location details if we need to
+        if start_location_changed:
+            # looked up again for the new start
+            for field in POINT_LOCATION_FIELDS:
+                setattr(self, field, None)
+
+        cached_location = False
+
+        # use the area details of a nearby walk rather than looking them up again
         if start_location_changed or cache_expired:
-            if settings.OPENCAGE_API_KEY:
-                geocoder = OpenCageGeocode(settings.OPENCAGE_API_KEY)
-
-                try:
-                    results = geocoder.reverse_geocode(
-                        round(self.start[1], 6),
-                        round(self.start[0], 6),
-                        language="en",
-                        limit=1,
-                    )
-
-                    if results and len(results):
-                        self.what3words = (
-                            results[0].get("annotations").get("what3words").get("words")
-                        )
-                        self.geohash = results[0].get("annotations").get("geohash")
-                        self.continent = results[0].get("components").get("continent")
-                        self.country = results[0].get("components").get("country")
-                        self.state = results[0].get("components").get("state")
-                        self.county = results[0].get("components").get("county")
-                        self.city = results[0].get("components").get("city")
-                        self.suburb = results[0].get("components").get("suburb")
-                        self.road = results[0].get("components").get("road")
-                        self.postcode = results[0].get("components").get("postcode")
-                        self.formatted = results[0].get("formatted")
-
-                        self.reverse_geocode_cache_time = now()
-
-                except RateLimitExceededError as e:
-                    print(e)
-
-        self.route.transform(3857)
-        self.route_length = D(m=self.route.length).mi
-        super().save(*args, **kwargs)
+            # a miss is counted when the queued job looks it up
+            location = ReverseGeocodeCache.lookup(self.start, count_miss=False)
+
+            if location:
+                self.set_location(location)
+                # the what3words and formatted addresses are only looked up if asked for
+                cached_location = not settings.REVERSE_GEOCODE_POINT_DETAILS
+
+        self.route_envelope = Polygon.from_bbox(self.route.extent)
+        self.route_envelope.srid = self.route.srid
+
+        # the walk and the rows derived from it are saved together
+        with transaction.atomic():
+            # kept so the map tiles and searches along the previous route can be invalidated
+            previous_route = (
+                Walk.objects.filter(pk=self.pk).values_list("route", flat=True).first()
+                if self.pk
+                else None
+            )
+            super().save(*args, **kwargs)
+            self.route_length = Walk.measure_routes(Walk.objects.filter(pk=self.pk))[
+                self.pk
+            ]
+            (
+                self.ascent,
+                self.max_gradient,
+                self.elevation_profile,
+            ) = Walk.refresh_routes(Walk.objects.filter(pk=self.pk)).get(
+                self.pk, (None, None, None)
+            )
+            Walk.refresh_search(Walk.objects.filter(pk=self.pk))
+
+            # the location details are looked up in the background by the geocode_worker
+            if (start_location_changed or cache_expired) and not cached_location:
+                GeocodeJob.enqueue(self)
+
+            # once committed, so searches and tiles aren't cached from the walk as it was in between
+            starts = [self.start, previous_start]
+            routes = [self.route, previous_route]
+            transaction.on_commit(
+                lambda: walk_changed.send(
+                    sender=Walk, instance=self, starts=starts, routes=routes
+                )
+            )
+
+    def set_location(self, location):
+        """
+        Set the reverse geocoded location details from a dict of field values
+        """
+        for field, value in location.items():
+            setattr(self, field, value)
+
+        self.geohash = geohash.encode(self.start.y, self.start.x, precision=20)
+        self.reverse_geocode_cache_time = now()
+
+    @staticmethod
+    def measure_routes(queryset):
+        """
+        Set the route_length of the walks in the queryset to the geodesic length of their routes,
+        measured by PostGIS on the spheroid. Returns the new lengths by walk id
+        """
+        pks_sql, pks_params = queryset.values("pk").query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Walk._meta.db_table} SET route_length = ST_Length(route::geography) / %s "
+                f"WHERE id IN ({pks_sql}) RETURNING id, route_length",
+                [D(mi=1).m] + list(pks_params),
+            )
+            return dict(cursor.fetchall())
+
+    @staticmethod
+    def measure_elevations(queryset):
+        """
+        Sample the heights of the ElevationTiles along the routes of the walks in the queryset with ST_Value,
+        at least every ELEVATION_SAMPLE_SPACING metres, and set their ascent (the sum of the rises between samples),
+        max_gradient (over ELEVATION_GRADIENT_DISTANCE metres, or the whole route if it's shorter)
+        and elevation_profile.
+        Samples are spaced by fractions of the route's length in degrees, close enough to even for a walk.
+        Returns (ascent, max_gradient, elevation_profile) by walk id
+        """
+        intervals = settings.ELEVATION_PROFILE_POINTS - 1
+
+        with connection.cursor() as cursor:
+            # every step'th sample is a point of the profile, so the profile is evenly spaced too
+            cursor.execute(
+                f"WITH walks AS ("
+                f"  SELECT id, route, length / (%(intervals)s * step) AS spacing, %(intervals)s * step AS samples "
+                f"  FROM ("
+                f"    SELECT id, route, length, "
+                f"    greatest(1, ceil(length / %(spacing)s / %(intervals)s))::integer AS step "
+                f"    FROM (SELECT id, route, ST_Length(route::geography) AS length "
+                f"    FROM {Walk._meta.db_table} WHERE id = ANY(%(pks)s)) AS measured"
+                f"  ) AS stepped"
+                f"), samples AS ("
+                f"  SELECT walks.id, sample, walks.samples / %(intervals)s AS step, walks.spacing, walks.samples, "
+                f"  (SELECT ST_Value(tile.rast, point) FROM {ElevationTile._meta.db_table} AS tile "
+                f"  WHERE ST_Intersects(tile.rast, point) LIMIT 1) AS elevation "
+                f"  FROM walks "
+                f"  CROSS JOIN LATERAL generate_series(0, walks.samples) AS sample "
+                f"  CROSS JOIN LATERAL ST_LineInterpolatePoint(walks.route, sample::float / walks.samples) AS point"
+                f"), steps AS ("
+                f"  SELECT id, sample, step, elevation, "
+                f"  elevation - lag(elevation) OVER ordered AS rise, "
+                f"  abs(lead(elevation, gradient_samples) OVER ordered - elevation) "
+                f"  / NULLIF(gradient_samples * spacing, 0) * 100 AS gradient "
+                f"  FROM ("
+                f"    SELECT *, least(samples, greatest(1, round(%(gradient)s / NULLIF(spacing, 0))))::integer "
+                f"    AS gradient_samples "
+                f"    FROM samples"
+                f"  ) AS spaced "
+                f"  WINDOW ordered AS (PARTITION BY id ORDER BY sample)"
+                f"), measured AS ("
+                f"  SELECT id, sum(greatest(rise, 0)) AS ascent, max(gradient) AS max_gradient, "
+                f"  CASE WHEN count(elevation) > 0 THEN "
+                f"    array_agg(round(elevation)::smallint ORDER BY sample) FILTER (WHERE mod(sample, step) = 0) "
+                f"  END AS profile "
+                f"  FROM steps GROUP BY id"
+                f") "
+                f"UPDATE {Walk._meta.db_table} AS walk SET "
+                f"ascent = measured.ascent, max_gradient = measured.max_gradient, elevation_profile = measured.profile "
+                f"FROM measured WHERE walk.id = measured.id "
+                f"RETURNING walk.id, walk.ascent, walk.max_gradient, walk.elevation_profile",
+                {
+                    "pks": list(queryset.values_list("pk", flat=True)),
+                    "intervals": intervals,
+                    "spacing": settings.ELEVATION_SAMPLE_SPACING,
+                    "gradient": settings.ELEVATION_GRADIENT_DISTANCE,
+                },
+            )
+            return {pk: tuple(values) for pk, *values in cursor.fetchall()}
+
+    @staticmethod
+    def refresh_routes(queryset):
+        """
+        Rebuild the elevations, RouteSegments and simplified routes of the walks in the queryset from their routes.
+        Needed whenever the routes are changed without save(). Returns the elevations as measure_elevations does
+        """
+        elevations = Walk.measure_elevations(queryset)
+        RouteSegment.refresh(queryset)
+        Walk.simplify_routes(queryset)
+        return elevations
+
+    @staticmethod
+    def simplify_routes(queryset):
+        """
+        Rebuild the simplified copies of the routes of the walks in the queryset
+        with ST_SimplifyPreserveTopology, at ROUTE_OVERVIEW_TOLERANCE and ROUTE_DETAIL_TOLERANCE
+        """
+        pks_sql, pks_params = queryset.values("pk").query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Walk._meta.db_table} SET "
+                f"route_overview = ST_SimplifyPreserveTopology(route, %s), "
+                f"route_detail = ST_SimplifyPreserveTopology(route, %s) "
+                f"WHERE id IN ({pks_sql})",
+                [settings.ROUTE_OVERVIEW_TOLERANCE, settings.ROUTE_DETAIL_TOLERANCE]
+                + list(pks_params),
+            )
+
+    @staticmethod
+    def route_for_zoom(zoom):
+        """
+        The name of the simplest copy of the route with enough detail to draw at a map zoom level
+        """
+        if zoom <= settings.ROUTE_OVERVIEW_MAX_ZOOM:
+            return "route_overview"
+
+        if zoom <= settings.ROUTE_DETAIL_MAX_ZOOM:
+            return "route_detail"
+
+        return "route"
+
+    @staticmethod
+    def refresh_search(queryset):
+        """
+        Rebuild the search_vector and WalkSearchEntry of the walks in the queryset from their current values.
+        Needed whenever the name, description or location details are changed without save()
+        """
+        config = settings.SEARCH_TEXT_CONFIG
+        queryset.update(
+            search_vector=SearchVector("name", weight="A", config=config)
+            + SearchVector("description", weight="B", config=config)
+            + SearchVector(*SEARCH_LOCATION_FIELDS, weight="C", config=config)
+        )
+        WalkSearchEntry.refresh(queryset)
+
+    @classmethod
+    def sync_attribute_ids(cls, pks):
+        """
+        Copy the attributes of the given walks in to their attribute_ids
+        """
+        through = cls.attributes.through._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {cls._meta.db_table} SET attribute_ids = COALESCE(("
+                f"  SELECT array_agg(attribute_id ORDER BY attribute_id) FROM {through} "
+                f"  WHERE walk_id = {cls._meta.db_table}.id"
+                f"), '{{}}') "
+                f"WHERE id = ANY(%s)",
+                [list(pks)],
+            )
 
     def calculate_walk_start(self):
         return Point(srid=self.route.srid, x=self.route[0][0], y=self.route[0][1],)
 
 
+class WalkSearchEntry(models.Model):
+    """
+    A compact copy of what searches and the results' walk cards need from a walk,
+    its attributes and its submitter, so results are read from one narrow table without joins.
+    Entries are refreshed by Walk.refresh_search and walks.signals whenever what they copy changes
+    """
+
+    walk = models.OneToOneField(
+        Walk, on_delete=models.CASCADE, primary_key=True, related_name="search_entry"
+    )
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=255, db_index=False)
+    submitter_username = models.CharField(max_length=150)
+    # the start of the description, enough for the walk cards
+    description = models.CharField(max_length=300)
+    # e.g. "Church Lane, Gloucestershire, GL5 1AA"
+    place = models.CharField(max_length=300, blank=True)
+    start = models.PointField()
+    start_geography = models.PointField(geography=True)
+    route_envelope = models.PolygonField()
+    route_length = models.FloatField()
+    ascent = models.FloatField(blank=True, null=True)
+    attribute_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+    attribute_names = ArrayField(
+        models.CharField(max_length=255), default=list, blank=True
+    )
+    search_vector = SearchVectorField(blank=True, null=True)
+    what3words = models.CharField(max_length=100, blank=True, null=True)
+    created = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created", "walk"]),
+            GinIndex(fields=["attribute_ids"]),
+            GinIndex(fields=["search_vector"]),
+        ]
+
+    def get_absolute_url(self):
+        return reverse(
+            "walk-detail",
+            kwargs={"username": self.submitter_username, "slug": self.slug},
+        )
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def location(self):
+        return self.start.x, self.start.y
+
+    @classmethod
+    def refresh(cls, queryset):
+        """
+        Insert or update the entries of the walks in the queryset in a single statement
+        """
+        walk_table = Walk._meta.db_table
+        user_table = User._meta.db_table
+        attribute_table = Attribute._meta.db_table
+        pks_sql, pks_params = queryset.values("pk").query.sql_with_params()
+        columns = [
+            "name",
+            "slug",
+            "submitter_username",
+            "description",
+            "place",
+            "start",
+            "start_geography",
+            "route_envelope",
+            "route_length",
+            "ascent",
+            "attribute_ids",
+            "attribute_names",
+            "search_vector",
+            "what3words",
+            "created",
+        ]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {cls._meta.db_table} (walk_id, {', '.join(columns)}) "
+                f"SELECT walk.id, walk.name, walk.slug, submitter.username, left(walk.description, %s), "
+                f"concat_ws(', ', NULLIF(walk.road, ''), NULLIF(walk.county, ''), NULLIF(walk.postcode, '')), "
+                f"walk.start, walk.start_geography, walk.route_envelope, walk.route_length, walk.ascent, "
+                f"walk.attribute_ids, "
+                f"COALESCE(("
+                f"  SELECT array_agg(attribute.attribute ORDER BY attribute.id) FROM {attribute_table} AS attribute "
+                f"  WHERE attribute.id = ANY(walk.attribute_ids)"
+                f"), '{{}}'), "
+                f"walk.search_vector, walk.what3words, walk.created "
+                f"FROM {walk_table} AS walk "
+                f"JOIN {user_table} AS submitter ON submitter.id = walk.submitter_id "
+                f"WHERE walk.id IN ({pks_sql}) "
+                f"ON CONFLICT (walk_id) DO UPDATE SET "
+                + ", ".join(f"{column} = EXCLUDED.{column}" for column in columns),
+                [cls._meta.get_field("description").max_length] + list(pks_params),
+            )
+
+
+class RouteSegment(models.Model):
+    """
+    A walk's route split in to pieces of no more than ROUTE_SEGMENT_VERTICES points with ST_Subdivide.
+    Searches along routes look them up with ST_DWithin on their spatial index,
+    so only the pieces near the search are measured rather than whole routes
+    """
+
+    walk = models.ForeignKey(
+        Walk, on_delete=models.CASCADE, related_name="route_segments"
+    )
+    # distances on geography are in metres
+    segment = models.LineStringField(geography=True)
+
+    def __str__(self):
+        return f"{self.walk} segment {self.pk}"
+
+    @classmethod
+    def refresh(cls, queryset):
+        """
+        Replace the segments of the walks in the queryset with ones split from their current routes
+        """
+        pks_sql, pks_params = queryset.values("pk").query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {cls._meta.db_table} WHERE walk_id IN ({pks_sql})",
+                pks_params,
+            )
+            cursor.execute(
+                f"INSERT INTO {cls._meta.db_table} (walk_id, segment) "
+                f"SELECT walk.id, ST_Subdivide(walk.route, %s)::geography "
+                f"FROM {Walk._meta.db_table} AS walk WHERE walk.id IN ({pks_sql})",
+                [settings.ROUTE_SEGMENT_VERTICES] + list(pks_params),
+            )
+
+
+class ElevationTile(models.Model):
+    """
+    A tile of a digital elevation model, heights in metres, loaded by the load_dem management command.
+    Walks sample their heights from the tiles when they are saved, see Walk.measure_elevations
+    """
+
+    rast = models.RasterField()
+    # the file the tile was cut from, so loading the file again replaces its tiles
+    source = models.CharField(max_length=255, db_index=True)
+
+    def __str__(self):
+        return f"{self.source} tile {self.pk}"
+
+
 class PostCode(models.Model):
-    postcode = models.CharField(max_length=100)
+    """
+    The location of a postcode.
+    Postcodes are stored normalised (see walks.postcodes.normalise_postcode)
+    """
+
+    # unique also gets a varchar_pattern_ops index on PostgreSQL for prefix searches
+    postcode = models.CharField(max_length=100, unique=True)
     latitude = models.FloatField()
     longitude = models.FloatField()
 
     def __str__(self):
         return self.postcode
+
+
+class ReverseGeocodeCache(models.Model):
+    """
+    Reverse geocoded area details (AREA_LOCATION_FIELDS) shared by all walks that start in the same geohash cell,
+    so only the first walk in a cell is looked up with the geocoder.
+    Lookups are counted so we can see how often the cache is used
+    """
+
+    cell = models.CharField(max_length=12, unique=True)
+    # null until the area details are stored, for cells that have only missed so far
+    cached_at = models.DateTimeField(blank=True, null=True)
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+
+    continent = models.CharField(max_length=100, blank=True, null=True)
+    country = models.CharField(max_length=100, blank=True, null=True)
+    state = models.CharField(max_length=100, blank=True, null=True)
+    county = models.CharField(max_length=100, blank=True, null=True)
+    city = models.CharField(max_length=100, blank=True, null=True)
+    suburb = models.CharField(max_length=100, blank=True, null=True)
+    road = models.CharField(max_length=100, blank=True, null=True)
+    postcode = models.CharField(max_length=100, blank=True, null=True)
+
+    class Meta:
+        verbose_name_plural = "reverse geocode cache"
+
+    def __str__(self):
+        return self.cell
+
+    @staticmethod
+    def cell_for(point):
+        return geohash.encode(
+            point.y, point.x, precision=settings.REVERSE_GEOCODE_CACHE_PRECISION
+        )
+
+    @classmethod
+    def lookup(cls, point, count_miss=True):
+        """
+        Return a dict of the cached location details for the point or None if there are none.
+        Expired entries count as a miss
+        """
+        cell = cls.cell_for(point)
+        entry = (
+            cls.objects.filter(
+                cell=cell, cached_at__gte=now() - settings.REVERSE_GEOCODE_CACHE_TTL,
+            )
+            .values(*AREA_LOCATION_FIELDS)
+            .first()
+        )
+
+        if entry is None:
+            if count_miss:
+                _, created = cls.objects.get_or_create(
+                    cell=cell, defaults={"misses": 1}
+                )
+
+                if not created:
+                    cls.objects.filter(cell=cell).update(misses=F("misses") + 1)
+
+            return None
+
+        cls.objects.filter(cell=cell).update(hits=F("hits") + 1)
+        return entry
+
+    @classmethod
+    def store(cls, point, location):
+        """
+        Save the area details looked up for the point
+        """
+        cell = cls.cell_for(point)
+        values = {field: location.get(field) for field in AREA_LOCATION_FIELDS}
+
+        cls.objects.update_or_create(cell=cell, defaults={"cached_at": now(), **values})
+
+    @classmethod
+    def stats(cls):
+        return cls.objects.aggregate(hits=Sum("hits"), misses=Sum("misses"))
+
+
+class Boundary(models.Model):
+    """
+    An administrative area loaded by the load_boundaries management command.
+    Used to reverse geocode walk start locations without calling an external API
+    """
+
+    LEVEL_CHOICES = (
+        ("continent", "Continent"),
+        ("country", "Country"),
+        ("state", "State"),
+        ("county", "County"),
+        ("city", "City"),
+        ("suburb", "Suburb"),
+        ("postcode", "Postcode"),
+    )
+
+    level = models.CharField(max_length=20, choices=LEVEL_CHOICES, db_index=True)
+    name = models.CharField(max_length=100)
+    geom = models.MultiPolygonField()
+
+    def __str__(self):
+        return f"{self.name} ({self.level})"
+
+
+class GeocodeJob(models.Model):
+    """
+    A pending reverse geocode lookup for the start location of a Walk.
+    Jobs are created when a Walk is saved and processed by the geocode_worker management command
+    """
+
+    PENDING = "pending"
+    FAILED = "failed"
+    STATUS_CHOICES = ((PENDING, "Pending"), (FAILED, "Failed"))
+
+    walk = models.OneToOneField(
+        Walk, on_delete=models.CASCADE, related_name="geocode_job"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"{self.walk} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, walk):
+        """
+        Queue a lookup for the walk, resetting any existing job for it
+        """
+        return cls.objects.update_or_create(
+            walk=walk,
+            defaults={
+                "status": cls.PENDING,
+                "attempts": 0,
+                "run_after": now(),
+                "last_error": "",
+            },
+        )[0]
+
+
+class OutcodeCentroid(models.Model):
+    """
+    The average location of the postcodes in an outward code, e.g. "GL5".
+    Built from the PostCode table by the build_postcode_centroids management command
+    """
+
+    outcode = models.CharField(max_length=4, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    postcodes = models.PositiveIntegerField()
+
+    def __str__(self):
+        return self.outcode
+
+
+class SectorCentroid(models.Model):
+    """
+    The average location of the postcodes in a postcode sector, e.g. "GL5 4".
+    Built from the PostCode table by the build_postcode_centroids management command
+    """
+
+    sector = models.CharField(max_length=6, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    postcodes = models.PositiveIntegerField()
+
+    def __str__(self):
+        return self.sector
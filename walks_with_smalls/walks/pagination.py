@@ -0,0 +1,197 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.contrib.gis.measure import Distance
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """
+    A cursor couldn't be decoded or doesn't match the ordering being paged through
+    """
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Pages through a queryset by remembering the ordering values of the last object on a page
+    and filtering for the objects that sort after it, rather than counting rows with OFFSET.
+    Fetching a page costs the same wherever it is in the results.
+
+    ordering is a list of field or annotation names as passed to order_by.
+    The primary key is added as a tie breaker if it isn't already the last field
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        ordering = list(ordering)
+
+        if ordering[-1].lstrip("-") != "pk":
+            ordering.append("pk")
+
+        self.queryset = queryset.order_by(*ordering)
+        self.fields = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+        self.per_page = per_page
+
+    @staticmethod
+    def cursor_value(value):
+        if isinstance(value, Distance):
+            return value.m
+
+        if isinstance(value, datetime):
+            return value.isoformat()
+
+        return value
+
+    def encode_cursor(self, obj):
+        values = [self.cursor_value(getattr(obj, name)) for name, _ in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise InvalidCursor("The cursor doesn't match the ordering")
+
+            # isoformat strings are turned back in to datetimes so they compare as such
+            return [
+                (parse_datetime(value) or value) if isinstance(value, str) else value
+                for value in values
+            ]
+        except (binascii.Error, ValueError) as e:
+            raise InvalidCursor(str(e)) from e
+
+    def after(self, values):
+        """
+        Build the filter for objects that sort after the given ordering values, i.e.
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)
+        with the comparisons flipped for descending fields
+        """
+        condition = Q()
+        equal = Q()
+
+        for (name, descending), value in zip(self.fields, values):
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+
+        # bound the leading field as well so an index on it can be range scanned
+        name, descending = self.fields[0]
+        bound = Q(**{f"{name}__{'lte' if descending else 'gte'}": values[0]})
+
+        return bound & condition
+
+    def page_queryset(self, cursor=None):
+        """
+        The queryset for the page after the cursor, with one extra object to tell if there's another page
+        """
+        queryset = self.queryset
+
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor)))
+
+        return queryset[: self.per_page + 1]
+
+    def page(self, cursor=None):
+        object_list = list(self.page_queryset(cursor))
+        next_cursor = None
+
+        if len(object_list) > self.per_page:
+            object_list = object_list[: self.per_page]
+            next_cursor = self.encode_cursor(object_list[-1])
+
+        return KeysetPage(object_list, next_cursor)
+
+    def stream(self, cursor=None, chunk_size=100):
+        """
+        Like page, but the objects are read from the database in chunks as they are iterated over
+        """
+        return KeysetStream(self, self.page_queryset(cursor), chunk_size)
+
+
+class KeysetStream:
+    """
+    A page of objects that are only read as they are iterated over, so large pages don't have to be held in memory.
+    next_cursor is set once they all have been
+    """
+
+    def __init__(self, paginator, queryset, chunk_size):
+        self.paginator = paginator
+        self.queryset = queryset
+        self.chunk_size = chunk_size
+        self.next_cursor = None
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        last = None
+
+        for count, obj in enumerate(self.queryset.iterator(self.chunk_size), 1):
+            if count > self.paginator.per_page:
+                self.next_cursor = self.paginator.encode_cursor(last)
+                return
+
+            last = obj
+            yield obj
+
+
+class PkListPaginator:
+    """
+    Pages through a list of primary keys that is already in order, e.g. cached search results.
+    The cursor holds the position and primary key of the last object on a page, so paging carries on
+    from the right place if the list changes in between
+    """
+
+    def __init__(self, queryset, pks, per_page):
+        self.queryset = queryset
+        self.pks = pks
+        self.per_page = per_page
+
+    def decode_cursor(self, cursor):
+        try:
+            position, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position = int(position)
+        except (binascii.Error, TypeError, ValueError) as e:
+            raise InvalidCursor(str(e)) from e
+
+        if 0 < position <= len(self.pks) and self.pks[position - 1] == pk:
+            return position
+
+        try:
+            return self.pks.index(pk) + 1
+        except ValueError:
+            return position
+
+    def page(self, cursor=None):
+        start = self.decode_cursor(cursor) if cursor else 0
+        pks = self.pks[start : start + self.per_page]
+        objects = self.queryset.in_bulk(pks)
+        # walks deleted since the list was made are skipped
+        object_list = [objects[pk] for pk in pks if pk in objects]
+        next_cursor = None
+
+        if start + self.per_page < len(self.pks):
+            position = start + len(pks)
+            next_cursor = base64.urlsafe_b64encode(
+                json.dumps([position, self.pks[position - 1]]).encode()
+            ).decode()
+
+        return KeysetPage(object_list, next_cursor)
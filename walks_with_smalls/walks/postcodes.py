@@ -0,0 +1,266 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from requests.adapters import HTTPAdapter
+
+from .models import OutcodeCentroid, PostCode, SectorCentroid
+
+FULL_POSTCODE = re.compile(r"^[A-Z]{1,2}[0-9][A-Z0-9]? [0-9][A-Z]{2}$")
+# an unspaced prefix that must include the start of the inward code, e.g. "GL51A"
+UNSPACED_PREFIX = re.compile(r"^([A-Z]{1,2}[0-9][A-Z0-9]?)([0-9][A-Z]{1,2})$")
+
+
+def normalise_postcode(postcode):
+    """
+    Upper case a postcode and normalise the spacing so "gl51aa" and "GL5  1AA" are both stored as "GL5 1AA".
+    Partial postcodes like "GL5" and "GL5 4" keep their spacing
+    """
+    postcode = " ".join(postcode.upper().split())
+
+    if " " not in postcode and 5 <= len(postcode) <= 7:
+        postcode = f"{postcode[:-3]} {postcode[-3:]}"
+
+    return postcode
+
+
+def normalise_prefix(prefix):
+    """
+    Normalise the start of a postcode for autocompletion.
+    The space is only added when it's clear where it goes, "GL51" could be the start of "GL5 1AA" or "GL51 0AA"
+    """
+    prefix = " ".join(prefix.upper().split())
+    match = UNSPACED_PREFIX.match(prefix)
+
+    if match:
+        prefix = " ".join(match.groups())
+
+    return prefix
+
+
+def postcode_parts(postcode):
+    """
+    Split a normalised, possibly partial, postcode into its outcode and sector.
+    The sector is None if the postcode is only an outcode
+    """
+    outcode, _, inward = postcode.partition(" ")
+    sector = f"{outcode} {inward[0]}" if inward else None
+    return outcode, sector
+
+
+def find_postcode(postcode):
+    """
+    Find the location of a normalised postcode in the database, falling back to the centroid
+    of its sector and then its outcode so partial postcodes like "GL5 4" and "GL5" can be used.
+    Returns a PostCode, which won't be saved if it's a centroid, or None
+    """
+    outcode, sector = postcode_parts(postcode)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id, latitude, longitude, 1 AS precedence FROM {PostCode._meta.db_table} "
+            f"WHERE postcode = %s "
+            f"UNION ALL "
+            f"SELECT NULL, latitude, longitude, 2 FROM {SectorCentroid._meta.db_table} "
+            f"WHERE sector = %s "
+            f"UNION ALL "
+            f"SELECT NULL, latitude, longitude, 3 FROM {OutcodeCentroid._meta.db_table} "
+            f"WHERE outcode = %s "
+            f"ORDER BY precedence LIMIT 1",
+            [postcode, sector, outcode],
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+
+    return PostCode(pk=row[0], postcode=postcode, latitude=row[1], longitude=row[2])
+
+
+def build_postcode_centroids():
+    """
+    Rebuild the outcode and sector centroid tables from the PostCode table
+    """
+    postcode_table = PostCode._meta.db_table
+    outcode = "split_part(postcode, ' ', 1)"
+    sector = f"{outcode} || ' ' || left(split_part(postcode, ' ', 2), 1)"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model, column, expression in (
+            (OutcodeCentroid, "outcode", outcode),
+            (SectorCentroid, "sector", sector),
+        ):
+            cursor.execute(f"DELETE FROM {model._meta.db_table}")
+            cursor.execute(
+                f"INSERT INTO {model._meta.db_table} ({column}, latitude, longitude, postcodes) "
+                f"SELECT {expression}, AVG(latitude), AVG(longitude), COUNT(*) "
+                f"FROM {postcode_table} WHERE postcode LIKE '%% %%' "
+                f"GROUP BY {expression}"
+            )
+
+
+class PostcodeLookupError(Exception):
+    """
+    postcodes.io couldn't be reached or sent back something we didn't understand
+    """
+
+
+class LRUCache:
+    """
+    A small thread safe least recently used cache where each entry expires after its own TTL.
+    None is a valid value so misses are reported with LRUCache.MISSING
+    """
+
+    MISSING = object()
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value, expires = self.entries[key]
+            except KeyError:
+                return self.MISSING
+
+            if expires < time.monotonic():
+                del self.entries[key]
+                return self.MISSING
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class PostcodeLookup:
+    """
+    Finds the PostCode for a postcode, checking an in-process cache, then the PostCode table
+    and finally asking postcodes.io over a pooled keep-alive connection.
+    Postcodes that can't be found are cached too so repeated typos don't hit the API again.
+    Also completes postcodes from a prefix for the search form
+    """
+
+    def __init__(self):
+        self.cache = LRUCache(settings.POSTCODE_CACHE_SIZE)
+        self.completions = LRUCache(settings.POSTCODE_AUTOCOMPLETE_CACHE_SIZE)
+        self.session = requests.Session()
+        self.session.mount(
+            "https://", HTTPAdapter(pool_maxsize=settings.POSTCODES_IO_POOL_SIZE)
+        )
+        self.session.mount(
+            "http://", HTTPAdapter(pool_maxsize=settings.POSTCODES_IO_POOL_SIZE)
+        )
+
+    def remember(self, postcode, postcode_obj):
+        if postcode_obj is None:
+            self.cache.set(postcode, None, settings.POSTCODE_NEGATIVE_CACHE_TTL)
+        else:
+            self.cache.set(postcode, postcode_obj, settings.POSTCODE_CACHE_TTL)
+
+    def request(self, method, path, **kwargs):
+        try:
+            response = self.session.request(
+                method,
+                f"{settings.POSTCODES_IO_URL}{path}",
+                timeout=settings.POSTCODES_IO_TIMEOUT,
+                **kwargs,
+            )
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise PostcodeLookupError(str(e)) from e
+
+        if response.status_code == requests.codes.not_found:
+            return None
+
+        if response.status_code != requests.codes.ok:
+            raise PostcodeLookupError(data.get("error", response.reason))
+
+        return data.get("result")
+
+    @staticmethod
+    def save(postcode, result):
+        """
+        Store the location from a postcodes.io result, returning None if it doesn't have one
+        """
+        if (
+            not result
+            or result.get("latitude") is None
+            or result.get("longitude") is None
+        ):
+            return None
+
+        return PostCode.objects.get_or_create(
+            postcode=postcode,
+            defaults={
+                "latitude": result["latitude"],
+                "longitude": result["longitude"],
+            },
+        )[0]
+
+    def lookup(self, postcode):
+        """
+        Return the PostCode for a postcode or None if it doesn't exist.
+        Partial postcodes and postcodes missing from the PostCode table resolve to the centroid
+        of their sector or outcode. postcodes.io is only asked about full postcodes we know nothing about.
+        Raises PostcodeLookupError if postcodes.io can't be asked
+        """
+        postcode = normalise_postcode(postcode)
+        postcode_obj = self.cache.get(postcode)
+
+        if postcode_obj is not LRUCache.MISSING:
+            return postcode_obj
+
+        postcode_obj = find_postcode(postcode)
+
+        if postcode_obj is None and FULL_POSTCODE.match(postcode):
+            result = self.request("GET", f"/postcodes/{postcode}")
+            postcode_obj = self.save(postcode, result)
+
+        self.remember(postcode, postcode_obj)
+        return postcode_obj
+
+    def complete(self, prefix):
+        """
+        Return up to POSTCODE_AUTOCOMPLETE_LIMIT postcodes starting with the prefix, in order.
+        Uses the varchar_pattern_ops index Django creates for the unique postcode column
+        """
+        prefix = normalise_prefix(prefix)
+
+        if len(prefix) < settings.POSTCODE_AUTOCOMPLETE_MIN_LENGTH:
+            return []
+
+        postcodes = self.completions.get(prefix)
+
+        if postcodes is LRUCache.MISSING:
+            postcodes = list(
+                PostCode.objects.filter(postcode__startswith=prefix)
+                .order_by("postcode")
+                .values_list("postcode", flat=True)[
+                    : settings.POSTCODE_AUTOCOMPLETE_LIMIT
+                ]
+            )
+            self.completions.set(
+                prefix, postcodes, settings.POSTCODE_AUTOCOMPLETE_CACHE_TTL
+            )
+
+        return postcodes
+
+
+postcode_lookup = PostcodeLookup()
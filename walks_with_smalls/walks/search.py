@@ -0,0 +1,640 @@
+import hashlib
+import json
+import math
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.gis.db.models import PointField
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.measure import D
+from django.core.cache import caches
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    FloatField,
+    Func,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
+
+from .models import RouteSegment, WalkSearchEntry
+
+SORT_BEST = "best"
+SORT_NEAREST = "nearest"
+SORT_CHOICES = (
+    (SORT_BEST, "Best match"),
+    (SORT_NEAREST, "Nearest first"),
+)
+
+DEFAULT_SEARCH_RADIUS = 200  # miles
+DEFAULT_MAXIMUM_LENGTH = 250  # miles
+# the largest values a search can have, radius and length are at most their defaults
+MAX_SEARCH_RADIUS = DEFAULT_SEARCH_RADIUS
+MAX_MAXIMUM_LENGTH = DEFAULT_MAXIMUM_LENGTH
+MAX_MAXIMUM_ASCENT = 5000  # metres
+MAX_TEXT_LENGTH = 200
+
+
+def format_number(value):
+    """
+    A number to 6 decimal places without trailing zeros, "51.7" rather than "51.700000"
+    """
+    return f"{value:.6f}".rstrip("0").rstrip(".")
+
+
+def length_bucket_labels():
+    """
+    Labels for the walk lengths counted by WalkSearch.facets, "Under 1 mile", "1 to 3 miles" ... "10 miles or more"
+    """
+    bounds = settings.SEARCH_LENGTH_BUCKETS
+    labels = [f"Under {bounds[0]} mile{'s' if bounds[0] != 1 else ''}"]
+    labels += [f"{lower} to {upper} miles" for lower, upper in zip(bounds, bounds[1:])]
+    labels.append(f"{bounds[-1]} miles or more")
+    return labels
+
+
+class KNNDistance(Func):
+    """
+    The <-> distance operator between a geography column and a point, in metres.
+    Ordering by it lets PostgreSQL walk the column's GiST index nearest first
+    instead of computing and sorting the distance to every row
+    """
+
+    arg_joiner = " <-> "
+    template = "(%(expressions)s)"
+    output_field = FloatField()
+
+    def __init__(self, expression, point, **extra):
+        point = Value(point, output_field=PointField(srid=4326, geography=True))
+        super().__init__(expression, point, **extra)
+
+
+class WalkSearch:
+    """
+    A search for walks starting within radius miles of a location.
+    Walks are filtered with ST_DWithin on the start_geography column so only walks
+    inside the radius are looked at, using its spatial index.
+
+    Searches along_route find walks passing within radius miles instead,
+    and measure distances to the nearest point of their routes from their RouteSegments.
+
+    Searches of an area (a polygon, e.g. the visible part of a map) find the walks whose routes intersect it,
+    narrowed down by their route_envelope with the && operator and then checked against their RouteSegments
+    with ST_Intersects. Distances are measured from the area's centroid
+    """
+
+    def __init__(
+        self,
+        location,
+        radius=None,
+        maximum_length=None,
+        attributes=(),
+        all_attributes=False,
+        sort=SORT_BEST,
+        postcode=None,
+        text=None,
+        along_route=False,
+        area=None,
+        maximum_ascent=None,
+    ):
+        self.location = location
+        self.radius = float(radius or DEFAULT_SEARCH_RADIUS)
+        self.maximum_length = float(maximum_length or DEFAULT_MAXIMUM_LENGTH)
+        self.attributes = [int(pk) for pk in attributes]
+        self.all_attributes = bool(all_attributes)
+        self.sort = sort if sort in dict(SORT_CHOICES) else SORT_BEST
+        # only used to show what was searched for, the location is what's searched from
+        self.postcode = postcode or None
+        # words to look for in the walks' names, descriptions and location details
+        self.text = (text or "").strip()[:MAX_TEXT_LENGTH] or None
+        self.area = area
+        # in metres, walks without elevation data aren't found when it's given
+        self.maximum_ascent = None if maximum_ascent is None else float(maximum_ascent)
+        # routes are already matched anywhere along them in area searches
+        self.along_route = bool(along_route) and area is None
+
+    @staticmethod
+    def area_from_query(query):
+        """
+        The area to search from a bbox (xmin,ymin,xmax,ymax) or polygon (x1,y1,x2,y2,...) query parameter
+        in degrees, or None if there isn't one. Raises ValueError if it isn't valid
+        """
+        if query.get("bbox"):
+            xmin, ymin, xmax, ymax = [
+                round(float(value), 6) for value in query["bbox"].split(",")
+            ]
+
+            if not (xmin < xmax and ymin < ymax):
+                raise ValueError("The bbox is empty")
+
+            area = Polygon.from_bbox((xmin, ymin, xmax, ymax))
+        elif query.get("polygon"):
+            values = [round(float(value), 6) for value in query["polygon"].split(",")]
+            points = list(zip(values[::2], values[1::2]))
+
+            if (
+                len(values) % 2
+                or not 3 <= len(points) <= settings.AREA_SEARCH_MAX_POINTS
+            ):
+                raise ValueError(
+                    "The polygon doesn't have enough points, or has too many"
+                )
+
+            area = Polygon(points + points[:1])
+        else:
+            return None
+
+        if not all(
+            -180 <= x <= 180 and -90 <= y <= 90 for x, y in area.exterior_ring.coords
+        ):
+            raise ValueError("The area is outside of the world")
+
+        if not area.valid:
+            raise ValueError(area.valid_reason)
+
+        area.srid = 4326
+        return area
+
+    @classmethod
+    def from_query(cls, query):
+        """
+        Build a search from the results query string,
+        or return None if there isn't a valid location or area to search
+        """
+        try:
+            area = cls.area_from_query(query)
+
+            if area is None:
+                lat = round(float(query["lat"]), 6)
+                long = round(float(query["long"]), 6)
+            else:
+                # distances are from the middle of the area
+                long, lat = area.centroid.x, area.centroid.y
+
+            radius = float(query.get("radius") or DEFAULT_SEARCH_RADIUS)
+            maximum_length = float(query.get("length") or DEFAULT_MAXIMUM_LENGTH)
+            maximum_ascent = float(query["ascent"]) if query.get("ascent") else None
+            attributes = sorted(
+                {int(pk) for pk in query.get("attributes", "").split(",") if pk}
+            )
+        except (KeyError, ValueError):
+            return None
+
+        if not (-90 <= lat <= 90 and -180 <= long <= 180):
+            return None
+
+        # unbounded searches would cover more of the search cache's cells than are worth checking
+        if not (
+            0 <= radius <= MAX_SEARCH_RADIUS
+            and 0 <= maximum_length <= MAX_MAXIMUM_LENGTH
+        ):
+            return None
+
+        if maximum_ascent is not None and not 0 <= maximum_ascent <= MAX_MAXIMUM_ASCENT:
+            return None
+
+        return cls(
+            Point(long, lat, srid=4326),
+            radius=radius,
+            maximum_length=maximum_length,
+            attributes=attributes,
+            all_attributes=query.get("all") == "1",
+            sort=query.get("sort"),
+            postcode=query.get("postcode"),
+            text=query.get("q"),
+            along_route=query.get("along") == "1",
+            area=area,
+            maximum_ascent=maximum_ascent,
+        )
+
+    def query_string(self):
+        """
+        The search as a results query string.
+        Parameters are always in the same order and format so equal searches share a URL,
+        and so the responses can be cached
+        """
+        query = []
+
+        if self.area is not None:
+            if self.area.equals_exact(Polygon.from_bbox(self.area.extent)):
+                query.append(
+                    (
+                        "bbox",
+                        ",".join(format_number(value) for value in self.area.extent),
+                    )
+                )
+            else:
+                query.append(
+                    (
+                        "polygon",
+                        ",".join(
+                            format_number(value)
+                            for point in self.area.exterior_ring.coords[:-1]
+                            for value in point
+                        ),
+                    )
+                )
+        else:
+            if self.postcode:
+                query.append(("postcode", self.postcode))
+
+            query += [
+                ("lat", format_number(self.location.y)),
+                ("long", format_number(self.location.x)),
+                ("radius", format_number(self.radius)),
+            ]
+
+        query.append(("length", format_number(self.maximum_length)))
+
+        if self.maximum_ascent is not None:
+            query.append(("ascent", format_number(self.maximum_ascent)))
+
+        if self.text:
+            query.append(("q", self.text))
+
+        if self.attributes:
+            query.append(
+                ("attributes", ",".join(str(pk) for pk in sorted(self.attributes)))
+            )
+
+        if self.all_attributes:
+            query.append(("all", "1"))
+
+        if self.along_route:
+            query.append(("along", "1"))
+
+        query.append(("sort", self.sort))
+        return urlencode(query)
+
+    def snapped(self, grid):
+        """
+        A copy of the search from the nearest point on a grid of the given size in degrees
+        """
+        location = Point(
+            round(round(self.location.x / grid) * grid, 6),
+            round(round(self.location.y / grid) * grid, 6),
+            srid=4326,
+        )
+        return WalkSearch(
+            location,
+            radius=self.radius,
+            maximum_length=self.maximum_length,
+            attributes=self.attributes,
+            all_attributes=self.all_attributes,
+            sort=self.sort,
+            text=self.text,
+            along_route=self.along_route,
+            area=self.area,
+            maximum_ascent=self.maximum_ascent,
+        )
+
+    def params(self):
+        """
+        The search parameters in a canonical form
+        """
+        return {
+            "lat": self.location.y,
+            "long": self.location.x,
+            "radius": self.radius,
+            "maximum_length": self.maximum_length,
+            "attributes": sorted(self.attributes),
+            "all_attributes": self.all_attributes,
+            "sort": self.sort,
+            "text": self.text,
+            "along_route": self.along_route,
+            "area": None if self.area is None else self.area.wkt,
+            "maximum_ascent": self.maximum_ascent,
+        }
+
+    def extent(self):
+        """
+        The bounding box of where the search finds walks, (xmin, ymin, xmax, ymax) in degrees
+        """
+        if self.area is not None:
+            return self.area.extent
+
+        lat_radius = D(mi=self.radius).m / 111320
+        lon_radius = lat_radius / max(math.cos(math.radians(self.location.y)), 0.01)
+        return (
+            self.location.x - lon_radius,
+            self.location.y - lat_radius,
+            self.location.x + lon_radius,
+            self.location.y + lat_radius,
+        )
+
+    @property
+    def ordering(self):
+        if self.sort == SORT_NEAREST:
+            # the nearest walks along their routes are found from the segments' index by the filter
+            return ["distance"] if self.along_route else ["nearest"]
+
+        if self.text:
+            return ["-rank", "-attribute_match_count", "route_length", "distance"]
+
+        return ["-attribute_match_count", "route_length", "distance"]
+
+    def search_query(self):
+        return SearchQuery(
+            self.text, config=settings.SEARCH_TEXT_CONFIG, search_type="websearch"
+        )
+
+    def attribute_match_count(self):
+        """
+        The number of the searched attributes a walk has, from its GIN indexed attribute_ids
+        """
+        count = Value(0, output_field=IntegerField())
+
+        for pk in self.attributes:
+            count += Case(
+                When(attribute_ids__contains=[pk], then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+
+        return count
+
+    def route_distance(self):
+        """
+        The distance to the nearest point of a walk's route, from its nearest segment
+        """
+        return Subquery(
+            RouteSegment.objects.filter(walk=OuterRef("pk"))
+            .annotate(distance=Distance("segment", self.location))
+            .order_by("distance")
+            .values("distance")[:1]
+        )
+
+    def annotate(self, queryset):
+        queryset = queryset.annotate(
+            distance=self.route_distance()
+            if self.along_route
+            else Distance("start_geography", self.location),
+            attribute_match_count=self.attribute_match_count(),
+        )
+
+        if self.sort == SORT_NEAREST and not self.along_route:
+            queryset = queryset.annotate(
+                nearest=KNNDistance("start_geography", self.location)
+            )
+
+        if self.text:
+            # in double precision, as the real SearchRank gives wouldn't equal itself
+            # once it's been through a page cursor as a Python float
+            queryset = queryset.annotate(
+                rank=Cast(
+                    SearchRank(F("search_vector"), self.search_query()), FloatField()
+                )
+            )
+
+        return queryset
+
+    def filter(self, queryset):
+        queryset = queryset.filter(route_length__lte=self.maximum_length)
+
+        if self.maximum_ascent is not None:
+            queryset = queryset.filter(ascent__lte=self.maximum_ascent)
+
+        if self.area is not None:
+            # && on the envelopes' spatial index, then ST_Intersects on the route segments' index,
+            # as a route can pass by a box or polygon its envelope overlaps
+            queryset = queryset.filter(route_envelope__bboverlaps=self.area).filter(
+                Exists(
+                    RouteSegment.objects.filter(
+                        walk=OuterRef("pk"), segment__intersects=self.area
+                    )
+                )
+            )
+        elif self.along_route:
+            queryset = queryset.filter(
+                Exists(
+                    RouteSegment.objects.filter(
+                        walk=OuterRef("pk"),
+                        segment__dwithin=(self.location, D(mi=self.radius)),
+                    )
+                )
+            )
+        else:
+            queryset = queryset.filter(
+                start_geography__dwithin=(self.location, D(mi=self.radius))
+            )
+
+        if self.all_attributes and self.attributes:
+            queryset = queryset.filter(attribute_ids__contains=self.attributes)
+
+        if self.text:
+            # matched with the GIN index on search_vector, in the same query as the distance filter
+            queryset = queryset.filter(search_vector=self.search_query())
+
+        return self.annotate(queryset)
+
+    def facets(self, queryset):
+        """
+        Count the walks the search finds in the queryset with each attribute, and in each length bucket
+        between SEARCH_LENGTH_BUCKETS, in a single query grouped by GROUPING SETS.
+        Returns {"attributes": {attribute id: count}, "lengths": [count for each bucket]}
+        """
+        walks_sql, walks_params = (
+            self.filter(queryset)
+            .values("pk", "attribute_ids", "route_length")
+            .query.sql_with_params()
+        )
+        bounds = [float(bound) for bound in settings.SEARCH_LENGTH_BUCKETS]
+        facets = {"attributes": {}, "lengths": [0] * (len(bounds) + 1)}
+
+        with connection.cursor() as cursor:
+            # walks are repeated for each of their attributes, so they're counted distinctly
+            cursor.execute(
+                f"SELECT GROUPING(attribute_id) = 0, attribute_id, bucket, count(DISTINCT walks.walk_id) "
+                f"FROM ("
+                f"  SELECT found.walk_id, found.attribute_ids, "
+                f"  width_bucket(found.route_length, %s::double precision[]) AS bucket "
+                f"  FROM ({walks_sql}) AS found"
+                f") AS walks "
+                f"LEFT JOIN LATERAL unnest(walks.attribute_ids) AS attribute_id ON true "
+                f"GROUP BY GROUPING SETS ((attribute_id), (bucket))",
+                [bounds] + list(walks_params),
+            )
+
+            for by_attribute, attribute_id, bucket, count in cursor.fetchall():
+                if not by_attribute:
+                    facets["lengths"][bucket] = count
+                elif attribute_id is not None:
+                    facets["attributes"][attribute_id] = count
+
+        return facets
+
+
+class SearchCache:
+    """
+    Caches the ordered ids of the walks found by a search.
+    Searches are snapped to a small grid so nearby searches share results.
+
+    Each entry depends on version tokens for the cells of a coarse grid that the search area overlaps.
+    Saving or deleting a walk replaces the token for its cell, so the searches that could include it
+    are looked up again. Tokens are random rather than counters so an evicted token can't bring back
+    entries cached under an older one
+    """
+
+    HITS = "search:hits"
+    MISSES = "search:misses"
+    GENERATION = "search:generation"
+    WALKS = "search:walks"
+
+    @property
+    def cache(self):
+        return caches[settings.SEARCH_CACHE_ALIAS]
+
+    @staticmethod
+    def cell_key(x, y):
+        """
+        The version key of the cell x, y in cells of SEARCH_CACHE_VERSION_CELL degrees
+        """
+        return f"search:cell:{x}:{y}"
+
+    @staticmethod
+    def cells(extent):
+        """
+        The ranges of the x and y indexes of the cells overlapping an extent (xmin, ymin, xmax, ymax in degrees),
+        or None if there are more than SEARCH_CACHE_MAX_CELLS of them
+        """
+        size = settings.SEARCH_CACHE_VERSION_CELL
+        xmin, ymin, xmax, ymax = extent
+        xs = range(math.floor(xmin / size), math.floor(xmax / size) + 1)
+        ys = range(math.floor(ymin / size), math.floor(ymax / size) + 1)
+
+        if len(xs) * len(ys) > settings.SEARCH_CACHE_MAX_CELLS:
+            return None
+
+        return xs, ys
+
+    def cell_keys(self, search):
+        """
+        The version keys of the cells overlapping the bounding box of the search area.
+        Searches covering more than SEARCH_CACHE_MAX_CELLS depend on the key changed by every walk instead
+        """
+        cells = self.cells(search.extent())
+
+        if cells is None:
+            return [self.WALKS]
+
+        xs, ys = cells
+        return [self.cell_key(x, y) for x in xs for y in ys]
+
+    def versions(self, keys):
+        versions = self.cache.get_many(keys)
+
+        for key in keys:
+            if key not in versions:
+                # add rather than set so a concurrent invalidation isn't lost
+                self.cache.add(key, uuid.uuid4().hex, None)
+                versions[key] = self.cache.get(key)
+
+        return [versions[key] for key in keys]
+
+    def version(self, search=None):
+        """
+        A token that changes whenever the results of the search could have,
+        or whenever any walk changes if there's no search
+        """
+        keys = [self.GENERATION]
+        keys += self.cell_keys(search) if search is not None else [self.WALKS]
+        return hashlib.sha1(json.dumps(self.versions(keys)).encode()).hexdigest()
+
+    def key(self, search):
+        data = json.dumps([search.params(), self.version(search)])
+        return f"search:results:{hashlib.sha1(data.encode()).hexdigest()}"
+
+    def count(self, key):
+        if not self.cache.add(key, 1, None):
+            self.cache.incr(key)
+
+    def pks(self, search):
+        """
+        Return the ordered ids of the walks found by the search, from the cache if possible.
+        Returns None for searches with more than SEARCH_CACHE_MAX_RESULTS results
+        """
+        search = search.snapped(settings.SEARCH_CACHE_GRID)
+        key = self.key(search)
+        pks = self.cache.get(key)
+
+        if pks is not None:
+            self.count(self.HITS)
+            return pks if pks is not False else None
+
+        self.count(self.MISSES)
+        pks = list(
+            search.filter(WalkSearchEntry.objects.all())
+            .order_by(*search.ordering, "pk")
+            .values_list("pk", flat=True)[: settings.SEARCH_CACHE_MAX_RESULTS + 1]
+        )
+
+        if len(pks) > settings.SEARCH_CACHE_MAX_RESULTS:
+            # too many to keep, remembered so we don't try again
+            self.cache.set(key, False, settings.SEARCH_CACHE_TTL)
+            return None
+
+        self.cache.set(key, pks, settings.SEARCH_CACHE_TTL)
+        return pks
+
+    def facets(self, search):
+        """
+        Return the facet counts of the search (see WalkSearch.facets),
+        cached alongside its results so they're invalidated together
+        """
+        search = search.snapped(settings.SEARCH_CACHE_GRID)
+        key = f"{self.key(search)}:facets"
+        facets = self.cache.get(key)
+
+        if facets is None:
+            facets = search.facets(WalkSearchEntry.objects.all())
+            self.cache.set(key, facets, settings.SEARCH_CACHE_TTL)
+
+        return facets
+
+    def invalidate(self, geometries):
+        """
+        Invalidate the cached searches that could include walks starting at the given points,
+        or passing along the given routes
+        """
+        versions = {}
+
+        for geometry in geometries:
+            if geometry is None:
+                continue
+
+            if geometry.srid != 4326:
+                geometry = geometry.transform(4326, clone=True)
+
+            cells = self.cells(geometry.extent)
+
+            if cells is None:
+                # too large to invalidate cell by cell
+                versions[self.GENERATION] = uuid.uuid4().hex
+                continue
+
+            xs, ys = cells
+            versions.update(
+                (self.cell_key(x, y), uuid.uuid4().hex) for x in xs for y in ys
+            )
+
+        versions[self.WALKS] = uuid.uuid4().hex
+        self.cache.set_many(versions, None)
+
+    def invalidate_all(self):
+        self.cache.set(self.GENERATION, uuid.uuid4().hex, None)
+
+    def stats(self):
+        stats = self.cache.get_many([self.HITS, self.MISSES])
+        return {"hits": stats.get(self.HITS, 0), "misses": stats.get(self.MISSES, 0)}
+
+
+search_cache = SearchCache()
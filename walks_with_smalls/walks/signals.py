@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Func, Value
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from .models import Attribute, Walk, WalkSearchEntry, walk_changed
+from .search import search_cache
+from .tiles import tile_cache
+
+
+def invalidate_walks(starts, routes):
+    # routes too, for searches along them
+    search_cache.invalidate(starts + routes)
+    tile_cache.invalidate(routes)
+
+
+@receiver(walk_changed, sender=Walk)
+def walk_saved(sender, instance, starts, routes, **kwargs):
+    invalidate_walks(starts, routes)
+
+
+@receiver(post_delete, sender=Walk)
+def walk_deleted(sender, instance, **kwargs):
+    starts, routes = [instance.start], [instance.route]
+    # once committed like walk_changed, so searches and tiles aren't cached with the walk again before then
+    transaction.on_commit(lambda: invalidate_walks(starts, routes))
+
+
+@receiver(m2m_changed, sender=Walk.attributes.through)
+def walk_attributes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep Walk.attribute_ids in sync when attributes are added to or removed from walks,
+    from either side of the relation
+    """
+    if action == "pre_clear" and reverse:
+        # remember which walks had the attribute as they can't be found afterwards
+        instance._cleared_walk_pks = list(
+            instance.walk_set.values_list("pk", flat=True)
+        )
+        return
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        walk_pks = [instance.pk]
+    elif action == "post_clear":
+        walk_pks = instance.__dict__.pop("_cleared_walk_pks", [])
+    else:
+        walk_pks = list(pk_set)
+
+    Walk.sync_attribute_ids(walk_pks)
+    WalkSearchEntry.refresh(Walk.objects.filter(pk__in=walk_pks))
+
+    if not reverse:
+        instance.refresh_from_db(fields=["attribute_ids"])
+
+    # the attributes change how searches rank the walks
+    routes = list(Walk.objects.filter(pk__in=walk_pks).values_list("route", flat=True))
+    transaction.on_commit(lambda: search_cache.invalidate(routes))
+
+
+@receiver(pre_delete, sender=Attribute)
+def attribute_deleted(sender, instance, **kwargs):
+    """
+    Deleting an attribute removes it from walks without sending m2m_changed
+    """
+    walks = Walk.objects.filter(attribute_ids__contains=[instance.pk])
+    walk_pks = list(walks.values_list("pk", flat=True))
+    walks.update(
+        attribute_ids=Func(
+            F("attribute_ids"), Value(instance.pk), function="array_remove"
+        )
+    )
+    WalkSearchEntry.refresh(Walk.objects.filter(pk__in=walk_pks))
+    transaction.on_commit(search_cache.invalidate_all)
+
+
+@receiver(post_save, sender=Attribute)
+def attribute_saved(sender, instance, created, **kwargs):
+    """
+    Renaming an attribute changes the names shown on the search entries of its walks.
+    Either way the search form on every results page changes
+    """
+    if not created:
+        WalkSearchEntry.refresh(
+            Walk.objects.filter(attribute_ids__contains=[instance.pk])
+        )
+
+    transaction.on_commit(search_cache.invalidate_all)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Changing a username changes the URLs of the user's walks in their search entries and map tiles.
+    Saves of other fields alone, like last_login when logging in, are skipped
+    """
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+
+    walks = Walk.objects.filter(submitter=instance)
+    WalkSearchEntry.refresh(walks)
+    routes = list(walks.values_list("route", flat=True))
+    transaction.on_commit(search_cache.invalidate_all)
+    transaction.on_commit(lambda: tile_cache.invalidate(routes))
+
+
+@receiver(pre_delete, sender=get_user_model())
+def user_deleting(sender, instance, **kwargs):
+    """
+    Remember the user's walks, as they're moved to the sentinel user by an update that doesn't send signals
+    """
+    instance._deleted_walk_pks = list(
+        Walk.objects.filter(submitter=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    """
+    The user's walks are shown as the sentinel user's in their search entries, results and map tiles now
+    """
+    walks = Walk.objects.filter(pk__in=instance.__dict__.pop("_deleted_walk_pks", []))
+    WalkSearchEntry.refresh(walks)
+    located = list(walks.values_list("start", "route"))
+    starts = [start for start, _ in located]
+    routes = [route for _, route in located]
+    transaction.on_commit(lambda: invalidate_walks(starts, routes))
@@ -0,0 +1,136 @@
+import io
+import json
+import tempfile
+
+from django.contrib.gis.geos import LineString, MultiPolygon, Polygon, Point
+from django.core.management import call_command
+from django.test import TestCase
+
+from walks.geocoding import (
+    BoundaryBackend,
+    ChainedBackend,
+    update_walks_from_boundaries,
+)
+from walks.models import Boundary, Walk, get_sentinel_user
+from walks.search import search_cache, WalkSearch
+
+from faker import Faker
+
+fake = Faker()
+
+
+def make_square(x, y, size):
+    return MultiPolygon(Polygon.from_bbox((x, y, x + size, y + size)), srid=4326)
+
+
+class StaticBackend:
+    available = True
+
+    def __init__(self, location):
+        self.location = location
+        self.calls = 0
+
+    def reverse_geocode(self, point):
+        self.calls += 1
+        return self.location
+
+
+class BoundaryBackendTests(TestCase):
+    def setUp(self):
+        Boundary.objects.create(
+            level="country", name="United Kingdom", geom=make_square(-6, 50, 8)
+        )
+        Boundary.objects.create(
+            level="county", name="Gloucestershire", geom=make_square(-2.7, 51.5, 1)
+        )
+        Boundary.objects.create(
+            level="county", name="Wiltshire", geom=make_square(-2.3, 50.9, 0.5)
+        )
+
+    def test_reverse_geocode(self):
+        self.assertEqual(
+            BoundaryBackend().reverse_geocode(Point(-2.2, 51.7, srid=4326)),
+            {"country": "United Kingdom", "county": "Gloucestershire"},
+        )
+        self.assertIsNone(BoundaryBackend().reverse_geocode(Point(0, 0, srid=4326)))
+
+    def test_chained_backend(self):
+        opencage = StaticBackend({"what3words": "index.home.raft", "county": "Glos"})
+        backend = ChainedBackend([BoundaryBackend(), opencage])
+
+        self.assertEqual(
+            backend.reverse_geocode(Point(-2.2, 51.7, srid=4326)),
+            {
+                "country": "United Kingdom",
+                "county": "Gloucestershire",
+                "what3words": "index.home.raft",
+            },
+        )
+        self.assertEqual(opencage.calls, 1)
+
+    def test_update_walks_from_boundaries(self):
+        walk = Walk.objects.create(
+            name=fake.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=LineString((-2.2, 51.7), (-2.21, 51.71), srid=4326),
+        )
+        elsewhere = Walk.objects.create(
+            name=fake.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=LineString((10, 10), (10.1, 10.1), srid=4326),
+        )
+
+        search = WalkSearch(walk.start, radius=1)
+        version = search_cache.version(search)
+
+        self.assertEqual(update_walks_from_boundaries(), 2)
+        # the results show the new location details
+        self.assertNotEqual(search_cache.version(search), version)
+
+        walk.refresh_from_db()
+        self.assertEqual(walk.country, "United Kingdom")
+        self.assertEqual(walk.county, "Gloucestershire")
+        self.assertIsNotNone(walk.reverse_geocode_cache_time)
+
+        elsewhere.refresh_from_db()
+        self.assertIsNone(elsewhere.country)
+        # still to be looked up by the geocoder
+        self.assertIsNone(elsewhere.reverse_geocode_cache_time)
+
+
+class LoadBoundariesCommandTests(TestCase):
+    def test_load_boundaries(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".geojsonl") as features:
+            for name, x in (("Stroud", -2.3), ("Cheltenham", -2.1)):
+                feature = {
+                    "type": "Feature",
+                    "properties": {"NAME": name},
+                    "geometry": json.loads(
+                        Polygon.from_bbox((x, 51.7, x + 0.1, 51.8)).geojson
+                    ),
+                }
+                features.write(json.dumps(feature) + "\n")
+            features.flush()
+
+            call_command(
+                "load_boundaries",
+                features.name,
+                level="city",
+                name_property="NAME",
+                stdout=io.StringIO(),
+            )
+
+        self.assertEqual(
+            list(
+                Boundary.objects.filter(level="city")
+                .order_by("name")
+                .values_list("name", flat=True)
+            ),
+            ["Cheltenham", "Stroud"],
+        )
+        self.assertEqual(
+            BoundaryBackend().reverse_geocode(Point(-2.25, 51.75, srid=4326)),
+            {"city": "Stroud"},
+        )
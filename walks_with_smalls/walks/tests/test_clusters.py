@@ -0,0 +1,91 @@
+import pytest
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from walks.clusters import cluster_size, cluster_walks
+
+from faker import Faker
+
+fake = Faker()
+
+BBOX = (-3.0, 51.0, -1.0, 53.0)
+
+
+class ClusterSizeTests(TestCase):
+    @override_settings(CLUSTER_PIXELS=64, CLUSTER_MAX_CELLS=32)
+    def test_cluster_size(self):
+        bbox = (-2.21, 51.69, -2.19, 51.71)
+        # a quarter of a tile when the box is small
+        self.assertAlmostEqual(cluster_size(bbox, 12), 2445.98, places=1)
+        self.assertEqual(cluster_size(bbox, 13), cluster_size(bbox, 12) / 2)
+
+    @override_settings(CLUSTER_PIXELS=64, CLUSTER_MAX_CELLS=32)
+    def test_large_bbox(self):
+        # the whole world at a deep zoom level still has no more than 32 cells across
+        self.assertAlmostEqual(
+            cluster_size((-180, -85, 180, 85), 18), 40075016.69 / 32, places=1
+        )
+
+
+class ClusterWalksTests(TestCase):
+    def setUp(self):
+        # two walks close together near Stroud and one in Bristol
+        self.stroud = [
+            pytest.helpers.make_walk(-2.2, 51.7),
+            pytest.helpers.make_walk(-2.201, 51.701),
+        ]
+        self.bristol = pytest.helpers.make_walk(-2.59, 51.45)
+
+    def test_clusters(self):
+        clusters = sorted(cluster_walks(BBOX, 8), key=lambda cluster: cluster["count"])
+
+        self.assertEqual([cluster["count"] for cluster in clusters], [1, 2])
+        self.assertEqual(clusters[0]["url"], self.bristol.get_absolute_url())
+        self.assertIsNone(clusters[1]["url"])
+        self.assertAlmostEqual(clusters[1]["centroid"][0], -2.2005)
+        self.assertAlmostEqual(clusters[1]["centroid"][1], 51.7005)
+        for value, expected in zip(clusters[1]["bbox"], (-2.201, 51.7, -2.2, 51.701)):
+            self.assertAlmostEqual(value, expected)
+
+    def test_deep_zoom(self):
+        # zoomed right in on the two walks near Stroud they aren't clustered together
+        self.assertEqual(len(cluster_walks((-2.202, 51.699, -2.199, 51.702), 18)), 2)
+
+    @override_settings(CLUSTER_MAX_CELLS=1)
+    def test_bounded(self):
+        # the cells are as big as the box so the walks are in at most 4 clusters
+        for _ in range(20):
+            pytest.helpers.make_walk(fake.pyfloat(min_value=-2.9, max_value=-1.1), 52)
+
+        self.assertLessEqual(len(cluster_walks(BBOX, 18)), 4)
+
+    def test_bbox(self):
+        clusters = cluster_walks((-2.3, 51.6, -2.1, 51.8), 18)
+        self.assertEqual(sum(cluster["count"] for cluster in clusters), 2)
+        self.assertEqual(cluster_walks((0, 0, 1, 1), 8), [])
+
+    def test_view(self):
+        response = self.client.get(
+            reverse("api-clusters"), {"bbox": "-3,51,-1,53", "zoom": 8}
+        )
+        collection = response.json()
+
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+        self.assertEqual(
+            sorted(
+                feature["properties"]["count"] for feature in collection["features"]
+            ),
+            [1, 2],
+        )
+
+    def test_invalid(self):
+        for query in (
+            {},
+            {"bbox": "-3,51,-1", "zoom": 8},
+            {"bbox": "-1,51,-3,53", "zoom": 8},
+            {"bbox": "-3,51,-1,53", "zoom": 30},
+            {"bbox": "nan,51,-1,53", "zoom": 8},
+        ):
+            self.assertEqual(
+                self.client.get(reverse("api-clusters"), query).status_code, 400
+            )
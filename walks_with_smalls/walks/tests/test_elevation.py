@@ -0,0 +1,266 @@
+import io
+import os
+import tempfile
+
+import pytest
+from django.contrib.gis.gdal import GDALRaster
+from django.contrib.gis.geos import LineString, Point
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import QueryDict
+from django.test import TestCase
+from django.urls import reverse
+
+from walks.elevation import profile_chart
+from walks.models import ElevationTile, Walk, WalkSearchEntry
+from walks.search import WalkSearch
+
+
+def make_dem(**options):
+    """
+    A 2 x 2 degree elevation model from -3, 51 to -1, 53 in tenths of a degree,
+    10 metres higher for each tenth of a degree north
+    """
+    return GDALRaster(
+        dict(
+            {
+                "srid": 4326,
+                "width": 20,
+                "height": 20,
+                "origin": (-3, 53),
+                "scale": (0.1, -0.1),
+                "datatype": 6,
+                "bands": [
+                    {
+                        "data": [
+                            10 * (19 - row) for row in range(20) for _ in range(20)
+                        ],
+                        "nodata_value": -9999,
+                    }
+                ],
+            },
+            **options,
+        )
+    )
+
+
+class MeasureElevationsTests(TestCase):
+    def setUp(self):
+        ElevationTile.objects.create(rast=make_dem(), source="test")
+        # north from the lowest row of the elevation model, about 62 miles climbing 90 metres
+        self.walk = pytest.helpers.make_walk(-2.2, 51.05, east=0, north=0.9)
+
+    def test_saved(self):
+        self.assertAlmostEqual(self.walk.ascent, 90)
+        # 10 metres over about ELEVATION_GRADIENT_DISTANCE at each step
+        self.assertAlmostEqual(self.walk.max_gradient, 10, delta=0.5)
+        self.assertEqual(len(self.walk.elevation_profile), 101)
+        self.assertEqual(self.walk.elevation_profile[0], 0)
+        self.assertEqual(self.walk.elevation_profile[-1], 90)
+        self.assertEqual(
+            self.walk.elevation_profile, sorted(self.walk.elevation_profile)
+        )
+
+        walk = Walk.objects.get(pk=self.walk.pk)
+        self.assertEqual(walk.ascent, self.walk.ascent)
+        self.assertEqual(walk.elevation_profile, self.walk.elevation_profile)
+        self.assertEqual(
+            WalkSearchEntry.objects.get(pk=self.walk.pk).ascent, self.walk.ascent
+        )
+
+    def test_descent(self):
+        # walked south it only goes down
+        self.walk.route = LineString((-2.2, 51.95), (-2.2, 51.05), srid=4326)
+        self.walk.save()
+
+        self.assertEqual(self.walk.ascent, 0)
+        self.assertAlmostEqual(self.walk.max_gradient, 10, delta=0.5)
+        self.assertEqual(self.walk.elevation_profile[0], 90)
+
+    def test_no_elevation_data(self):
+        walk = pytest.helpers.make_walk(0.5, 51.05, east=0, north=0.9)
+
+        self.assertIsNone(walk.ascent)
+        self.assertIsNone(walk.max_gradient)
+        self.assertIsNone(walk.elevation_profile)
+
+    def test_partly_covered(self):
+        # leaves the elevation model to the east
+        walk = pytest.helpers.make_walk(-1.5, 51.55, east=1)
+
+        self.assertEqual(walk.ascent, 0)
+        self.assertIsNotNone(walk.elevation_profile[0])
+        self.assertIsNone(walk.elevation_profile[-1])
+
+    def test_short_walk(self):
+        # shorter than ELEVATION_GRADIENT_DISTANCE, its gradient is measured over its whole length
+        walk = pytest.helpers.make_walk(-2.2, 51.55, east=0, north=0.0001)
+
+        self.assertEqual(walk.ascent, 0)
+        self.assertEqual(walk.max_gradient, 0)
+        self.assertEqual(walk.elevation_profile, [50] * 101)
+
+
+class AscentSearchTests(TestCase):
+    def setUp(self):
+        ElevationTile.objects.create(rast=make_dem(), source="test")
+        self.flat = pytest.helpers.make_walk(-2.25, 51.55, east=0.05)
+        self.hilly = pytest.helpers.make_walk(-2.2, 51.55, east=0, north=0.3)
+        # there's no elevation data so its climb isn't known
+        self.unknown = pytest.helpers.make_walk(0.5, 51.55, east=0, north=0.01)
+        self.location = self.flat.start
+
+    def test_query_string(self):
+        search = WalkSearch(self.location, maximum_ascent=50)
+        self.assertIn("ascent=50", search.query_string())
+        self.assertEqual(
+            WalkSearch.from_query(QueryDict(search.query_string())).maximum_ascent, 50
+        )
+        self.assertNotIn("ascent", WalkSearch(self.location).query_string())
+        self.assertIsNone(
+            WalkSearch.from_query(QueryDict("lat=51.55&long=-2.2&ascent=nan"))
+        )
+
+    def test_filter(self):
+        def found(search):
+            return set(
+                search.filter(WalkSearchEntry.objects.all()).values_list(
+                    "pk", flat=True
+                )
+            )
+
+        self.assertEqual(
+            found(WalkSearch(self.location, maximum_ascent=10)), {self.flat.pk}
+        )
+        self.assertEqual(
+            found(WalkSearch(self.location, maximum_ascent=30)),
+            {self.flat.pk, self.hilly.pk},
+        )
+        self.assertEqual(
+            found(WalkSearch(self.location)),
+            {self.flat.pk, self.hilly.pk, self.unknown.pk},
+        )
+
+    def test_results(self):
+        response = self.client.get(
+            reverse("results"),
+            {
+                "lat": "51.55",
+                "long": "-2.25",
+                "radius": "10",
+                "length": "250",
+                "ascent": "10",
+                "sort": "best",
+            },
+        )
+
+        self.assertEqual(
+            [walk.pk for walk in response.context["walks"]], [self.flat.pk]
+        )
+        self.assertEqual(response.context["form"].initial["maximum_ascent"], 10)
+
+    def test_search_form(self):
+        response = self.client.get(
+            reverse("search"),
+            {
+                "lat": "51.55",
+                "long": "-2.25",
+                "use_current_location": "on",
+                "search_radius": "10",
+                "maximum_ascent": "10",
+            },
+        )
+
+        search = WalkSearch(Point(-2.25, 51.55), radius=10, maximum_ascent=10)
+        self.assertRedirects(
+            response,
+            f"{reverse('results')}?{search.query_string()}",
+            fetch_redirect_response=False,
+        )
+
+
+class ProfileChartTests(TestCase):
+    def test_chart(self):
+        chart = profile_chart(
+            Walk(elevation_profile=[100, 150, 200]), width=100, height=50
+        )
+
+        self.assertEqual(chart["lines"], ["0.0,50.0 50.0,25.0 100.0,0.0"])
+        self.assertEqual((chart["lowest"], chart["highest"]), (100, 200))
+
+    def test_gaps(self):
+        chart = profile_chart(
+            Walk(elevation_profile=[None, 100, 200, None, 200]), width=100, height=50
+        )
+
+        self.assertEqual(chart["lines"], ["25.0,50.0 50.0,0.0", "100.0,0.0"])
+
+    def test_flat(self):
+        chart = profile_chart(Walk(elevation_profile=[20, 20]), width=100, height=50)
+        self.assertEqual(chart["lines"], ["0.0,25.0 100.0,25.0"])
+
+    def test_no_profile(self):
+        self.assertIsNone(profile_chart(Walk()))
+        self.assertIsNone(profile_chart(Walk(elevation_profile=[None, None])))
+
+    def test_walk_detail(self):
+        ElevationTile.objects.create(rast=make_dem(), source="test")
+        walk = pytest.helpers.make_walk(-2.2, 51.05, east=0, north=0.9)
+        response = self.client.get(walk.get_absolute_url())
+
+        self.assertContains(response, "90m of climbing")
+        self.assertContains(response, "<polyline", count=1)
+
+        Walk.objects.filter(pk=walk.pk).update(elevation_profile=None)
+        self.assertNotContains(self.client.get(walk.get_absolute_url()), "<polyline")
+
+
+class LoadDemCommandTests(TestCase):
+    def setUp(self):
+        self.walk = pytest.helpers.make_walk(-2.2, 51.05, east=0, north=0.9)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "dem.tif")
+        make_dem(driver="GTiff", name=self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_load_dem(self):
+        self.assertIsNone(self.walk.ascent)
+        out = io.StringIO()
+
+        with self.settings(ELEVATION_TILE_SIZE=8):
+            call_command("load_dem", self.directory.name, stdout=out)
+
+        # cut in to 3 x 3 tiles
+        self.assertEqual(ElevationTile.objects.filter(source="dem.tif").count(), 9)
+        self.assertAlmostEqual(Walk.objects.get(pk=self.walk.pk).ascent, 90)
+        self.assertAlmostEqual(WalkSearchEntry.objects.get(pk=self.walk.pk).ascent, 90)
+        self.assertIn("measured the elevations of 1 walks", out.getvalue())
+
+    def test_reload(self):
+        call_command("load_dem", self.path, stdout=io.StringIO())
+        call_command("load_dem", self.path, stdout=io.StringIO())
+
+        self.assertEqual(ElevationTile.objects.count(), 1)
+
+    def test_reprojected(self):
+        # a tenth of the elevation model in British National Grid, where the file doesn't say
+        path = os.path.join(self.directory.name, "bng.asc")
+
+        with open(path, "w") as grid:
+            grid.write(
+                "ncols 2\nnrows 2\nxllcorner 380000\nyllcorner 200000\ncellsize 50\n"
+            )
+            grid.write("NODATA_value -9999\n10 20\n30 40\n")
+
+        call_command("load_dem", path, stdout=io.StringIO())
+
+        tile = ElevationTile.objects.get(source="bng.asc")
+        self.assertEqual(tile.rast.srid, 4326)
+        self.assertAlmostEqual(tile.rast.extent[0], -2.29, delta=0.01)
+        self.assertAlmostEqual(tile.rast.extent[1], 51.69, delta=0.01)
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            call_command("load_dem", os.path.join(self.directory.name, "missing.tif"))
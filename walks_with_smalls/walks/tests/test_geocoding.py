@@ -0,0 +1,343 @@
+import io
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+from django.contrib.gis.geos import LineString
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from opencage.geocoder import RateLimitExceededError
+
+from walks.geocoding import (
+    OpenCageBackend,
+    TokenBucket,
+    claim_geocode_jobs,
+    process_geocode_jobs,
+)
+from walks.models import Walk, GeocodeJob, ReverseGeocodeCache, get_sentinel_user
+from walks.search import search_cache, WalkSearch
+
+from faker import Faker
+
+fake = Faker()
+
+
+class StubOpenCageGeocode:
+    """
+    Stands in for the OpenCageGeocode client, returning canned results or raising the given error
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def reverse_geocode(self, lat, lng, **kwargs):
+        self.calls.append((lat, lng))
+
+        if self.error:
+            raise self.error
+
+        return [
+            {
+                "annotations": {
+                    "what3words": {"words": "index.home.raft"},
+                    "geohash": "gcpvj0duq53ntb9tb4j1",
+                },
+                "components": {
+                    "continent": "Europe",
+                    "country": "United Kingdom",
+                    "county": "Gloucestershire",
+                    "city": "Stroud",
+                    "road": "High Street",
+                    "postcode": "GL5 1AA",
+                },
+                "formatted": "High Street, Stroud GL5 1AA, United Kingdom",
+            }
+        ]
+
+
+class StubGeocoder(OpenCageBackend):
+    def __init__(self, error=None):
+        super().__init__(geocoder=StubOpenCageGeocode(error))
+
+    @property
+    def calls(self):
+        return self.geocoder.calls
+
+
+@override_settings(GEOCODE_JOB_MAX_ATTEMPTS=2, GEOCODE_JOB_RETRY_DELAY=60)
+class GeocodeJobTests(TestCase):
+    def setUp(self):
+        self.walk = Walk.objects.create(
+            name=fake.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=pytest.helpers.make_random_walk(10),
+        )
+
+    def test_save_enqueues_job(self):
+        self.assertEqual(GeocodeJob.objects.filter(walk=self.walk).count(), 1)
+        self.assertIsNone(self.walk.country)
+
+    def test_save_with_fresh_location_does_not_enqueue(self):
+        GeocodeJob.objects.all().delete()
+        Walk.objects.filter(pk=self.walk.pk).update(reverse_geocode_cache_time=now())
+
+        walk = Walk.objects.get(pk=self.walk.pk)
+        walk.description = fake.paragraph()
+        walk.save()
+
+        self.assertFalse(GeocodeJob.objects.exists())
+
+    def test_process_jobs(self):
+        geocoder = StubGeocoder()
+
+        self.assertEqual(process_geocode_jobs(geocoder), 1)
+        self.assertEqual(len(geocoder.calls), 1)
+        self.assertFalse(GeocodeJob.objects.exists())
+
+        walk = Walk.objects.get(pk=self.walk.pk)
+        self.assertEqual(walk.what3words, "index.home.raft")
+        self.assertEqual(walk.country, "United Kingdom")
+        self.assertEqual(walk.postcode, "GL5 1AA")
+        self.assertIsNotNone(walk.reverse_geocode_cache_time)
+
+        # nothing left to do
+        self.assertEqual(process_geocode_jobs(geocoder), 0)
+
+    def test_claimed_jobs_are_skipped(self):
+        # until a worker that stopped without finishing them has had GEOCODE_JOB_CLAIM_TIMEOUT
+        self.assertEqual(len(claim_geocode_jobs(10)), 1)
+        self.assertEqual(process_geocode_jobs(StubGeocoder()), 0)
+
+        GeocodeJob.objects.update(run_after=now())
+        self.assertEqual(process_geocode_jobs(StubGeocoder()), 1)
+
+    def test_walk_moved_during_lookup(self):
+        # the walk is saved again while its old start is being looked up
+        geocoder = StubGeocoder()
+        walk = Walk.objects.get(pk=self.walk.pk)
+
+        def reverse_geocode(point):
+            walk.route = pytest.helpers.make_random_walk(10)
+            walk.save()
+            return OpenCageBackend.reverse_geocode(geocoder, point)
+
+        geocoder.reverse_geocode = reverse_geocode
+        process_geocode_jobs(geocoder)
+
+        # its new job looks up where it is now
+        self.assertIsNone(Walk.objects.get(pk=self.walk.pk).country)
+        self.assertEqual(GeocodeJob.objects.get(walk=self.walk).attempts, 0)
+
+    def test_process_jobs_invalidates_searches(self):
+        # the results show the walk's location details
+        search = WalkSearch(self.walk.start, radius=1)
+        version = search_cache.version(search)
+
+        process_geocode_jobs(StubGeocoder())
+
+        self.assertNotEqual(search_cache.version(search), version)
+
+    def test_failed_job_is_retried(self):
+        self.assertEqual(process_geocode_jobs(StubGeocoder(ValueError("boom"))), 1)
+
+        job = GeocodeJob.objects.get(walk=self.walk)
+        self.assertEqual(job.status, GeocodeJob.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.last_error, "boom")
+        self.assertGreater(job.run_after, now() + timedelta(seconds=30))
+
+        # not due yet
+        self.assertEqual(process_geocode_jobs(StubGeocoder()), 0)
+
+        GeocodeJob.objects.update(run_after=now())
+        process_geocode_jobs(StubGeocoder(ValueError("boom")))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GeocodeJob.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_rate_limit_defers_jobs(self):
+        reset_time = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+        geocoder = StubGeocoder(RateLimitExceededError(reset_time, 2500))
+
+        with self.assertRaises(RateLimitExceededError):
+            process_geocode_jobs(geocoder)
+
+        job = GeocodeJob.objects.get(walk=self.walk)
+        self.assertEqual(job.status, GeocodeJob.PENDING)
+        self.assertEqual(job.attempts, 0)
+        self.assertEqual(job.run_after.replace(tzinfo=None), reset_time)
+
+
+class ReverseGeocodeCacheTests(TestCase):
+    def setUp(self):
+        self.walk = Walk.objects.create(
+            name=fake.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=pytest.helpers.make_random_walk(10),
+        )
+        process_geocode_jobs(StubGeocoder())
+
+    def make_nearby_walk(self):
+        # starts at the same point but goes somewhere else
+        return Walk.objects.create(
+            name=fake.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=LineString(
+                [self.walk.start.coords] + list(pytest.helpers.make_random_walk(5)),
+                srid=4326,
+            ),
+        )
+
+    def test_lookup_is_cached(self):
+        self.assertEqual(ReverseGeocodeCache.objects.count(), 1)
+        self.assertEqual(ReverseGeocodeCache.stats(), {"hits": 0, "misses": 1})
+
+    def test_nearby_walk_uses_cache(self):
+        walk = self.make_nearby_walk()
+
+        self.assertEqual(walk.country, "United Kingdom")
+        self.assertEqual(len(walk.geohash), 20)
+        self.assertIsNotNone(walk.reverse_geocode_cache_time)
+        self.assertEqual(ReverseGeocodeCache.stats(), {"hits": 1, "misses": 1})
+        # the addresses of points aren't shared, and aren't looked up for the walk's own start
+        self.assertIsNone(walk.what3words)
+        self.assertIsNone(walk.formatted)
+        self.assertFalse(GeocodeJob.objects.filter(walk=walk).exists())
+
+    def test_job_uses_cache(self):
+        walk = self.make_nearby_walk()
+        GeocodeJob.enqueue(walk)
+        geocoder = StubGeocoder()
+
+        process_geocode_jobs(geocoder)
+
+        self.assertEqual(len(geocoder.calls), 0)
+        self.assertEqual(ReverseGeocodeCache.stats(), {"hits": 2, "misses": 1})
+        self.assertFalse(GeocodeJob.objects.filter(walk=walk).exists())
+
+    @override_settings(REVERSE_GEOCODE_POINT_DETAILS=True)
+    def test_point_details(self):
+        walk = self.make_nearby_walk()
+        self.assertEqual(walk.country, "United Kingdom")
+        self.assertTrue(GeocodeJob.objects.filter(walk=walk).exists())
+
+        process_geocode_jobs(StubGeocoder())
+        walk.refresh_from_db()
+        self.assertEqual(walk.what3words, "index.home.raft")
+
+    def test_moved_walk_loses_point_details(self):
+        self.walk.refresh_from_db()
+        self.walk.route = pytest.helpers.make_random_walk(5)
+        self.walk.save()
+
+        self.walk.refresh_from_db()
+        self.assertIsNone(self.walk.what3words)
+        self.assertIsNone(self.walk.formatted)
+        self.assertTrue(GeocodeJob.objects.filter(walk=self.walk).exists())
+
+    @override_settings(REVERSE_GEOCODE_CACHE_TTL=timedelta(days=1))
+    def test_expired_entry_is_refreshed(self):
+        ReverseGeocodeCache.objects.update(cached_at=now() - timedelta(days=2))
+
+        walk = self.make_nearby_walk()
+        self.assertTrue(GeocodeJob.objects.filter(walk=walk).exists())
+
+        geocoder = StubGeocoder()
+        process_geocode_jobs(geocoder)
+
+        self.assertEqual(len(geocoder.calls), 1)
+        self.assertEqual(ReverseGeocodeCache.stats(), {"hits": 0, "misses": 2})
+
+
+class RegeocodeWalksCommandTests(TestCase):
+    def setUp(self):
+        self.walks = [
+            Walk.objects.create(
+                name=fake.sentence(),
+                description=fake.paragraph(),
+                submitter=get_sentinel_user(),
+                route=pytest.helpers.make_random_walk(5),
+            )
+            for _ in range(3)
+        ]
+        # the first has expired, the second has never been looked up and the last is up to date
+        Walk.objects.filter(pk=self.walks[0].pk).update(
+            reverse_geocode_cache_time=now() - timedelta(days=365)
+        )
+        Walk.objects.filter(pk=self.walks[2].pk).update(
+            reverse_geocode_cache_time=now()
+        )
+        self.geocoder = StubGeocoder()
+
+    def regeocode_walks(self, **options):
+        out = io.StringIO()
+
+        with mock.patch(
+            "walks.management.commands.regeocode_walks.get_geocoder",
+            return_value=self.geocoder,
+        ):
+            call_command("regeocode_walks", rate=1000, stdout=out, **options)
+
+        return out.getvalue()
+
+    def test_regeocode_walks(self):
+        output = self.regeocode_walks(batch_size=1)
+
+        self.assertIn("2 walks to re-geocode", output)
+        self.assertIn("Updated 2 of 2 walks", output)
+        self.assertEqual(len(self.geocoder.calls), 2)
+
+        for walk in self.walks[:2]:
+            walk.refresh_from_db()
+            self.assertEqual(walk.country, "United Kingdom")
+            self.assertFalse(GeocodeJob.objects.filter(walk=walk).exists())
+
+        self.walks[2].refresh_from_db()
+        self.assertIsNone(self.walks[2].country)
+
+    def test_uses_cache(self):
+        ReverseGeocodeCache.store(self.walks[0].start, {"country": "United Kingdom"})
+
+        self.assertIn("Updated 2 of 2 walks", self.regeocode_walks())
+        self.assertEqual(len(self.geocoder.calls), 1)
+        self.walks[0].refresh_from_db()
+        self.assertEqual(self.walks[0].country, "United Kingdom")
+
+    def test_invalidates_searches(self):
+        search = WalkSearch(self.walks[0].start, radius=1)
+        version = search_cache.version(search)
+
+        self.regeocode_walks()
+
+        self.assertNotEqual(search_cache.version(search), version)
+
+    def test_start_after(self):
+        output = self.regeocode_walks(start_after=self.walks[0].pk)
+
+        self.assertIn("Updated 1 of 1 walks", output)
+        self.walks[0].refresh_from_db()
+        self.assertIsNone(self.walks[0].country)
+
+
+class TokenBucketTests(TestCase):
+    def test_update_from_quota(self):
+        bucket = TokenBucket(rate=10)
+
+        bucket.update_from_quota(
+            {"limit": 2500, "remaining": 100, "reset": time.time() + 1000}
+        )
+        self.assertAlmostEqual(bucket.rate, 0.1, places=2)
+
+        bucket.update_from_quota(
+            {"limit": 2500, "remaining": 0, "reset": time.time() + 60}
+        )
+        self.assertEqual(bucket.rate, 10)
+        self.assertGreater(bucket.resume_at, time.time())
@@ -0,0 +1,130 @@
+import json
+
+import pytest
+from django.contrib.gis.geos import LineString, Point
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from walks.geojson import feature_collection
+from walks.models import Attribute, Walk
+from walks.search import WalkSearch
+
+from faker import Faker
+
+fake = Faker()
+
+ORIGIN = Point(-2.2, 51.7, srid=4326)
+
+
+class FeatureCollectionTests(TestCase):
+    def test_feature_collection(self):
+        collection = json.loads(
+            "".join(
+                feature_collection(
+                    ['{"type": "Feature"}', '{"type": "Feature"}'], next=lambda: None
+                )
+            )
+        )
+
+        self.assertEqual(collection["type"], "FeatureCollection")
+        self.assertEqual(len(collection["features"]), 2)
+        self.assertIsNone(collection["next"])
+
+    def test_empty(self):
+        collection = json.loads("".join(feature_collection([])))
+
+        self.assertEqual(collection["features"], [])
+
+
+class WalksGeoJSONTests(TestCase):
+    def setUp(self):
+        self.attribute = Attribute.objects.create(
+            attribute="Dog Friendly", description=fake.sentence()
+        )
+        # roughly 0.6, 1.9 and 6.4 miles east of the origin
+        self.near = pytest.helpers.make_walk(-2.185, 51.7)
+        self.middle = pytest.helpers.make_walk(-2.155, 51.7)
+        self.far = pytest.helpers.make_walk(-2.05, 51.7)
+        self.middle.attributes.add(self.attribute)
+
+    def get(self, query=""):
+        response = self.client.get(f"{reverse('api-walks')}?{query}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_all_walks(self):
+        collection = self.get()
+
+        self.assertEqual(
+            [feature["id"] for feature in collection["features"]],
+            [self.far.pk, self.middle.pk, self.near.pk],
+        )
+        self.assertIsNone(collection["next"])
+
+    def test_feature(self):
+        search = WalkSearch(ORIGIN, radius=1)
+        feature = self.get(search.query_string())["features"][0]
+
+        self.assertEqual(feature["type"], "Feature")
+        self.assertEqual(feature["geometry"]["type"], "LineString")
+        self.assertEqual(
+            feature["geometry"]["coordinates"], [[-2.185, 51.7], [-2.184, 51.7]]
+        )
+        self.assertEqual(feature["properties"]["name"], self.near.name)
+        self.assertEqual(feature["properties"]["url"], self.near.get_absolute_url())
+        self.assertAlmostEqual(feature["properties"]["distance"], 0.64, places=1)
+
+    def test_search(self):
+        search = WalkSearch(ORIGIN, radius=5, attributes=[self.attribute.pk])
+        collection = self.get(search.query_string())
+
+        # the walk with the attribute first
+        self.assertEqual(
+            [feature["id"] for feature in collection["features"]],
+            [self.middle.pk, self.near.pk],
+        )
+        self.assertEqual(
+            collection["features"][0]["properties"]["attributes"], [self.attribute.pk]
+        )
+
+    @override_settings(API_MAX_PAGE_SIZE=2)
+    def test_pages(self):
+        collection = self.get("limit=10")
+        pks = [feature["id"] for feature in collection["features"]]
+
+        self.assertEqual(len(pks), 2)
+
+        while collection["next"]:
+            response = self.client.get(collection["next"])
+            collection = json.loads(b"".join(response.streaming_content))
+            pks += [feature["id"] for feature in collection["features"]]
+
+        self.assertEqual(pks, [self.far.pk, self.middle.pk, self.near.pk])
+
+    def test_zoom(self):
+        route = LineString(
+            [(-2.3 + i * 0.0001, 51.8 + (0.000005 if i % 2 else 0)) for i in range(50)],
+            srid=4326,
+        )
+        Walk.objects.filter(pk=self.near.pk).update(route=route)
+        Walk.simplify_routes(Walk.objects.filter(pk=self.near.pk))
+
+        full = self.get()["features"][2]["geometry"]["coordinates"]
+        simplified = self.get("zoom=8")["features"][2]["geometry"]["coordinates"]
+
+        self.assertEqual(len(full), 50)
+        self.assertEqual(len(simplified), 2)
+
+    def test_invalid(self):
+        for query in (
+            "cursor=nonsense",
+            "limit=lots",
+            "zoom=close",
+            "lat=north&long=west",
+            "bbox=1,2",
+        ):
+            response = self.client.get(f"{reverse('api-walks')}?{query}")
+            self.assertEqual(response.status_code, 400)
@@ -0,0 +1,123 @@
+from urllib.parse import urlencode
+
+import pytest
+from django.contrib.gis.geos import Point
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from walks.models import Attribute, Walk, WalkSearchEntry
+from walks.pagination import InvalidCursor, KeysetPaginator
+from walks.search import WalkSearch
+
+from faker import Faker
+
+fake = Faker()
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        # pairs of walks with the same length to exercise the tie breaker
+        self.walks = [
+            pytest.helpers.make_walk(-2.2, 51.7, east=0.01 * (i // 2 + 1))
+            for i in range(7)
+        ]
+
+    def pages(self, paginator):
+        pages = []
+        cursor = None
+
+        while True:
+            page = paginator.page(cursor)
+            pages.append([walk.pk for walk in page])
+
+            if not page.has_next():
+                return pages
+
+            cursor = page.next_cursor
+
+    def test_pages(self):
+        paginator = KeysetPaginator(Walk.objects.all(), ["route_length"], 3)
+        pages = self.pages(paginator)
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(
+            sum(pages, []),
+            list(
+                Walk.objects.order_by("route_length", "pk").values_list("pk", flat=True)
+            ),
+        )
+
+    def test_descending_pages(self):
+        paginator = KeysetPaginator(Walk.objects.all(), ["-created", "-pk"], 2)
+
+        self.assertEqual(
+            sum(self.pages(paginator), []), [walk.pk for walk in reversed(self.walks)]
+        )
+
+    def test_equal_ranks(self):
+        # text search ranks that tie across the pages
+        Walk.objects.update(name="Woodland loop", description="Past a waterfall")
+        WalkSearchEntry.refresh(Walk.objects.all())
+        search = WalkSearch(Point(-2.2, 51.7, srid=4326), radius=10, text="waterfall")
+        paginator = KeysetPaginator(
+            search.filter(WalkSearchEntry.objects.all()), search.ordering, 2
+        )
+
+        self.assertEqual(
+            sorted(sum(self.pages(paginator), [])),
+            sorted(walk.pk for walk in self.walks),
+        )
+
+    def test_page_is_one_query(self):
+        paginator = KeysetPaginator(Walk.objects.all(), ["route_length"], 3)
+        cursor = paginator.page().next_cursor
+
+        with self.assertNumQueries(1):
+            paginator.page(cursor)
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Walk.objects.all(), ["route_length"], 3)
+
+        for cursor in ("not a cursor", "WzFd", "e30="):
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+
+
+@override_settings(RESULTS_PAGE_SIZE=2)
+class ResultsPaginationTests(TestCase):
+    def setUp(self):
+        self.attribute = Attribute.objects.create(
+            attribute="Dog Friendly", description=fake.sentence()
+        )
+        self.walks = [
+            pytest.helpers.make_walk(-2.2 + i * 0.01, 51.7, east=0.01) for i in range(5)
+        ]
+        self.walks[3].attributes.add(self.attribute)
+        Walk.objects.update(route_length=1)
+        WalkSearchEntry.refresh(Walk.objects.all())
+
+        self.query = WalkSearch(
+            Point(-2.2, 51.7, srid=4326), radius=10, attributes=[self.attribute.pk]
+        ).query_string()
+
+    def test_results_pages(self):
+        response = self.client.get(f"{reverse('results')}?{self.query}")
+        walks = list(response.context["walks"])
+        cursor = response.context["page_obj"].next_cursor
+
+        while cursor:
+            response = self.client.get(
+                f"{reverse('results-page')}?{self.query}&{urlencode({'cursor': cursor})}"
+            )
+            self.assertTemplateUsed(response, "walks/fragments/walk_page.html")
+            walks += response.context["walks"]
+            cursor = response.context["page_obj"].next_cursor
+
+        # the walk with the searched attribute first, then nearest first as the lengths match
+        self.assertEqual(
+            [walk.pk for walk in walks], [self.walks[i].pk for i in (3, 0, 1, 2, 4)],
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("results-page"), {"cursor": "nonsense"})
+        self.assertEqual(response.status_code, 404)
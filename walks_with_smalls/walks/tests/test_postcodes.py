@@ -0,0 +1,274 @@
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from walks.models import OutcodeCentroid, PostCode, SectorCentroid
+from walks.postcodes import (
+    build_postcode_centroids,
+    find_postcode,
+    normalise_postcode,
+    normalise_prefix,
+    PostcodeLookup,
+    PostcodeLookupError,
+)
+
+KNOWN_POSTCODES = {
+    "GL5 1AA": {"latitude": 51.745, "longitude": -2.218},
+    "GL5 1AB": {"latitude": 51.746, "longitude": -2.219},
+}
+
+
+class StubPostcodesIOHandler(BaseHTTPRequestHandler):
+    """
+    Answers postcode lookups like postcodes.io.
+    Requests are recorded on the server
+    """
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path))
+        postcode = unquote(self.path.rsplit("/", 1)[-1])
+
+        if postcode == "SL0 0WW":
+            time.sleep(1)
+
+        if postcode in KNOWN_POSTCODES:
+            self.send_json(200, {"status": 200, "result": KNOWN_POSTCODES[postcode]})
+        else:
+            self.send_json(404, {"status": 404, "error": "Invalid postcode"})
+
+    def log_message(self, *args):
+        pass
+
+
+class NormalisePostcodeTests(TestCase):
+    def test_normalise_postcode(self):
+        self.assertEqual(normalise_postcode("gl51aa"), "GL5 1AA")
+        self.assertEqual(normalise_postcode(" GL5  1AA "), "GL5 1AA")
+        self.assertEqual(normalise_postcode("sw1a1aa"), "SW1A 1AA")
+        self.assertEqual(normalise_postcode("gl5"), "GL5")
+        self.assertEqual(normalise_postcode("gl5 4"), "GL5 4")
+
+    def test_normalise_prefix(self):
+        self.assertEqual(normalise_prefix(" gl5  1"), "GL5 1")
+        self.assertEqual(normalise_prefix("gl51"), "GL51")
+        self.assertEqual(normalise_prefix("gl51a"), "GL5 1A")
+        self.assertEqual(normalise_prefix("sw1a1a"), "SW1A 1A")
+
+
+class ImportPostcodesCommandTests(TestCase):
+    fieldnames = ["pcd", "pcd2", "pcds", "doterm", "lat", "long"]
+
+    def import_postcodes(self, rows):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as onspd:
+            writer = csv.DictWriter(onspd, fieldnames=self.fieldnames)
+            writer.writeheader()
+
+            for pcds, doterm, lat, long in rows:
+                writer.writerow(
+                    {
+                        "pcd": pcds.replace(" ", ""),
+                        "pcd2": pcds,
+                        "pcds": pcds,
+                        "doterm": doterm,
+                        "lat": lat,
+                        "long": long,
+                    }
+                )
+            onspd.flush()
+
+            call_command(
+                "import_postcodes", onspd.name, batch_size=2, stdout=io.StringIO()
+            )
+
+    def test_import_postcodes(self):
+        self.import_postcodes(
+            [
+                ("GL5 1AA", "", "51.745", "-2.218"),
+                ("GL5 1AB", "", "51.746", "-2.219"),
+                ("GL5 1AD", "199912", "51.747", "-2.220"),
+                ("GL5 1AE", "", "99.999999", "0.000000"),
+            ]
+        )
+
+        self.assertEqual(
+            list(
+                PostCode.objects.order_by("postcode").values_list("postcode", flat=True)
+            ),
+            ["GL5 1AA", "GL5 1AB"],
+        )
+
+    def test_reimport_is_incremental(self):
+        PostCode.objects.create(postcode="GL5 1AA", latitude=0, longitude=0)
+        PostCode.objects.create(postcode="GL5 1AD", latitude=51.747, longitude=-2.220)
+        unchanged = PostCode.objects.create(
+            postcode="GL5 1AB", latitude=51.746, longitude=-2.219
+        )
+
+        self.import_postcodes(
+            [
+                ("GL5 1AA", "", "51.745", "-2.218"),
+                ("GL5 1AB", "", "51.746", "-2.219"),
+                ("GL5 1AD", "199912", "51.747", "-2.220"),
+            ]
+        )
+
+        moved = PostCode.objects.get(postcode="GL5 1AA")
+        self.assertEqual((moved.latitude, moved.longitude), (51.745, -2.218))
+        self.assertEqual(PostCode.objects.get(postcode="GL5 1AB").pk, unchanged.pk)
+        self.assertFalse(PostCode.objects.filter(postcode="GL5 1AD").exists())
+
+    def test_import_builds_centroids(self):
+        self.import_postcodes(
+            [("GL5 1AA", "", "51.74", "-2.21"), ("GL5 1AB", "", "51.76", "-2.23"),]
+        )
+
+        self.assertEqual(OutcodeCentroid.objects.get(outcode="GL5").postcodes, 2)
+        self.assertEqual(SectorCentroid.objects.get(sector="GL5 1").postcodes, 2)
+
+
+class PostcodeCentroidTests(TestCase):
+    def setUp(self):
+        PostCode.objects.create(postcode="GL5 1AA", latitude=51.74, longitude=-2.21)
+        PostCode.objects.create(postcode="GL5 1AB", latitude=51.76, longitude=-2.23)
+        PostCode.objects.create(postcode="GL5 4AA", latitude=51.70, longitude=-2.20)
+        build_postcode_centroids()
+
+    def test_build_postcode_centroids(self):
+        outcode = OutcodeCentroid.objects.get(outcode="GL5")
+        self.assertEqual(outcode.postcodes, 3)
+        self.assertAlmostEqual(outcode.latitude, 51.7333, places=3)
+
+        sector = SectorCentroid.objects.get(sector="GL5 1")
+        self.assertEqual(sector.postcodes, 2)
+        self.assertAlmostEqual(sector.latitude, 51.75)
+        self.assertAlmostEqual(sector.longitude, -2.22)
+
+        # rebuilding replaces rather than adds to the centroids
+        PostCode.objects.filter(postcode="GL5 4AA").delete()
+        build_postcode_centroids()
+        self.assertFalse(SectorCentroid.objects.filter(sector="GL5 4").exists())
+        self.assertEqual(OutcodeCentroid.objects.get(outcode="GL5").postcodes, 2)
+
+    def test_find_postcode(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(find_postcode("GL5 4AA").latitude, 51.70)
+
+        self.assertAlmostEqual(find_postcode("GL5 1").latitude, 51.75)
+        self.assertAlmostEqual(find_postcode("GL5").latitude, 51.7333, places=3)
+        # unknown postcodes fall back to their sector, then their outcode
+        self.assertAlmostEqual(find_postcode("GL5 1ZZ").latitude, 51.75)
+        self.assertAlmostEqual(find_postcode("GL5 9ZZ").latitude, 51.7333, places=3)
+        self.assertIsNone(find_postcode("XX1"))
+
+
+class PostcodeLookupTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubPostcodesIOHandler)
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings_override = override_settings(
+            POSTCODES_IO_URL=f"http://127.0.0.1:{cls.server.server_port}",
+            POSTCODES_IO_TIMEOUT=(0.5, 0.5),
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.lookup = PostcodeLookup()
+
+    def test_lookup(self):
+        postcode = self.lookup.lookup("gl51aa")
+
+        self.assertEqual((postcode.latitude, postcode.longitude), (51.745, -2.218))
+        self.assertTrue(PostCode.objects.filter(postcode="GL5 1AA").exists())
+        self.assertEqual(self.server.requests, [("GET", "/postcodes/GL5%201AA")])
+
+        # served from the in-process cache without a query
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup.lookup("GL5 1AA"), postcode)
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_lookup_from_table(self):
+        PostCode.objects.create(postcode="GL5 1ZZ", latitude=51.7, longitude=-2.2)
+
+        self.assertEqual(self.lookup.lookup("GL5 1ZZ").latitude, 51.7)
+        self.assertEqual(self.server.requests, [])
+
+    def test_unknown_postcode_is_cached(self):
+        self.assertIsNone(self.lookup.lookup("XX1 1XX"))
+        self.assertIsNone(self.lookup.lookup("XX1 1XX"))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_partial_postcode(self):
+        PostCode.objects.create(postcode="GL5 1ZZ", latitude=51.7, longitude=-2.2)
+        build_postcode_centroids()
+
+        self.assertEqual(self.lookup.lookup("gl5").latitude, 51.7)
+        self.assertEqual(self.lookup.lookup("GL5 1").latitude, 51.7)
+        # partial postcodes aren't sent to postcodes.io
+        self.assertIsNone(self.lookup.lookup("XX1"))
+        self.assertEqual(self.server.requests, [])
+
+    def test_timeout(self):
+        with self.assertRaises(PostcodeLookupError):
+            self.lookup.lookup("SL0 0WW")
+
+
+class PostcodeAutocompleteTests(TestCase):
+    def setUp(self):
+        for postcode in ("GL5 1AA", "GL5 1AB", "GL5 4AA", "GL51 0AA", "SW1A 1AA"):
+            PostCode.objects.create(postcode=postcode, latitude=51.7, longitude=-2.2)
+
+        self.lookup = PostcodeLookup()
+
+    def test_complete(self):
+        self.assertEqual(self.lookup.complete("gl51a"), ["GL5 1AA", "GL5 1AB"])
+        self.assertEqual(self.lookup.complete("GL51"), ["GL51 0AA"])
+        self.assertEqual(
+            self.lookup.complete("gl5"), ["GL5 1AA", "GL5 1AB", "GL5 4AA", "GL51 0AA"]
+        )
+        self.assertEqual(self.lookup.complete("G"), [])
+        self.assertEqual(self.lookup.complete("XX"), [])
+
+    @override_settings(POSTCODE_AUTOCOMPLETE_LIMIT=2)
+    def test_complete_limit(self):
+        self.assertEqual(self.lookup.complete("GL5"), ["GL5 1AA", "GL5 1AB"])
+
+    def test_complete_is_cached(self):
+        self.lookup.complete("GL5 1")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup.complete("gl5 1"), ["GL5 1AA", "GL5 1AB"])
+
+    def test_autocomplete_view(self):
+        response = self.client.get(reverse("postcode-autocomplete"), {"q": "sw1a"})
+
+        self.assertEqual(response.json(), {"postcodes": ["SW1A 1AA"]})
+        self.assertIn("max-age", response["Cache-Control"])
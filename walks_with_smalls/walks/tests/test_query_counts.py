@@ -0,0 +1,213 @@
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import LineString, Point
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from walks.models import Attribute, Walk
+from walks.search import WalkSearch
+
+from faker import Faker
+
+fake = Faker()
+
+# the number of walks (or attributes) each page is rendered with
+DATASET_SIZES = (1, 5, 20)
+
+
+@override_settings(RESULTS_PAGE_SIZE=max(DATASET_SIZES))
+class QueryCountTests(TestCase):
+    """
+    Pages should make the same number of queries however many walks or attributes they show.
+    The counts include the session and user lookups of logged in requests,
+    and the savepoints of the transactions a walk is saved in, as they're nested in the test's
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username=fake.unique.user_name())
+
+    def add_attributes(self, count):
+        return [
+            Attribute.objects.create(
+                attribute=fake.unique.word(), description=fake.sentence()
+            )
+            for _ in range(count)
+        ]
+
+    def add_walks(self, count, attributes=()):
+        walks = []
+
+        for _ in range(count):
+            x = fake.pyfloat(min_value=-2.3, max_value=-2.1)
+
+            # so the cached search results are invalidated
+            with pytest.helpers.run_on_commit():
+                walk = Walk.objects.create(
+                    name=fake.unique.sentence(),
+                    description=fake.paragraph(),
+                    # a different submitter for each walk
+                    submitter=get_user_model().objects.create(
+                        username=fake.unique.user_name()
+                    ),
+                    route=LineString((x, 51.7), (x + 0.01, 51.71), srid=4326),
+                )
+                walk.attributes.set(attributes)
+
+            walks.append(walk)
+
+        return walks
+
+    def assertQueries(self, count, url):
+        # the first request sets up the session
+        self.client.get(url)
+        # and the second would be served from the response cache
+        caches[settings.SEARCH_CACHE_ALIAS].clear()
+
+        with self.assertNumQueries(count):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+
+    def walk_data(self, walk, attributes):
+        return {
+            "name": walk.name,
+            "description": walk.description,
+            "route": walk.route.ewkt,
+            "attributes": [attribute.pk for attribute in attributes],
+            "submitter": self.user.pk,
+        }
+
+    def search(self):
+        return WalkSearch(
+            Point(-2.2, 51.7, srid=4326),
+            radius=50,
+            attributes=Attribute.objects.values_list("pk", flat=True),
+        ).query_string()
+
+    def test_results(self):
+        attributes = self.add_attributes(3)
+        added = 0
+
+        for size in DATASET_SIZES:
+            self.add_walks(size - added, attributes)
+            added = size
+            # the page of search entries and the search form's attributes
+            self.assertQueries(2, reverse("results"))
+
+    def test_searched_results(self):
+        attributes = self.add_attributes(3)
+        url = f"{reverse('results')}?{self.search()}"
+        added = 0
+
+        for size in DATASET_SIZES:
+            self.add_walks(size - added, attributes)
+            added = size
+            response = self.client.get(url)
+            self.assertEqual(len(response.context["walks"]), size)
+            # the search's ids, their entries, the facets and the search form's attributes
+            self.assertQueries(4, url)
+
+    def test_results_page(self):
+        attributes = self.add_attributes(3)
+        url = f"{reverse('results-page')}?{self.search()}"
+        added = 0
+
+        for size in DATASET_SIZES:
+            self.add_walks(size - added, attributes)
+            added = size
+            # the search's ids and their entries
+            self.assertQueries(2, url)
+
+    def test_walk_detail(self):
+        for size in DATASET_SIZES:
+            walk = self.add_walks(1, self.add_attributes(size))[0]
+            # the walk with its submitter, and its attributes
+            self.assertQueries(2, f"{walk.get_absolute_url()}?lat=51.7&long=-2.2")
+
+    def test_walk_create(self):
+        self.client.force_login(self.user)
+        added = 0
+
+        for size in DATASET_SIZES:
+            self.add_attributes(size - added)
+            added = size
+            # the session, the user and the attribute choices
+            self.assertQueries(3, reverse("walk-add"))
+
+    def test_walk_update(self):
+        self.client.force_login(self.user)
+
+        for size in DATASET_SIZES:
+            walk = self.add_walks(1, self.add_attributes(size))[0]
+            Walk.objects.filter(pk=walk.pk).update(submitter=self.user)
+            # the session, the user, the walk for the submitter check and again for the form,
+            # the walk's attributes and the attribute choices
+            self.assertQueries(
+                6,
+                reverse(
+                    "walk-update",
+                    kwargs={"username": self.user.username, "slug": walk.slug},
+                ),
+            )
+
+    def test_walk_create_post(self):
+        self.client.force_login(self.user)
+
+        for size in DATASET_SIZES:
+            attributes = self.add_attributes(size)
+            walk = Walk(
+                name=fake.unique.sentence(),
+                description=fake.paragraph(),
+                route=LineString((-2.2, 51.7), (-2.19, 51.71), srid=4326),
+            )
+
+            # 2 for the session and the user
+            # 4 validating the attributes, the submitter and that the name is unique for them
+            # 18 saving the walk, see Walk.save:
+            #   the reverse geocode cache, a savepoint, the insert, its length, 2 for its elevations,
+            #   2 for its route segments, its simplified routes, 2 for its search vector and entry,
+            #   6 creating its geocode job in its own savepoints, and releasing the savepoint
+            # 7 adding its attributes:
+            #   the existing ones, the missing ones, the insert
+            #   and 4 syncing its attribute_ids and search entry
+            with self.assertNumQueries(31):
+                response = self.client.post(
+                    reverse("walk-add"), self.walk_data(walk, attributes)
+                )
+
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(Walk.objects.get(name=walk.name).attributes.count(), size)
+
+    def test_walk_update_post(self):
+        self.client.force_login(self.user)
+
+        for size in DATASET_SIZES:
+            attributes = self.add_attributes(size)
+            walk = self.add_walks(1, attributes)[0]
+            Walk.objects.filter(pk=walk.pk).update(submitter=self.user)
+            # moved, so the start is looked up again
+            walk.route = LineString((-2.3, 51.8), (-2.29, 51.81), srid=4326)
+
+            # 2 for the session and the user
+            # 3 for the walk for the submitter check and again for the form, and its attributes
+            # 4 validating the attributes, the submitter and that the name is unique for them
+            # 17 saving the walk, see Walk.save:
+            #   the reverse geocode cache, a savepoint, its previous route, the update, its length,
+            #   2 for its elevations, 2 for its route segments, its simplified routes,
+            #   2 for its search vector and entry, 4 resetting its geocode job in its own savepoint,
+            #   and releasing the savepoint
+            # 1 for its attributes, which haven't changed
+            with self.assertNumQueries(27):
+                response = self.client.post(
+                    reverse(
+                        "walk-update",
+                        kwargs={"username": self.user.username, "slug": walk.slug},
+                    ),
+                    self.walk_data(walk, attributes),
+                )
+
+            self.assertEqual(response.status_code, 302)
+            walk.refresh_from_db()
+            self.assertEqual(walk.start.coords, (-2.3, 51.8))
@@ -0,0 +1,852 @@
+import io
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import LineString, Point
+from django.core.management import call_command
+from django.contrib.postgres.search import SearchQuery
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from walks.checks import shared_caches_check
+from walks.models import (
+    Attribute,
+    PostCode,
+    RouteSegment,
+    Walk,
+    WalkSearchEntry,
+    get_sentinel_user,
+)
+from walks.search import search_cache, SORT_NEAREST, WalkSearch
+
+from faker import Faker
+
+fake = Faker()
+
+ORIGIN = Point(-2.2, 51.7, srid=4326)
+
+
+class WalkSearchTests(TestCase):
+    def setUp(self):
+        # roughly 0.6, 1.9 and 6.4 miles east of the origin
+        self.near = pytest.helpers.make_walk(-2.185, 51.7)
+        self.middle = pytest.helpers.make_walk(-2.155, 51.7)
+        self.far = pytest.helpers.make_walk(-2.05, 51.7)
+
+    def test_start_geography(self):
+        self.assertEqual(self.near.start_geography, self.near.start)
+
+    def test_from_query(self):
+        for query in (
+            {},
+            {"lat": "51.7"},
+            {"lat": "north", "long": "-2.2"},
+            # outside the bounds of the search form
+            {"lat": "51.7", "long": "-2.2", "radius": "20000"},
+            {"lat": "51.7", "long": "-2.2", "radius": "-1"},
+            {"lat": "51.7", "long": "-2.2", "length": "1000"},
+            {"lat": "51.7", "long": "-2.2", "ascent": "-5"},
+            {"lat": "51.7", "long": "-2.2", "ascent": "10000"},
+        ):
+            self.assertIsNone(WalkSearch.from_query(query))
+
+        search = WalkSearch.from_query(
+            {"lat": "51.7", "long": "-2.2", "radius": "5", "sort": SORT_NEAREST}
+        )
+        self.assertEqual(search.location, ORIGIN)
+        self.assertEqual(search.radius, 5)
+        self.assertEqual(search.ordering, ["nearest"])
+
+    def test_query_string(self):
+        search = WalkSearch(
+            ORIGIN, radius=5, attributes=[3, 1], all_attributes=True, postcode="GL5 1"
+        )
+
+        self.assertEqual(
+            search.query_string(),
+            "postcode=GL5+1&lat=51.7&long=-2.2&radius=5&length=250&attributes=1%2C3&all=1&sort=best",
+        )
+        self.assertEqual(
+            WalkSearch.from_query(QueryDict(search.query_string())).query_string(),
+            search.query_string(),
+        )
+
+    def test_radius(self):
+        walks = WalkSearch(ORIGIN, radius=5).filter(Walk.objects.all())
+
+        self.assertEqual(set(walks), {self.near, self.middle})
+
+    def test_nearest(self):
+        walks = (
+            WalkSearch(ORIGIN, radius=10, sort=SORT_NEAREST)
+            .filter(Walk.objects.all())
+            .order_by("nearest")
+        )
+
+        self.assertEqual(list(walks), [self.near, self.middle, self.far])
+        self.assertAlmostEqual(walks[0].distance.mi, 0.64, places=1)
+
+    def test_best_match(self):
+        attribute = Attribute.objects.create(
+            attribute="Dog Friendly", description=fake.sentence()
+        )
+        self.far.attributes.add(attribute)
+        search = WalkSearch(ORIGIN, radius=10, attributes=[attribute.pk])
+
+        self.assertEqual(
+            list(search.filter(Walk.objects.all()).order_by(*search.ordering))[0],
+            self.far,
+        )
+
+    def test_all_attributes(self):
+        dogs, pushchairs = [
+            Attribute.objects.create(attribute=name, description=fake.sentence())
+            for name in ("Dog Friendly", "Pushchair Friendly")
+        ]
+        self.near.attributes.add(dogs)
+        self.middle.attributes.add(dogs, pushchairs)
+        search = WalkSearch(
+            ORIGIN, attributes=[dogs.pk, pushchairs.pk], all_attributes=True
+        )
+
+        self.assertEqual(list(search.filter(Walk.objects.all())), [self.middle])
+        self.assertEqual(
+            search.filter(Walk.objects.all()).get().attribute_match_count, 2
+        )
+
+    def test_nearest_results(self):
+        search = WalkSearch(ORIGIN, radius=10, sort=SORT_NEAREST)
+        response = self.client.get(f"{reverse('results')}?{search.query_string()}")
+
+        self.assertEqual(
+            [walk.pk for walk in response.context["walks"]],
+            [self.near.pk, self.middle.pk, self.far.pk],
+        )
+
+
+class TextSearchTests(TestCase):
+    def setUp(self):
+        self.waterfall = pytest.helpers.make_walk(-2.185, 51.7)
+        self.castle = pytest.helpers.make_walk(-2.155, 51.7)
+        self.far_waterfall = pytest.helpers.make_walk(-2.0, 51.7)
+        Walk.objects.filter(pk=self.waterfall.pk).update(
+            name="Woodland loop", description="Past a waterfall and back"
+        )
+        Walk.objects.filter(pk=self.castle.pk).update(
+            name="Castle walk", description="Round the castle", road="Waterfall Lane"
+        )
+        Walk.objects.filter(pk=self.far_waterfall.pk).update(
+            name="Waterfalls", description="Three waterfalls"
+        )
+        Walk.refresh_search(Walk.objects.all())
+
+    def test_search_vector_on_save(self):
+        walk = pytest.helpers.make_walk(-2.19, 51.7)
+        walk.description = "Up to the castle"
+        walk.save()
+
+        self.assertEqual(
+            set(
+                Walk.objects.filter(
+                    search_vector=SearchQuery("castles", config="english")
+                )
+            ),
+            {walk, self.castle},
+        )
+
+    def test_text(self):
+        search = WalkSearch(ORIGIN, radius=5, text="waterfall")
+        walks = list(search.filter(Walk.objects.all()).order_by(*search.ordering))
+
+        # the walk further away is outside the radius, and the description counts for more than the road
+        self.assertEqual(walks, [self.waterfall, self.castle])
+        self.assertGreater(walks[0].rank, walks[1].rank)
+
+    def test_no_matches(self):
+        search = WalkSearch(ORIGIN, radius=5, text="lighthouse")
+
+        self.assertFalse(search.filter(Walk.objects.all()).exists())
+
+    def test_query_string(self):
+        search = WalkSearch(ORIGIN, radius=5, text="  castle -ruin ")
+
+        self.assertIn("q=castle+-ruin", search.query_string())
+        self.assertEqual(
+            WalkSearch.from_query(QueryDict(search.query_string())).text, "castle -ruin"
+        )
+
+    def test_results(self):
+        search = WalkSearch(ORIGIN, radius=10, text="castle")
+        response = self.client.get(f"{reverse('results')}?{search.query_string()}")
+
+        self.assertEqual(
+            [walk.pk for walk in response.context["walks"]], [self.castle.pk]
+        )
+        self.assertEqual(response.context["form"].initial["q"], "castle")
+
+
+class SearchUrlTests(TestCase):
+    def setUp(self):
+        self.walk = pytest.helpers.make_walk(-2.185, 51.7)
+        self.attribute = Attribute.objects.create(
+            attribute="Dog Friendly", description=fake.sentence()
+        )
+        PostCode.objects.create(postcode="GL5 1ZZ", latitude=51.7, longitude=-2.2)
+        self.url = (
+            f"{reverse('results')}?{WalkSearch(ORIGIN, radius=10).query_string()}"
+        )
+
+    def test_search_redirects_to_results(self):
+        response = self.client.get(
+            reverse("search"),
+            {"postcode": "gl51zz", "search_radius": 10, "Dog Friendly": "on"},
+        )
+
+        search = WalkSearch(
+            ORIGIN, radius=10, attributes=[self.attribute.pk], postcode="GL5 1ZZ"
+        )
+        self.assertRedirects(response, f"{reverse('results')}?{search.query_string()}")
+
+    def test_search_current_location(self):
+        response = self.client.get(
+            reverse("search"),
+            {
+                "use_current_location": "on",
+                "lat": "51.7",
+                "long": "-2.2",
+                "search_radius": 10,
+            },
+        )
+
+        self.assertRedirects(response, self.url)
+
+    def test_search_errors(self):
+        response = self.client.get(
+            reverse("search"), {"postcode": "ZZ9", "search_radius": 10}
+        )
+        self.assertContains(response, "Postcode not found")
+
+        response = self.client.get(
+            reverse("search"), {"use_current_location": "on", "search_radius": 10}
+        )
+        self.assertContains(response, "Could not get your current location")
+
+    def test_canonical_redirect(self):
+        response = self.client.get(
+            reverse("results"),
+            {"sort": "best", "long": "-2.20", "lat": "51.700000", "radius": "10"},
+        )
+        self.assertRedirects(response, self.url)
+
+        response = self.client.get(reverse("results"), {"lat": "nonsense"})
+        self.assertRedirects(response, reverse("results"))
+
+    def test_cache_headers(self):
+        response = self.client.get(self.url)
+
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+        self.assertTrue(response.has_header("ETag"))
+
+        self.client.force_login(get_sentinel_user())
+        response = self.client.get(self.url)
+
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # a walk within the search area changes the response
+        with pytest.helpers.run_on_commit():
+            pytest.helpers.make_walk(-2.19, 51.7)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_anonymous_responses_are_cached(self):
+        self.client.get(self.url)
+
+        # only the ETag's cache lookups, no queries
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertContains(response, self.walk.name.title())
+
+
+class AttributeIdsTests(TestCase):
+    def setUp(self):
+        self.walk = pytest.helpers.make_walk(-2.2, 51.7)
+        self.dogs, self.pushchairs = [
+            Attribute.objects.create(attribute=name, description=fake.sentence())
+            for name in ("Dog Friendly", "Pushchair Friendly")
+        ]
+
+    def attribute_ids(self):
+        return Walk.objects.values_list("attribute_ids", flat=True).get(pk=self.walk.pk)
+
+    def test_add_and_remove(self):
+        self.walk.attributes.add(self.pushchairs, self.dogs)
+        self.assertEqual(
+            self.attribute_ids(), sorted([self.dogs.pk, self.pushchairs.pk])
+        )
+        self.assertEqual(self.walk.attribute_ids, self.attribute_ids())
+
+        self.walk.attributes.remove(self.dogs)
+        self.assertEqual(self.attribute_ids(), [self.pushchairs.pk])
+
+        self.walk.attributes.clear()
+        self.assertEqual(self.attribute_ids(), [])
+
+    def test_reverse(self):
+        self.dogs.walk_set.add(self.walk)
+        self.assertEqual(self.attribute_ids(), [self.dogs.pk])
+
+        self.dogs.walk_set.clear()
+        self.assertEqual(self.attribute_ids(), [])
+
+    def test_attribute_deleted(self):
+        self.walk.attributes.set([self.dogs, self.pushchairs])
+        self.dogs.delete()
+
+        self.assertEqual(self.attribute_ids(), [self.pushchairs.pk])
+
+
+class WalkSearchEntryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username=fake.unique.user_name())
+        self.walk = Walk.objects.create(
+            name=fake.unique.sentence(),
+            description=fake.paragraph(),
+            submitter=self.user,
+            route=LineString((-2.2, 51.7), (-2.199, 51.7), srid=4326),
+        )
+        self.dogs = Attribute.objects.create(
+            attribute="Dog Friendly", description=fake.sentence()
+        )
+
+    def entry(self):
+        return WalkSearchEntry.objects.get(pk=self.walk.pk)
+
+    def test_saved(self):
+        entry = self.entry()
+        self.assertEqual(entry.name, self.walk.name)
+        self.assertEqual(entry.get_absolute_url(), self.walk.get_absolute_url())
+        self.assertEqual(entry.location, (-2.2, 51.7))
+
+        self.walk.name = "Castle walk"
+        self.walk.description = "Round the castle " * 50
+        self.walk.save()
+
+        entry = self.entry()
+        self.assertEqual(entry.name, "Castle walk")
+        self.assertEqual(entry.description, self.walk.description[:300])
+        self.assertEqual(entry.get_absolute_url(), self.walk.get_absolute_url())
+
+    def test_attributes(self):
+        self.walk.attributes.add(self.dogs)
+        self.assertEqual(self.entry().attribute_ids, [self.dogs.pk])
+        self.assertEqual(self.entry().attribute_names, ["Dog Friendly"])
+
+        self.dogs.attribute = "Dogs Welcome"
+        self.dogs.save()
+        self.assertEqual(self.entry().attribute_names, ["Dogs Welcome"])
+
+        self.dogs.delete()
+        self.assertEqual(self.entry().attribute_ids, [])
+        self.assertEqual(self.entry().attribute_names, [])
+
+    def test_username_changed(self):
+        self.user.username = fake.unique.user_name()
+        self.user.save()
+
+        self.assertEqual(self.entry().submitter_username, self.user.username)
+
+    def test_submitter_deleted(self):
+        self.user.delete()
+
+        self.assertEqual(self.entry().submitter_username, get_sentinel_user().username)
+
+    def test_deleted(self):
+        self.walk.delete()
+
+        self.assertFalse(WalkSearchEntry.objects.exists())
+
+    def test_results(self):
+        response = self.client.get(reverse("results"))
+
+        self.assertEqual(
+            [walk.pk for walk in response.context["walks"]], [self.walk.pk]
+        )
+        self.assertContains(response, self.walk.get_absolute_url())
+
+
+@override_settings(SEARCH_LENGTH_BUCKETS=(1, 3, 5, 10))
+class FacetTests(TestCase):
+    def setUp(self):
+        self.dogs, self.pushchairs = [
+            Attribute.objects.create(attribute=name, description=fake.sentence())
+            for name in ("Dog Friendly", "Pushchair Friendly")
+        ]
+        self.short = pytest.helpers.make_walk(-2.185, 51.7)
+        self.medium = pytest.helpers.make_walk(-2.155, 51.7)
+        self.long = pytest.helpers.make_walk(-2.16, 51.7)
+        # more than 5 miles away
+        self.far = pytest.helpers.make_walk(-2.05, 51.7)
+        self.short.attributes.add(self.dogs)
+        self.medium.attributes.add(self.dogs, self.pushchairs)
+        self.far.attributes.add(self.dogs)
+
+        for walk, length in (
+            (self.short, 0.5),
+            (self.medium, 2),
+            (self.long, 7),
+            (self.far, 2),
+        ):
+            Walk.objects.filter(pk=walk.pk).update(route_length=length)
+        WalkSearchEntry.refresh(Walk.objects.all())
+
+    def test_facets(self):
+        search = WalkSearch(ORIGIN, radius=5)
+
+        self.assertEqual(
+            search.facets(WalkSearchEntry.objects.all()),
+            {
+                "attributes": {self.dogs.pk: 2, self.pushchairs.pk: 1},
+                "lengths": [1, 1, 0, 1, 0],
+            },
+        )
+
+    def test_filtered(self):
+        search = WalkSearch(
+            ORIGIN, radius=5, attributes=[self.pushchairs.pk], all_attributes=True
+        )
+
+        self.assertEqual(
+            search.facets(WalkSearchEntry.objects.all()),
+            {
+                "attributes": {self.dogs.pk: 1, self.pushchairs.pk: 1},
+                "lengths": [0, 1, 0, 0, 0],
+            },
+        )
+
+    def test_one_query(self):
+        search = WalkSearch(ORIGIN, radius=5)
+
+        with self.assertNumQueries(1):
+            search.facets(WalkSearchEntry.objects.all())
+
+    def test_cached(self):
+        search = WalkSearch(ORIGIN, radius=5)
+        facets = search_cache.facets(search)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(search_cache.facets(search), facets)
+
+        with pytest.helpers.run_on_commit():
+            self.long.attributes.add(self.pushchairs)
+        self.assertEqual(
+            search_cache.facets(search)["attributes"][self.pushchairs.pk], 2
+        )
+
+    def test_results(self):
+        search = WalkSearch(ORIGIN, radius=5)
+        response = self.client.get(f"{reverse('results')}?{search.query_string()}")
+
+        self.assertEqual(
+            [count for field, count in response.context["form"].attribute_fields()],
+            [2, 1],
+        )
+        self.assertEqual(
+            response.context["length_facets"],
+            [
+                ("Under 1 mile", 1),
+                ("1 to 3 miles", 1),
+                ("3 to 5 miles", 0),
+                ("5 to 10 miles", 1),
+                ("10 miles or more", 0),
+            ],
+        )
+
+    def test_no_search(self):
+        response = self.client.get(reverse("results"))
+
+        self.assertNotIn("length_facets", response.context)
+        self.assertEqual(
+            [count for field, count in response.context["form"].attribute_fields()],
+            [None, None],
+        )
+
+
+class AlongRouteTests(TestCase):
+    def setUp(self):
+        # a loop starting about 6 miles west that comes within about 110 metres of the origin
+        self.loop = Walk.objects.create(
+            name=fake.unique.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=LineString(
+                (-2.35, 51.7), (-2.2, 51.701), (-2.35, 51.71), (-2.35, 51.7), srid=4326
+            ),
+        )
+        # about 0.4 miles east
+        self.near = pytest.helpers.make_walk(-2.19, 51.7)
+
+    def test_from_query(self):
+        search = WalkSearch(ORIGIN, radius=1, along_route=True)
+
+        self.assertIn("along=1", search.query_string())
+        self.assertTrue(
+            WalkSearch.from_query(QueryDict(search.query_string())).along_route
+        )
+        self.assertFalse(WalkSearch(ORIGIN, radius=1).params()["along_route"])
+
+    def test_start_only(self):
+        search = WalkSearch(ORIGIN, radius=1)
+
+        self.assertEqual(list(search.filter(Walk.objects.all())), [self.near])
+
+    def test_along_route(self):
+        search = WalkSearch(ORIGIN, radius=1, sort=SORT_NEAREST, along_route=True)
+        walks = list(search.filter(Walk.objects.all()).order_by(*search.ordering))
+
+        self.assertEqual(walks, [self.loop, self.near])
+        self.assertAlmostEqual(walks[0].distance.m, 111, delta=2)
+
+    @override_settings(ROUTE_SEGMENT_VERTICES=5)
+    def test_segments(self):
+        self.loop.route = LineString(
+            [(-2.35 + i * 0.01, 51.7) for i in range(20)], srid=4326
+        )
+        self.loop.save()
+
+        segments = RouteSegment.objects.filter(walk=self.loop)
+        self.assertGreater(segments.count(), 1)
+        self.assertEqual(RouteSegment.objects.filter(walk=self.near).count(), 1)
+
+    def test_results(self):
+        search = WalkSearch(ORIGIN, radius=1, along_route=True)
+        response = self.client.get(f"{reverse('results')}?{search.query_string()}")
+
+        self.assertEqual(
+            {walk.pk for walk in response.context["walks"]},
+            {self.loop.pk, self.near.pk},
+        )
+        self.assertTrue(response.context["form"].initial["along_route"])
+
+    def test_cache_invalidated_by_route_changes(self):
+        search = WalkSearch(ORIGIN, radius=1, along_route=True)
+        self.assertIn(self.loop.pk, search_cache.pks(search))
+
+        # the loop's start doesn't move, but it no longer passes the origin
+        self.loop.route = LineString((-2.35, 51.7), (-2.34, 51.7), srid=4326)
+
+        with pytest.helpers.run_on_commit():
+            self.loop.save()
+
+        self.assertNotIn(self.loop.pk, search_cache.pks(search))
+
+
+BBOX = "-2.3,51.6,-2.1,51.8"
+# a triangle over the western half of BBOX
+TRIANGLE = "-2.3,51.65,-2.1,51.75,-2.3,51.75"
+
+
+class AreaSearchTests(TestCase):
+    def setUp(self):
+        self.inside = pytest.helpers.make_walk(-2.15, 51.7)
+        self.outside = pytest.helpers.make_walk(-1.5, 51.7)
+        # starts outside the area and ends in it
+        self.crossing = Walk.objects.create(
+            name=fake.unique.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=LineString((-2.5, 51.7), (-2.25, 51.7), srid=4326),
+        )
+
+    def search(self, query):
+        return WalkSearch.from_query(QueryDict(query))
+
+    def test_route_envelope(self):
+        self.assertEqual(self.crossing.route_envelope.extent, (-2.5, 51.7, -2.25, 51.7))
+        self.assertEqual(
+            WalkSearchEntry.objects.get(pk=self.crossing.pk).route_envelope.extent,
+            (-2.5, 51.7, -2.25, 51.7),
+        )
+
+    def test_bbox(self):
+        search = self.search(f"bbox={BBOX}")
+
+        self.assertEqual(
+            set(search.filter(Walk.objects.all())), {self.inside, self.crossing}
+        )
+        self.assertAlmostEqual(search.location.x, -2.2)
+        self.assertAlmostEqual(search.location.y, 51.7)
+
+    def test_polygon(self):
+        search = self.search(f"polygon={TRIANGLE}")
+
+        self.assertEqual(list(search.filter(Walk.objects.all())), [self.crossing])
+
+    def test_route_passing_by(self):
+        # its envelope overlaps the corner of BBOX, but the route passes outside it
+        Walk.objects.create(
+            name=fake.unique.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=LineString((-2.2, 51.95), (-1.95, 51.7), srid=4326),
+        )
+
+        self.assertEqual(
+            set(self.search(f"bbox={BBOX}").filter(Walk.objects.all())),
+            {self.inside, self.crossing},
+        )
+        self.assertEqual(
+            list(
+                self.search(f"polygon={TRIANGLE}").filter(WalkSearchEntry.objects.all())
+            ),
+            [self.crossing.search_entry],
+        )
+
+    def test_filters(self):
+        Walk.objects.filter(pk=self.crossing.pk).update(route_length=20)
+        WalkSearchEntry.refresh(Walk.objects.all())
+        search = self.search(f"bbox={BBOX}&length=10")
+
+        self.assertEqual(
+            list(search.filter(WalkSearchEntry.objects.all())),
+            [self.inside.search_entry],
+        )
+
+    def test_query_string(self):
+        self.assertEqual(
+            self.search(f"bbox={BBOX}&radius=5").query_string(),
+            "bbox=-2.3%2C51.6%2C-2.1%2C51.8&length=250&sort=best",
+        )
+        self.assertEqual(
+            self.search(f"polygon={TRIANGLE}").query_string(),
+            "polygon=-2.3%2C51.65%2C-2.1%2C51.75%2C-2.3%2C51.75&length=250&sort=best",
+        )
+        # a rectangle is searched as a bbox
+        self.assertEqual(
+            self.search(
+                "polygon=-2.3,51.6,-2.3,51.8,-2.1,51.8,-2.1,51.6"
+            ).query_string(),
+            self.search(f"bbox={BBOX}").query_string(),
+        )
+
+    @override_settings(AREA_SEARCH_MAX_POINTS=3)
+    def test_invalid(self):
+        for query in (
+            "bbox=-2.1,51.6,-2.3,51.8",
+            "bbox=-2.3,51.6,-2.1",
+            "bbox=nan,51.6,-2.1,51.8",
+            "polygon=-2.3,51.6,-2.1,51.6",
+            "polygon=-2.3,51.6,-2.1,51.6,-2.2",
+            # too many points
+            "polygon=-2.3,51.6,-2.3,51.8,-2.1,51.8,-2.1,51.6",
+            # crosses itself
+            "polygon=0,0,1,1,1,0,0,1",
+            "polygon=0,0,200,0,0,1",
+        ):
+            self.assertIsNone(self.search(query), query)
+
+    def test_results(self):
+        response = self.client.get(
+            f"{reverse('results')}?{self.search(f'bbox={BBOX}').query_string()}"
+        )
+
+        self.assertEqual(
+            {walk.pk for walk in response.context["walks"]},
+            {self.inside.pk, self.crossing.pk},
+        )
+
+    def test_cache_invalidated(self):
+        search = self.search(f"bbox={BBOX}")
+        self.assertEqual(len(search_cache.pks(search)), 2)
+
+        with pytest.helpers.run_on_commit():
+            pytest.helpers.make_walk(-2.29, 51.61)
+
+        self.assertEqual(len(search_cache.pks(search)), 3)
+
+
+class SearchCacheTests(TestCase):
+    def setUp(self):
+        self.walk = pytest.helpers.make_walk(-2.185, 51.7)
+        self.search = WalkSearch(ORIGIN, radius=5, sort=SORT_NEAREST)
+
+    def test_shared_cache_check(self):
+        # the tests keep them in memory, processes wouldn't see each other's invalidations
+        with self.settings(DEBUG=False):
+            self.assertEqual(
+                [error.id for error in shared_caches_check(None)],
+                ["walks.E001", "walks.E002"],
+            )
+
+        with self.settings(DEBUG=True):
+            self.assertEqual(shared_caches_check(None), [])
+
+    def test_cached(self):
+        self.assertEqual(search_cache.pks(self.search), [self.walk.pk])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(search_cache.pks(self.search), [self.walk.pk])
+            # searches from nearby share the results
+            nearby = WalkSearch(
+                Point(-2.2009, 51.7012, srid=4326), radius=5, sort=SORT_NEAREST
+            )
+            self.assertEqual(search_cache.pks(nearby), [self.walk.pk])
+
+        self.assertEqual(search_cache.stats(), {"hits": 2, "misses": 1})
+
+    def test_different_params(self):
+        search_cache.pks(self.search)
+
+        with self.assertNumQueries(1):
+            search_cache.pks(WalkSearch(ORIGIN, radius=4))
+
+    def test_invalidated_by_walk_changes(self):
+        search_cache.pks(self.search)
+
+        with pytest.helpers.run_on_commit():
+            walk = pytest.helpers.make_walk(-2.19, 51.7)
+
+        self.assertEqual(search_cache.pks(self.search), [walk.pk, self.walk.pk])
+
+        walk.route = LineString((10, 10), (10.001, 10), srid=4326)
+
+        with pytest.helpers.run_on_commit():
+            walk.save()
+
+        self.assertEqual(search_cache.pks(self.search), [self.walk.pk])
+
+        with pytest.helpers.run_on_commit():
+            self.walk.delete()
+
+        self.assertEqual(search_cache.pks(self.search), [])
+
+    def test_invalidated_on_commit(self):
+        # until the walk's transaction commits other requests can't see it, so searches could re-cache without it
+        version = search_cache.version(self.search)
+
+        with pytest.helpers.run_on_commit():
+            pytest.helpers.make_walk(-2.19, 51.7)
+            self.assertEqual(search_cache.version(self.search), version)
+
+        self.assertNotEqual(search_cache.version(self.search), version)
+
+    def test_invalidated_by_attribute_changes(self):
+        walk = pytest.helpers.make_walk(-2.19, 51.7)
+        attribute = Attribute.objects.create(
+            attribute="Dog Friendly", description=fake.sentence()
+        )
+        search = WalkSearch(ORIGIN, radius=5, attributes=[attribute.pk])
+        self.walk.attributes.add(attribute)
+        self.assertEqual(search_cache.pks(search)[0], self.walk.pk)
+
+        with pytest.helpers.run_on_commit():
+            self.walk.attributes.remove(attribute)
+            walk.attributes.add(attribute)
+
+        self.assertEqual(search_cache.pks(search)[0], walk.pk)
+
+    def test_invalidated_by_attribute_names(self):
+        # every results page has a checkbox for each attribute
+        version = search_cache.version(self.search)
+
+        with pytest.helpers.run_on_commit():
+            attribute = Attribute.objects.create(
+                attribute="Dog Friendly", description=fake.sentence()
+            )
+
+        self.assertNotEqual(search_cache.version(self.search), version)
+
+        version = search_cache.version(self.search)
+        attribute.attribute = "Dogs Welcome"
+
+        with pytest.helpers.run_on_commit():
+            attribute.save()
+
+        self.assertNotEqual(search_cache.version(self.search), version)
+
+        version = search_cache.version(self.search)
+
+        with pytest.helpers.run_on_commit():
+            attribute.delete()
+
+        self.assertNotEqual(search_cache.version(self.search), version)
+
+    def test_invalidated_by_submitter_deletion(self):
+        # the submitter's walks are moved to the sentinel user by an update that doesn't send signals
+        user = get_user_model().objects.create(username=fake.unique.user_name())
+        Walk.objects.create(
+            name=fake.unique.sentence(),
+            description=fake.paragraph(),
+            submitter=user,
+            route=LineString((-2.19, 51.7), (-2.189, 51.7), srid=4326),
+        )
+        version = search_cache.version(self.search)
+
+        with pytest.helpers.run_on_commit():
+            user.delete()
+
+        self.assertNotEqual(search_cache.version(self.search), version)
+
+    def test_not_invalidated_by_walks_elsewhere(self):
+        search_cache.pks(self.search)
+        pytest.helpers.make_walk(10, 10)
+
+        with self.assertNumQueries(0):
+            search_cache.pks(self.search)
+
+    @override_settings(SEARCH_CACHE_MAX_CELLS=4)
+    def test_large_areas(self):
+        # a search covering more than SEARCH_CACHE_MAX_CELLS depends on one key rather than each cell
+        search = WalkSearch(ORIGIN, radius=200)
+        self.assertEqual(search_cache.cell_keys(search), [search_cache.WALKS])
+        self.assertEqual(len(search_cache.cell_keys(self.search)), 1)
+
+        search_cache.pks(search)
+
+        with pytest.helpers.run_on_commit():
+            walk = pytest.helpers.make_walk(-2.19, 51.7)
+
+        self.assertIn(walk.pk, search_cache.pks(search))
+
+        # a walk covering too many cells invalidates everything, even searches elsewhere
+        search_cache.pks(self.search)
+
+        with pytest.helpers.run_on_commit():
+            Walk.objects.create(
+                name=fake.unique.sentence(),
+                description=fake.paragraph(),
+                submitter=get_sentinel_user(),
+                route=LineString((5, 40), (15, 60), srid=4326),
+            )
+
+        with self.assertNumQueries(1):
+            search_cache.pks(self.search)
+
+    @override_settings(SEARCH_CACHE_MAX_RESULTS=1)
+    def test_too_many_results(self):
+        pytest.helpers.make_walk(-2.19, 51.7)
+
+        self.assertIsNone(search_cache.pks(self.search))
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(search_cache.pks(self.search))
+
+
+class BenchmarkSearchCommandTests(TestCase):
+    def test_benchmark_search(self):
+        stdout = io.StringIO()
+        call_command("benchmark_search", sizes="50,100", searches=2, stdout=stdout)
+
+        self.assertIn("100 walks", stdout.getvalue())
+        # the synthetic walks are rolled back
+        self.assertFalse(Walk.objects.exists())
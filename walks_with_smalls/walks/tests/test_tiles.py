@@ -0,0 +1,122 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import LineString
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from walks.models import Walk, get_sentinel_user
+from walks.tiles import tile_cache, tiles_covering
+
+from faker import Faker
+
+fake = Faker()
+
+
+def tile_url(z, x, y):
+    return reverse("walk-tile", kwargs={"z": z, "x": x, "y": y})
+
+
+class TilesCoveringTests(TestCase):
+    def test_tiles_covering(self):
+        self.assertEqual(
+            list(tiles_covering((-2.2, 51.7, -2.19, 51.71), 0)), [(0, 0, 0)]
+        )
+        self.assertEqual(
+            list(tiles_covering((-2.2, 51.7, -2.19, 51.71), 10)), [(10, 505, 339)]
+        )
+
+    def test_buffer(self):
+        # just inside the western edge of tile 505 is drawn in the buffer of 504 too
+        self.assertEqual(
+            list(tiles_covering((-2.459, 51.7, -2.459, 51.7), 10)),
+            [(10, 504, 339), (10, 505, 339)],
+        )
+
+
+@override_settings(TILE_CACHE_MAX_ZOOM=12, TILE_ROUTES_MIN_ZOOM=10)
+class WalkTileTests(TestCase):
+    def setUp(self):
+        self.walk = Walk.objects.create(
+            name=fake.unique.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=LineString((-2.2, 51.7), (-2.19, 51.71), srid=4326),
+        )
+
+    def test_tile(self):
+        response = self.client.get(tile_url(10, 505, 339))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.mapbox-vector-tile")
+        self.assertIn("public", response["Cache-Control"])
+        # the layers and properties are in the tile as strings
+        self.assertIn(b"starts", response.content)
+        self.assertIn(b"routes", response.content)
+        self.assertIn(self.walk.get_absolute_url().encode(), response.content)
+
+    def test_routes_min_zoom(self):
+        response = self.client.get(tile_url(9, 252, 169))
+
+        self.assertIn(b"starts", response.content)
+        self.assertNotIn(b"routes", response.content)
+
+    def test_empty_tile(self):
+        response = self.client.get(tile_url(10, 0, 0))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+
+    def test_no_such_tile(self):
+        for z, x, y in ((19, 0, 0), (2, 4, 0), (2, 0, 4)):
+            self.assertEqual(self.client.get(tile_url(z, x, y)).status_code, 404)
+
+    def test_cached(self):
+        tile = tile_cache.tile(10, 505, 339)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(tile_cache.tile(10, 505, 339), tile)
+
+    def test_invalidated_by_walk_changes(self):
+        old = tile_cache.tile(10, 505, 339)
+        moved = tile_cache.tile(10, 506, 339)
+
+        self.walk.route = LineString((-2.1, 51.7), (-2.09, 51.71), srid=4326)
+
+        with pytest.helpers.run_on_commit():
+            self.walk.save()
+
+        # the walk is drawn in the tile it moved to instead of the one it was in
+        self.assertNotEqual(tile_cache.tile(10, 505, 339), old)
+        self.assertNotEqual(tile_cache.tile(10, 506, 339), moved)
+        self.assertNotIn(b"starts", tile_cache.tile(10, 505, 339))
+
+        with pytest.helpers.run_on_commit():
+            self.walk.delete()
+
+        self.assertEqual(tile_cache.tile(10, 506, 339), b"")
+
+    def test_invalidated_by_username_changes(self):
+        # the walk's URL in the tile has the submitter's username
+        tile_cache.tile(10, 505, 339)
+        self.walk.submitter.username = "renamed"
+
+        with pytest.helpers.run_on_commit():
+            self.walk.submitter.save()
+
+        self.assertIn(
+            self.walk.get_absolute_url().encode(), tile_cache.tile(10, 505, 339)
+        )
+
+    def test_invalidated_by_submitter_deletion(self):
+        # the walk is moved to the sentinel user by an update that doesn't send signals
+        user = get_user_model().objects.create(username=fake.unique.user_name())
+        Walk.objects.filter(pk=self.walk.pk).update(submitter=user)
+        tile_cache.tile(10, 505, 339)
+
+        with pytest.helpers.run_on_commit():
+            user.delete()
+
+        self.walk.refresh_from_db()
+        self.assertIn(
+            self.walk.get_absolute_url().encode(), tile_cache.tile(10, 505, 339)
+        )
@@ -1,10 +1,20 @@
+import io
+
 import pytest
-from django.contrib.gis.geos import Point
-from django.contrib.gis.measure import D
-from django.test import TestCase
+from django.contrib.gis.geos import LineString, Point
+from django.contrib.gis.db.models.functions import Length
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.utils.text import slugify
 
-from walks.models import Walk, get_sentinel_user
+from walks.models import (
+    GeocodeJob,
+    RouteSegment,
+    Walk,
+    WalkSearchEntry,
+    get_sentinel_user,
+)
+from walks.tiles import tile_cache
 
 from faker import Faker
 
@@ -24,7 +34,13 @@ class TestWalk(TestCase):
         )
 
     def test_walk_length(self):
-        self.assertEqual(self.walk.route_length, D(m=self.route.length).mi)
+        # measured on the spheroid, as GeoDjango's Length does for geographic fields
+        expected = (
+            Walk.objects.annotate(length=Length("route")).get(pk=self.walk.pk).length.mi
+        )
+        self.assertAlmostEqual(self.walk.route_length, expected, delta=expected * 1e-6)
+        # the route isn't transformed to measure it
+        self.assertEqual(self.walk.route.srid, 4326)
 
     def test_walk_start(self):
         self.route.transform(4326)
@@ -44,3 +60,139 @@ class TestWalk(TestCase):
 
     def test_walk_slug(self):
         self.assertEqual(self.walk.slug, slugify(self.name))
+
+
+class RouteLengthTests(TestCase):
+    def setUp(self):
+        # a degree of latitude north, about 69.1 miles. Measured in web mercator it would be over 110
+        self.walk = Walk.objects.create(
+            name=fake.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=LineString((-2.2, 51.0), (-2.2, 52.0), srid=4326),
+        )
+
+    def test_geodesic_length(self):
+        self.assertAlmostEqual(self.walk.route_length, 69.1, places=1)
+        self.assertEqual(
+            Walk.objects.values_list("route_length", flat=True).get(pk=self.walk.pk),
+            self.walk.route_length,
+        )
+        self.assertEqual(
+            WalkSearchEntry.objects.get(pk=self.walk.pk).route_length,
+            self.walk.route_length,
+        )
+
+    def test_recompute_command(self):
+        GeocodeJob.objects.all().delete()
+        RouteSegment.objects.all().delete()
+        # as if the route had been changed without save()
+        Walk.objects.update(
+            route_length=0,
+            start=Point(0, 0, srid=4326),
+            start_geography=Point(0, 0, srid=4326),
+            route_envelope=None,
+            route_overview=None,
+            route_detail=None,
+            what3words="index.home.raft",
+            formatted="Somewhere else",
+        )
+        out = io.StringIO()
+
+        call_command("recompute_route_lengths", batch_size=1, stdout=out)
+
+        walk = Walk.objects.get(pk=self.walk.pk)
+        self.assertAlmostEqual(walk.route_length, 69.1, places=1)
+        self.assertEqual(walk.start, Point(-2.2, 51.0, srid=4326))
+        self.assertEqual(walk.start_geography, walk.start)
+        self.assertAlmostEqual(
+            WalkSearchEntry.objects.get(pk=walk.pk).route_length, 69.1, places=1
+        )
+        # what's derived from the route is rebuilt as it is by save()
+        self.assertEqual(walk.route_envelope.extent, walk.route.extent)
+        self.assertTrue(RouteSegment.objects.filter(walk=walk).exists())
+        self.assertIsNotNone(walk.route_overview)
+        self.assertIsNotNone(walk.route_detail)
+        # the start moved so its location details are looked up again
+        self.assertIsNone(walk.what3words)
+        self.assertIsNone(walk.formatted)
+        self.assertTrue(GeocodeJob.objects.filter(walk=walk).exists())
+        self.assertIn("Recomputed 1 walks, 1 starts moved", out.getvalue())
+
+    def test_recompute_unchanged(self):
+        GeocodeJob.objects.all().delete()
+        Walk.objects.update(what3words="index.home.raft")
+        out = io.StringIO()
+
+        call_command("recompute_route_lengths", stdout=out)
+
+        self.assertFalse(GeocodeJob.objects.exists())
+        self.assertEqual(
+            Walk.objects.get(pk=self.walk.pk).what3words, "index.home.raft"
+        )
+        self.assertIn("Recomputed 1 walks, 0 starts moved", out.getvalue())
+
+
+@override_settings(ROUTE_OVERVIEW_TOLERANCE=0.0002, ROUTE_DETAIL_TOLERANCE=0.00002)
+class SimplifiedRouteTests(TestCase):
+    def setUp(self):
+        # a straight route with GPS jitter of about 50cm, and a 10m detour every 20 points
+        self.route = LineString(
+            [
+                (
+                    -2.2 + i * 0.0001,
+                    51.7 + (0.0001 if i % 20 == 10 else 0) + (0.000005 if i % 2 else 0),
+                )
+                for i in range(200)
+            ],
+            srid=4326,
+        )
+        self.walk = Walk.objects.create(
+            name=fake.sentence(),
+            description=fake.paragraph(),
+            submitter=get_sentinel_user(),
+            route=self.route,
+        )
+
+    def test_simplified_on_save(self):
+        self.walk.refresh_from_db()
+
+        # the jitter is removed from both, the detours only from the overview
+        self.assertEqual(self.walk.route_overview.num_points, 2)
+        self.assertLess(self.walk.route_detail.num_points, 200)
+        self.assertGreater(self.walk.route_detail.num_points, 10)
+        self.assertEqual(self.walk.route_detail[0], self.walk.route[0])
+        self.assertEqual(self.walk.route_detail[-1], self.walk.route[-1])
+
+    @override_settings(ROUTE_OVERVIEW_MAX_ZOOM=12, ROUTE_DETAIL_MAX_ZOOM=16)
+    def test_route_for_zoom(self):
+        self.assertEqual(Walk.route_for_zoom(8), "route_overview")
+        self.assertEqual(Walk.route_for_zoom(14), "route_detail")
+        self.assertEqual(Walk.route_for_zoom(18), "route")
+
+    def test_command(self):
+        Walk.objects.update(route_overview=None, route_detail=None)
+        out = io.StringIO()
+
+        call_command("simplify_routes", stdout=out)
+
+        self.walk.refresh_from_db()
+        self.assertEqual(self.walk.route_overview.num_points, 2)
+        self.assertIn("Simplified 1 routes", out.getvalue())
+
+        call_command("simplify_routes", stdout=out)
+        self.assertIn("Simplified 0 routes", out.getvalue())
+
+    def test_command_clears_tiles(self):
+        tile_cache.cache.set(tile_cache.key(0, 0, 0), b"stale")
+
+        call_command("simplify_routes", all=True, stdout=io.StringIO())
+
+        self.assertIsNone(tile_cache.cache.get(tile_cache.key(0, 0, 0)))
+
+    def test_detail_page(self):
+        response = self.client.get(self.walk.get_absolute_url())
+
+        self.assertLess(
+            response.context["form"].initial["route"].num_points, self.route.num_points
+        )
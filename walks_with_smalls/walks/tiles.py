@@ -0,0 +1,165 @@
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+from .geojson import walk_url_parts
+from .models import Walk
+
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+# the width of the web mercator projection in metres
+WEB_MERCATOR_WIDTH = 2 * math.pi * 6378137
+# the largest latitude web mercator tiles reach
+MAX_LATITUDE = 85.0511287798
+# tile coordinates are 0 to TILE_EXTENT across a tile
+TILE_EXTENT = 4096
+# geometries are drawn this far outside a tile so symbols and lines aren't cut at its edges
+TILE_BUFFER = 64
+
+
+def tile_xy(lon, lat, z):
+    """
+    The position of a point in tiles at zoom level z, with fractions of a tile
+    """
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    n = 2 ** z
+    x = (lon + 180) / 360 * n
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return x, y
+
+
+def tiles_covering(extent, z):
+    """
+    The tiles at zoom level z that draw something within extent (xmin, ymin, xmax, ymax in degrees),
+    including tiles whose buffer it falls in
+    """
+    buffer = TILE_BUFFER / TILE_EXTENT
+    last = 2 ** z - 1
+    # y counts down from the top so the maximum latitude gives the first row
+    x1, y1 = tile_xy(extent[0], extent[3], z)
+    x2, y2 = tile_xy(extent[2], extent[1], z)
+
+    for x in range(
+        max(0, math.floor(x1 - buffer)), min(last, math.floor(x2 + buffer)) + 1
+    ):
+        for y in range(
+            max(0, math.floor(y1 - buffer)), min(last, math.floor(y2 + buffer)) + 1
+        ):
+            yield z, x, y
+
+
+def render_tile(z, x, y):
+    """
+    Build a Mapbox Vector Tile of the walks in a tile with ST_AsMVT.
+    The starts layer has a point for each walk with its name, length and URL.
+    From TILE_ROUTES_MIN_ZOOM the routes layer has their routes too, from the simplified copy
+    that suits the zoom level (see Walk.route_for_zoom), simplified further to the size of a pixel in the tile
+    """
+    walk_table = Walk._meta.db_table
+    user_table = Walk._meta.get_field("submitter").related_model._meta.db_table
+    before, middle, after = walk_url_parts()
+    tile_width = WEB_MERCATOR_WIDTH / 2 ** z
+    # walks saved before the simplified copies were added may not have them yet
+    route = f"COALESCE(walk.{Walk.route_for_zoom(z)}, walk.route)"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH bounds AS ("
+            f"  SELECT tile, ST_Transform(ST_Expand(tile, %(margin)s), 4326) AS area "
+            f"  FROM ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS tile"
+            f"), starts AS ("
+            f"  SELECT walk.id, walk.name, walk.route_length AS length, "
+            f"  %(before)s || submitter.username || %(middle)s || walk.slug || %(after)s AS url, "
+            f"  ST_AsMVTGeom(ST_Transform(walk.start, 3857), bounds.tile, %(extent)s, %(buffer)s, true) AS geom "
+            f"  FROM {walk_table} AS walk "
+            f"  JOIN {user_table} AS submitter ON submitter.id = walk.submitter_id "
+            f"  CROSS JOIN bounds "
+            f"  WHERE walk.start && bounds.area"
+            f"), routes AS ("
+            f"  SELECT walk.id, "
+            f"  ST_AsMVTGeom("
+            f"    ST_Simplify(ST_Transform({route}, 3857), %(tolerance)s, true), "
+            f"    bounds.tile, %(extent)s, %(buffer)s, true"
+            f"  ) AS geom "
+            f"  FROM {walk_table} AS walk CROSS JOIN bounds "
+            f"  WHERE %(routes)s AND walk.route && bounds.area"
+            f") "
+            f"SELECT "
+            f"  COALESCE((SELECT ST_AsMVT(starts, 'starts', %(extent)s, 'geom') FROM starts), '') || "
+            f"  COALESCE((SELECT ST_AsMVT(routes, 'routes', %(extent)s, 'geom') FROM routes), '')",
+            {
+                "z": z,
+                "x": x,
+                "y": y,
+                "margin": tile_width * TILE_BUFFER / TILE_EXTENT,
+                "extent": TILE_EXTENT,
+                "buffer": TILE_BUFFER,
+                "tolerance": tile_width / TILE_EXTENT,
+                "routes": z >= settings.TILE_ROUTES_MIN_ZOOM,
+                "before": before,
+                "middle": middle,
+                "after": after,
+            },
+        )
+        return bytes(cursor.fetchone()[0])
+
+
+class TileCache:
+    """
+    Caches rendered tiles up to TILE_CACHE_MAX_ZOOM.
+    Deeper tiles cover little enough that they are quick to render, and there are too many to invalidate.
+
+    Saving or deleting a walk deletes the cached tiles at each zoom level that draw its route
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.TILE_CACHE_ALIAS]
+
+    @staticmethod
+    def key(z, x, y):
+        return f"tiles:{z}:{x}:{y}"
+
+    def tile(self, z, x, y):
+        if z > settings.TILE_CACHE_MAX_ZOOM:
+            return render_tile(z, x, y)
+
+        key = self.key(z, x, y)
+        tile = self.cache.get(key)
+
+        if tile is None:
+            tile = render_tile(z, x, y)
+            self.cache.set(key, tile, settings.TILE_CACHE_TTL)
+
+        return tile
+
+    def invalidate(self, geometries):
+        """
+        Delete the cached tiles that draw any of the given geometries
+        """
+        keys = set()
+
+        for geometry in geometries:
+            if geometry is None:
+                continue
+
+            if geometry.srid != 4326:
+                geometry = geometry.transform(4326, clone=True)
+
+            for z in range(settings.TILE_CACHE_MAX_ZOOM + 1):
+                keys.update(
+                    self.key(*tile) for tile in tiles_covering(geometry.extent, z)
+                )
+
+        self.cache.delete_many(keys)
+
+    def clear(self):
+        """
+        Delete every cached tile, after changes to more walks than are worth invalidating one by one.
+        The TILE_CACHE_ALIAS cache holds nothing else
+        """
+        self.cache.clear()
+
+
+tile_cache = TileCache()
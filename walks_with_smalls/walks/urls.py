@@ -2,9 +2,13 @@ from django.urls import path
 from .views import (
     IndexSearch,
     Search,
-    GetUserLocation,
+    PostcodeAutocomplete,
     Results,
+    ResultsPage,
     WalkDetail,
+    WalkClusters,
+    WalksGeoJSON,
+    WalkTile,
     WalkCreate,
     WalkUpdate,
 )
@@ -13,7 +17,15 @@ urlpatterns = [
     path("", IndexSearch.as_view(), name="index"),
     path("search/", Search.as_view(), name="search"),
     path("results/", Results.as_view(), name="results"),
-    path("get-user-location/", GetUserLocation.as_view(), name="get-user-location"),
+    path("results/page/", ResultsPage.as_view(), name="results-page"),
+    path(
+        "postcode-autocomplete/",
+        PostcodeAutocomplete.as_view(),
+        name="postcode-autocomplete",
+    ),
+    path("api/walks/", WalksGeoJSON.as_view(), name="api-walks"),
+    path("api/clusters/", WalkClusters.as_view(), name="api-clusters"),
+    path("tiles/<int:z>/<int:x>/<int:y>.pbf", WalkTile.as_view(), name="walk-tile"),
     path("walk/<str:username>/<slug:slug>/", WalkDetail.as_view(), name="walk-detail"),
     path("walk/add/", WalkCreate.as_view(), name="walk-add"),
     path(
@@ -1,196 +1,430 @@
-import requests
+import hashlib
+import json
+import math
+from urllib.parse import urlencode
+
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.gis.geos import Point
 from django.contrib.gis.db.models.functions import Distance, Length
-from django.contrib.gis.measure import D
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count, Q, F
-from django.http import HttpResponseForbidden, HttpResponse
+from django.db.models import F
+from django.conf import settings
+from django.core.cache import caches
+from django.http import (
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+    Http404,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render, redirect
-from django.urls import reverse_lazy
+from django.urls import reverse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
 from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
 from django.views import View
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
 from django.views.generic import ListView, CreateView, UpdateView, DetailView, FormView
 
-from .forms import WalkForm, ReadOnlyWalkRouteForm, SearchForm
-from .models import Walk, PostCode, Attribute
+from .clusters import cluster_features, cluster_walks
+from .elevation import profile_chart
+from .forms import ResponsiveMapWidget, WalkForm, ReadOnlyWalkRouteForm, SearchForm
+from .geojson import feature_collection, GEOJSON_CONTENT_TYPE, walk_feature
+from .models import Walk, WalkSearchEntry
+from .pagination import InvalidCursor, KeysetPaginator, PkListPaginator
+from .postcodes import postcode_lookup, PostcodeLookupError
+from .search import format_number, length_bucket_labels, search_cache, WalkSearch
+from .tiles import MVT_CONTENT_TYPE, tile_cache
 
 
 class IndexSearch(View):
     @staticmethod
     def get(request):
-        return render(request, "walks/index.html",)
+        return render(
+            request,
+            "walks/index.html",
+            {
+                # the walks map uses the same OpenLayers as the map widgets
+                "map_media": ResponsiveMapWidget().media,
+                "tile_max_zoom": settings.TILE_MAX_ZOOM,
+                "tile_routes_min_zoom": settings.TILE_ROUTES_MIN_ZOOM,
+            },
+        )
 
 
 class Search(FormView):
+    """
+    Turns the search form in to a results URL, looking up the postcode if there is one
+    """
+
     template_name = "walks/results.html"
     form_class = SearchForm
-    success_url = reverse_lazy("results")
 
-    def form_valid(self, form):
-        # populate the search dict on the session
-        session_search = self.request.session.get("search", {})
+    def get(self, request, *args, **kwargs):
+        if not request.GET:
+            return redirect("results")
 
-        for search_parameter in form.fields:
-            session_search[search_parameter] = form.cleaned_data[search_parameter]
+        form = self.get_form()
+
+        if form.is_valid():
+            return self.form_valid(form)
+
+        return self.form_invalid(form)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["data"] = self.request.GET
+        return kwargs
+
+    def form_valid(self, form):
+        postcode = None
 
-        # set the search lat and long based on the lat long set on the session (if they exist)
         if form.cleaned_data["use_current_location"]:
-            if self.request.session.get("lat") and self.request.session.get("long"):
-                session_search["lat"] = self.request.session.get("lat")
-                session_search["long"] = self.request.session.get("long")
-            else:
-                messages.add_message(
-                    self.request, messages.ERROR, "Could not get your current location"
-                )
-                return redirect(self.request.session["redirect_to"])
+            location = Point(
+                form.cleaned_data["long"], form.cleaned_data["lat"], srid=4326
+            )
 
-        elif form.cleaned_data["postcode"]:
+        else:
             try:
-                postcode_obj = PostCode.objects.get(
-                    postcode=form.cleaned_data["postcode"]
-                )
-            except PostCode.DoesNotExist:
-                r = requests.get(
-                    url=f"https://api.postcodes.io/postcodes/{form.cleaned_data['postcode']}"
+                postcode_obj = postcode_lookup.lookup(form.cleaned_data["postcode"])
+            except PostcodeLookupError:
+                form.add_error(
+                    "postcode",
+                    "There was a problem when trying to look up the entered postcode",
                 )
+                return self.form_invalid(form)
+
+            if postcode_obj is None:
+                form.add_error("postcode", "Postcode not found")
+                return self.form_invalid(form)
+
+            location = Point(postcode_obj.longitude, postcode_obj.latitude, srid=4326)
+            postcode = form.cleaned_data["postcode"]
+
+        search = WalkSearch(
+            location,
+            radius=form.cleaned_data["search_radius"],
+            maximum_length=form.cleaned_data["maximum_length"],
+            maximum_ascent=form.cleaned_data["maximum_ascent"],
+            attributes=form.selected_attributes(),
+            all_attributes=form.cleaned_data["all_attributes"],
+            sort=form.cleaned_data["sort"],
+            postcode=postcode,
+            text=form.cleaned_data["q"],
+            along_route=form.cleaned_data["along_route"],
+        )
+        return redirect(f"{reverse('results')}?{search.query_string()}")
+
+
+class WalkSearchMixin:
+    """
+    Filters and orders walks by the search in the query string.
+    Results are paged with a cursor so the next page can be fetched as cheaply as the first.
+    The order of the results of most searches is cached, see walks.search.SearchCache.
+
+    As the search is all in the URL, responses can be cached too.
+    Each has an ETag that changes when the walks that could be in it do,
+    and whole responses are cached for anonymous users
+    """
+
+    model = WalkSearchEntry
+    context_object_name = "walks"
+
+    def get_paginate_by(self, queryset):
+        return settings.RESULTS_PAGE_SIZE
+
+    def get_search(self):
+        return WalkSearch.from_query(self.request.GET)
+
+    def get_search_query(self):
+        search = self.get_search()
+        return "" if search is None else search.query_string()
+
+    def get_ordering(self):
+        search = self.get_search()
+
+        if search is None:
+            # newest first when there's nothing to search by
+            return ["-created", "-pk"]
 
-                try:
-                    response = r.json()
-                except TypeError:
-                    messages.add_message(
-                        self.request,
-                        messages.ERROR,
-                        "There was a problem when trying to look up the entered postcode",
-                    )
-                    return redirect(self.request.session["redirect_to"])
-
-                if r.status_code != requests.codes.ok:
-                    messages.add_message(
-                        self.request, messages.WARNING, response.get("error")
-                    )
-                    return redirect(self.request.session["redirect_to"])
-
-                lat = response.get("result", {}).get("latitude")
-                long = response.get("result", {}).get("longitude")
-
-                if not lat or not long:
-                    messages.add_message(
-                        self.request,
-                        messages.ERROR,
-                        "There was a problem getting location data from the entered postcode",
-                    )
-                    return redirect(self.request.session["redirect_to"])
-
-                postcode_obj = PostCode.objects.create(
-                    postcode=form.cleaned_data["postcode"], latitude=lat, longitude=long
+        return search.ordering
+
+    def get_base_queryset(self):
+        # the search entries have everything the walk cards show, without joins
+        return WalkSearchEntry.objects.all()
+
+    def get_queryset(self):
+        search = self.get_search()
+
+        if search is None:
+            # show all the walks if there are no search params to filter by
+            return self.get_base_queryset()
+
+        return search.filter(self.get_base_queryset())
+
+    def paginate_queryset(self, queryset, page_size):
+        search = self.get_search()
+        pks = None if search is None else search_cache.pks(search)
+
+        if pks is None:
+            paginator = KeysetPaginator(queryset, self.get_ordering(), page_size)
+        else:
+            # distances are still from the searched location rather than the cached one
+            paginator = PkListPaginator(
+                search.annotate(self.get_base_queryset()), pks, page_size
+            )
+
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+
+        return paginator, page, page.object_list, page.has_next()
+
+    def get_context_data(self, *args, **kwargs):
+        context = super().get_context_data(*args, **kwargs)
+        context["search_query"] = self.get_search_query()
+        search = self.get_search()
+
+        if search is not None:
+            # so walk pages can show how far away they are
+            context["origin_query"] = urlencode(
+                {
+                    "lat": format_number(search.location.y),
+                    "long": format_number(search.location.x),
+                }
+            )
+
+        return context
+
+    def get_etag(self):
+        """
+        Made from the search cache's version tokens, which are the same for every process
+        as the cache is shared by them (see walks.checks)
+        """
+        data = json.dumps(
+            [
+                self.request.get_full_path(),
+                self.request.user.pk,
+                search_cache.version(self.get_search()),
+            ]
+        )
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.copy()
+        cursor = query.pop("cursor", None)
+
+        if query.urlencode() != self.get_search_query():
+            # send equal searches to the same URL so they share cached responses
+            url = request.path
+            query = self.get_search_query()
+
+            if cursor:
+                query = "&".join(
+                    filter(None, [query, urlencode({"cursor": cursor[-1]})])
                 )
 
-            session_search["lat"] = postcode_obj.latitude
-            session_search["long"] = postcode_obj.longitude
+            return redirect(f"{url}?{query}" if query else url)
 
-        session_search["attributes"] = []
+        # responses showing who is logged in or with messages on them aren't shared
+        shared = not request.user.is_authenticated and not len(
+            messages.get_messages(request)
+        )
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=quote_etag(etag))
 
-        for place_attribute in Attribute.objects.all():
-            if form.cleaned_data[place_attribute.attribute]:
-                session_search["attributes"].append(place_attribute.pk)
+        if response is None and shared:
+            response = self.get_cached_response(etag, request, *args, **kwargs)
+        elif response is None:
+            response = super().get(request, *args, **kwargs)
 
-        self.request.session["search"] = session_search
-        return super().form_valid(form)
+        response["ETag"] = quote_etag(etag)
 
+        if shared:
+            patch_cache_control(
+                response, public=True, max_age=settings.SEARCH_RESULTS_MAX_AGE
+            )
+        else:
+            patch_cache_control(response, private=True, max_age=0)
 
-class Results(ListView):
-    model = Walk
-    context_object_name = "walks"
+        # the page shows who is logged in
+        patch_vary_headers(response, ["Cookie"])
+        return response
+
+    def get_cached_response(self, etag, request, *args, **kwargs):
+        """
+        Render the response, or reuse one rendered for another anonymous user
+        """
+        cache = caches[settings.SEARCH_CACHE_ALIAS]
+        key = f"search:response:{etag}"
+        response = cache.get(key)
+
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            response.render()
+            cache.set(key, response, settings.SEARCH_CACHE_TTL)
+
+        return response
+
+
+class Results(WalkSearchMixin, ListView):
     template_name = "walks/results.html"
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
+        search = self.get_search()
+        facets = None if search is None else search_cache.facets(search)
+        context["form"] = SearchForm.for_search(search, facets)
 
-        # save the redirect link
-        self.request.session["redirect_to"] = "results"
-        # instantiate the search for and populate with initial data
-        form = SearchForm()
-        initial_data = {}
+        if facets is not None:
+            context["length_facets"] = list(
+                zip(length_bucket_labels(), facets["lengths"])
+            )
 
-        for search_parameter in form.fields:
-            if self.request.session.get("search", {}).get(search_parameter):
-                initial_data[search_parameter] = self.request.session["search"][
-                    search_parameter
-                ]
+        return context
 
-        # update the initial data on the form
-        form.initial = initial_data
 
-        context["form"] = form
-        context["attributes"] = Attribute.objects.values_list("attribute", flat=True)
-        return context
+class ResultsPage(WalkSearchMixin, ListView):
+    """
+    The walk cards for a page of results, fetched as the results are scrolled
+    """
 
-    def get_queryset(self):
-        # start off with all walks
-        queryset = Walk.objects.all()
+    template_name = "walks/fragments/walk_page.html"
 
-        # check we have search parameters in the session
-        search_params = self.request.session.get("search", {})
 
-        if (
-            not search_params
-            or not search_params.get("lat")
-            or not search_params.get("long")
-        ):
-            # show all the walks if there are no search params to filter by
-            return queryset
-
-        # if here, we have a set of search params.
-        # We can build a Point to search from
-        search_location = Point(
-            srid=4326,
-            x=float(search_params.get("long")),
-            y=float(search_params.get("lat")),
+@method_decorator(
+    cache_control(public=True, max_age=settings.POSTCODE_AUTOCOMPLETE_CACHE_TTL),
+    name="dispatch",
+)
+class PostcodeAutocomplete(View):
+    @staticmethod
+    def get(request):
+        return JsonResponse(
+            {"postcodes": postcode_lookup.complete(request.GET.get("q", ""))}
         )
 
-        # get the search_parameters
-        search_attributes = search_params.get("attributes", [])
-        search_radius = search_params.get("search_radius") or 200
-        maximum_length = search_params.get("maximum_length") or 250
-
-        # we can annotate and filter
-        # fmt: off
-        return queryset.annotate(
-            distance=Distance("start", search_location)
-        ).annotate(
-            attribute_match_count=Count(
-                "attributes",
-                filter=Q(attributes__in=search_attributes),
-            )
-        ).filter(
-            start__distance_lte=(
-                search_location,
-                D(mi=float(search_radius)),
+
+def api_error(message):
+    return JsonResponse({"error": message}, status=400)
+
+
+class WalksGeoJSON(View):
+    """
+    The walks found by a search as a GeoJSON FeatureCollection, using the same query string as the results.
+    Features are built by the database and streamed out as they are read, a page of up to
+    API_MAX_PAGE_SIZE at a time. The collection's "next" member links to the next page.
+    Routes are in full unless a map zoom level is given, when they are simplified to suit it
+    """
+
+    def get(self, request):
+        search = WalkSearch.from_query(request.GET)
+
+        if search is None and any(
+            name in request.GET for name in ("lat", "long", "bbox", "polygon")
+        ):
+            return api_error("Invalid search")
+
+        try:
+            limit = int(request.GET.get("limit", settings.API_PAGE_SIZE))
+            zoom = int(request.GET["zoom"]) if request.GET.get("zoom") else None
+        except ValueError:
+            return api_error("Invalid limit or zoom")
+
+        if search is None:
+            queryset = Walk.objects.all()
+            ordering = ["-created", "-pk"]
+        else:
+            queryset = search.filter(Walk.objects.all())
+            ordering = search.ordering
+
+        # only the ordering values are needed on the walks, everything else is in the feature
+        queryset = queryset.only("pk", "created", "route_length").annotate(
+            feature=walk_feature(
+                search, route="route" if zoom is None else Walk.route_for_zoom(zoom)
             )
-        ).filter(
-            route_length__lte=float(maximum_length)
-        ).order_by(
-            "-attribute_match_count",
-            "route_length",
-            "distance",
         )
-        # fmt: on
+        paginator = KeysetPaginator(
+            queryset, ordering, max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+        )
+
+        try:
+            page = paginator.stream(request.GET.get("cursor"))
+        except InvalidCursor:
+            return api_error("Invalid cursor")
+
+        def next_url():
+            if not page.has_next():
+                return None
+
+            query = request.GET.copy()
+            query["cursor"] = page.next_cursor
+            return request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+        return StreamingHttpResponse(
+            feature_collection((walk.feature for walk in page), next=next_url),
+            content_type=GEOJSON_CONTENT_TYPE,
+        )
+
+
+@method_decorator(
+    cache_control(public=True, max_age=settings.TILE_MAX_AGE), name="dispatch",
+)
+class WalkClusters(View):
+    """
+    The walks starting within a bounding box, clustered for a map at a zoom level.
+    Takes bbox=xmin,ymin,xmax,ymax in degrees and zoom, see walks.clusters
+    """
+
+    @staticmethod
+    def get(request):
+        try:
+            bbox = [float(value) for value in request.GET.get("bbox", "").split(",")]
+            zoom = int(request.GET.get("zoom", ""))
+        except ValueError:
+            return api_error("bbox and zoom are required")
+
+        if (
+            len(bbox) != 4
+            or not all(math.isfinite(value) for value in bbox)
+            or bbox[0] > bbox[2]
+            or bbox[1] > bbox[3]
+        ):
+            return api_error("Invalid bbox")
+
+        if not 0 <= zoom <= settings.TILE_MAX_ZOOM:
+            return api_error("Invalid zoom")
+
+        return JsonResponse(
+            cluster_features(cluster_walks(bbox, zoom)),
+            content_type=GEOJSON_CONTENT_TYPE,
+        )
+
 
+@method_decorator(
+    cache_control(public=True, max_age=settings.TILE_MAX_AGE), name="dispatch",
+)
+class WalkTile(View):
+    """
+    A Mapbox Vector Tile of the walks' start points and routes, see walks.tiles
+    """
 
-@method_decorator(csrf_exempt, name="dispatch")
-class GetUserLocation(View):
-    def post(self, request):
-        request.session["lat"] = round(float(request.POST.get("lat")), 6)
-        request.session["long"] = round(float(request.POST.get("long")), 6)
-        return HttpResponse(status=201)
+    @staticmethod
+    def get(request, z, x, y):
+        if z > settings.TILE_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            raise Http404("No such tile")
+
+        return HttpResponse(tile_cache.tile(z, x, y), content_type=MVT_CONTENT_TYPE)
 
 
 class SubmitterRequiredMixin(object):
     def dispatch(self, request, *args, **kwargs):
-        if self.get_object().submitter != request.user:
+        if self.get_object().submitter_id != request.user.pk:
             raise PermissionDenied
 
         return super().dispatch(request, *args, **kwargs)
@@ -202,22 +436,29 @@ class WalkDetail(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["form"] = ReadOnlyWalkRouteForm(initial={"route": self.object.route})
+        # the map is zoomed to fit the route, where the detailed copy has all the points that can be seen
+        context["form"] = ReadOnlyWalkRouteForm(
+            initial={"route": self.object.route_detail or self.object.route}
+        )
+        # drawn from the heights sampled when the walk was saved
+        context["elevation"] = profile_chart(self.object)
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = (
+            super()
+            .get_queryset()
+            .select_related("submitter")
+            .prefetch_related("attributes")
+            .defer("route_overview")
+        )
 
-        search_params = self.request.session.get("search", {})
+        # the location searched from, if the walk was found by a search
+        search = WalkSearch.from_query(self.request.GET)
 
-        if search_params.get("lat") and search_params.get("long"):
-            search_location = Point(
-                srid=4326,
-                x=float(search_params.get("long")),
-                y=float(search_params.get("lat")),
-            )
+        if search is not None:
             return queryset.annotate(
-                distance_from=Distance(F("start"), search_location)
+                distance_from=Distance(F("start_geography"), search.location)
             )
 
         return queryset
@@ -227,11 +468,6 @@ class WalkCreate(LoginRequiredMixin, CreateView):
     model = Walk
     form_class = WalkForm
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["attributes"] = Attribute.objects.values_list("attribute", flat=True)
-        return context
-
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs["submitter"] = self.request.user.pk
@@ -243,11 +479,6 @@ class WalkUpdate(LoginRequiredMixin, SubmitterRequiredMixin, UpdateView):
     form_class = WalkForm
     context_object_name = "walk"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["attributes"] = Attribute.objects.values_list("attribute", flat=True)
-        return context
-
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs["submitter"] = self.request.user.pk